@@ -1,11 +1,18 @@
 # agents/database_agent/agent.py
 import streamlit as st
-from langchain_community.utilities.sql_database import SQLDatabase
 from langchain_openai import ChatOpenAI
 from langchain.agents import create_sql_agent, AgentType
+from langchain.agents.agent import AgentExecutor
 from langchain.memory import ConversationBufferMemory
+from langchain_core.messages import SystemMessage
+from langchain_core.prompts import (
+    ChatPromptTemplate, HumanMessagePromptTemplate, MessagesPlaceholder,
+    SystemMessagePromptTemplate,
+)
 
 from config.settings import OPENAI_API_KEY
+from .engines import get_database
+from .schema_index import get_schema_index
 from .sql_tools import get_sql_toolkit
 
 # ---------------------------------------------------------------------
@@ -39,57 +46,77 @@ You are a data‑analytics assistant.
 • All operations are read‑only (no INSERT/UPDATE/DELETE).
 """
 
+SCHEMA_PROMPT = """
+Schema of the tables most relevant to this question (with sample rows).
+Other tables may exist: `sql_db_list_tables` lists them and
+`sql_db_schema` shows their columns.
+
+{relevant_tables}
+"""
+
+
+class SchemaAwareSQLAgent(AgentExecutor):
+    """Agent executor that fills ``relevant_tables`` for every question
+    from the connection's schema index, instead of carrying the whole
+    schema in memory."""
+
+    connection_string: str = ""
+
+    def prep_inputs(self, inputs):
+        inputs = super().prep_inputs(inputs)
+        if "relevant_tables" not in inputs:
+            index = get_schema_index(self.connection_string)
+            inputs["relevant_tables"] = index.context(inputs["input"])
+        return inputs
+
 
 def build_sql_agent_with_memory(connection_string: str, temperature: float = 0.0):
     try:
-        # 1) Connect to the DB -------------------------------------------------
-        db = SQLDatabase.from_uri(connection_string)
+        # 1) Shared pooled engine + schema snapshot ---------------------------
+        #    (SQLite connections get the stdev() aggregate on connect)
+        db = get_database(connection_string)
         dialect = str(db.dialect).lower()
 
-        # 2) Optional: register stdev() for SQLite ----------------------------
-        if dialect == "sqlite":
-            def _stdev(ctx, value):
-                # ctx.rows : list[(float,)]
-                vals = [float(v[0]) for v in ctx]
-                return statistics.pstdev(vals)
-            raw_conn = db._engine.raw_connection()
-            raw_conn.create_aggregate("stdev", 1, _stdev)
-            raw_conn.close()
-
-        # 3) Create LLM -------------------------------------------------------
+        # 2) Create LLM -------------------------------------------------------
         llm = ChatOpenAI(
             temperature=temperature,
             model_name="gpt-3.5-turbo",
             api_key=st.secrets["OPENAI_API_KEY"],
         )
 
-        # 4) Build toolkit and memory ----------------------------------------
+        # 3) Build toolkit and memory ----------------------------------------
         toolkit = get_sql_toolkit(db, llm)
         memory = ConversationBufferMemory(
-            memory_key="chat_history", return_messages=True
+            memory_key="chat_history", input_key="input", return_messages=True
         )
 
-        # 5) Compose dynamic system prompt -----------------------------------
+        # 4) Compose prompt: static instructions + per‑question schema -------
         dialect_note = DIALECT_HINTS.get(dialect, "")
-        system_prompt = BASE_PROMPT + dialect_note
+        prompt = ChatPromptTemplate.from_messages([
+            SystemMessage(content=BASE_PROMPT + f"\nSQL dialect: {dialect}\n" + dialect_note),
+            SystemMessagePromptTemplate.from_template(SCHEMA_PROMPT),
+            MessagesPlaceholder(variable_name="chat_history", optional=True),
+            HumanMessagePromptTemplate.from_template("{input}"),
+            MessagesPlaceholder(variable_name="agent_scratchpad"),
+        ])
 
-        # 6) Create agent (function‑calling mode) -----------------------------
-        agent = create_sql_agent(
+        # 5) Create agent (function‑calling mode) -----------------------------
+        #    create_sql_agent wires prompt + tools; the executor around it is
+        #    ours so each question gets its own relevant_tables.
+        base = create_sql_agent(
             llm=llm,
             toolkit=toolkit,
             agent_type=AgentType.OPENAI_FUNCTIONS,
+            prompt=prompt,
+        )
+        agent = SchemaAwareSQLAgent(
+            agent=base.agent,
+            tools=base.tools,
             memory=memory,
             verbose=True,
-            system_message=system_prompt,
             handle_parsing_errors=True,   # auto‑retry malformed outputs
             max_iterations=25,            # give the agent more breathing room
-        )
-
-        # 7) Warm‑cache schema into memory -----------------------------------
-        schema_text = db.get_table_info()
-        memory.save_context(
-            {"input": "Show me the database schema"},
-            {"output": f"Database schema:\n{schema_text}"},
+            connection_string=connection_string,
         )
 
         return agent
@@ -1,10 +1,42 @@
 #compare_tables_tool.py
-from typing import List
+"""
+compare_tables: per‑key aggregates of two tables side by side, computed
+by the database in ONE statement
+
+    WITH cmp_lhs_ AS (SELECT key, aggs FROM table1 GROUP BY key),
+         cmp_rhs_ AS (SELECT key, aggs FROM table2 GROUP BY key),
+         cmp_out_ AS (lhs FULL OUTER JOIN rhs, missing side = 0, B − A diffs)
+    SELECT * FROM cmp_out_ [WHERE any diff <> 0] ORDER BY … LIMIT n
+
+(The CTE names are chosen not to shadow user tables such as ``a``/``b``.)
+Each metric must be a single aggregate call over one column or ``*`` –
+the strings come from the LLM and are pasted into the SQL – and the
+statement runs in a read‑only transaction like the raw SQL paths.
+
+MySQL has no FULL OUTER JOIN and SQLite's is a nested loop, so both
+get the LEFT JOIN ∪ anti‑join emulation.  Only the final (capped) rows
+cross the wire; results go through the shared SQL result cache.
+"""
+import re
+from typing import List, Optional
+
 import pandas as pd
 from sqlalchemy import text
 from pydantic import BaseModel, Field
 from langchain.tools import StructuredTool
 
+from config.settings import COMPARE_TABLES_MAX_ROWS
+from .read_only_sql_tool import _check_read_only
+from .result_cache import get_sql_result_cache, connection_key
+from .streaming import _read_only
+
+_FETCH_ROWS = 1000
+_IDENT = r'"[^"]+"|`[^`]+`|\[[^\]]+\]|[A-Za-z_][\w$]*'
+_METRIC = re.compile(
+    rf"(?i)\s*(?:sum|avg|min|max|count)\s*\(\s*(?:distinct\s+)?"
+    rf"(?:\*|(?:(?:{_IDENT})\s*\.\s*)*(?:{_IDENT}))\s*\)\s*"
+)
+
 
 # ---- Pydantic schema -------------------------------------------------
 class CompareTablesArgs(BaseModel):
@@ -12,8 +44,86 @@ class CompareTablesArgs(BaseModel):
     table2: str = Field(..., description="Second table name")
     key: str = Field(..., description="Column that exists in both tables to join on")
     metrics: List[str] = Field(
-        ..., description="List of SQL aggregate expressions, e.g. ['SUM(credits)']"
+        ..., description="List of aggregate calls over one column each, "
+                         "e.g. ['SUM(credits)', 'COUNT(*)']"
+    )
+    diff_only: bool = Field(
+        False, description="Only keys whose metrics differ (or exist on one side only)"
+    )
+    top_n: Optional[int] = Field(
+        None, description="Only the N keys with the largest absolute difference in the first metric"
+    )
+    limit: int = Field(
+        COMPARE_TABLES_MAX_ROWS,
+        description=f"Maximum rows returned (capped at {COMPARE_TABLES_MAX_ROWS})",
+    )
+
+
+# ---- SQL builder ------------------------------------------------------
+def _supports_full_join(dialect) -> bool:
+    # SQLite ≥ 3.39 parses FULL JOIN but plans it as a nested loop over the
+    # two CTEs; the emulation gets automatic indexes on both sides.
+    return dialect.name not in ("sqlite", "mysql", "mariadb")
+
+
+def _aliases(metrics: List[str]) -> List[str]:
+    out = []
+    for m in metrics:
+        base = re.sub(r"\W+", "_", m).strip("_") or "metric"
+        alias, n = base, 2
+        while alias in out:
+            alias, n = f"{base}_{n}", n + 1
+        out.append(alias)
+    return out
+
+
+def build_compare_sql(dialect, table1: str, table2: str, key: str, metrics: List[str],
+                      diff_only: bool = False, top_n: Optional[int] = None,
+                      limit: int = COMPARE_TABLES_MAX_ROWS) -> str:
+    if not metrics:
+        raise ValueError("compare_tables needs at least one metric")
+    for m in metrics:
+        if not _METRIC.fullmatch(m):
+            raise ValueError(f"metric {m!r} must be one aggregate call over a column, "
+                             f"e.g. SUM(credits) or COUNT(*)")
+    q = dialect.identifier_preparer.quote
+
+    def ident(name: str) -> str:
+        return ".".join(q(part.strip()) for part in name.split("."))
+
+    names = _aliases(metrics)
+    aggs = ", ".join(f"{m} AS m{i}" for i, m in enumerate(metrics))
+    cols = ", ".join(
+        f"COALESCE(l.m{i}, 0) AS {q(n + '_A')}, COALESCE(r.m{i}, 0) AS {q(n + '_B')}, "
+        f"COALESCE(r.m{i}, 0) - COALESCE(l.m{i}, 0) AS {q(n + '_diff')}"
+        for i, n in enumerate(names)
     )
+    if _supports_full_join(dialect):
+        joined = (f"SELECT COALESCE(l.k, r.k) AS {q(key)}, {cols} "
+                  f"FROM cmp_lhs_ l FULL OUTER JOIN cmp_rhs_ r ON l.k = r.k")
+    else:
+        joined = (f"SELECT l.k AS {q(key)}, {cols} "
+                  f"FROM cmp_lhs_ l LEFT JOIN cmp_rhs_ r ON l.k = r.k "
+                  f"UNION ALL "
+                  f"SELECT r.k AS {q(key)}, {cols} "
+                  f"FROM cmp_rhs_ r LEFT JOIN cmp_lhs_ l ON l.k = r.k "
+                  f"WHERE l.k IS NULL")
+    sql = (f"WITH cmp_lhs_ AS (SELECT {ident(key)} AS k, {aggs} FROM {ident(table1)} "
+           f"GROUP BY {ident(key)}), "
+           f"cmp_rhs_ AS (SELECT {ident(key)} AS k, {aggs} FROM {ident(table2)} "
+           f"GROUP BY {ident(key)}), "
+           f"cmp_out_ AS ({joined}) "
+           f"SELECT * FROM cmp_out_")
+    if diff_only:
+        sql += " WHERE " + " OR ".join(f"{q(n + '_diff')} <> 0" for n in names)
+    if top_n:
+        sql += f" ORDER BY ABS({q(names[0] + '_diff')}) DESC"
+        limit = min(limit, top_n)
+    else:
+        sql += f" ORDER BY {q(key)}"
+    if dialect.name in ("mssql", "oracle"):
+        return sql + f" OFFSET 0 ROWS FETCH NEXT {limit + 1} ROWS ONLY"
+    return sql + f" LIMIT {limit + 1}"   # one extra row tells us it was truncated
 
 
 # ---- Factory that returns a StructuredTool ---------------------------
@@ -22,28 +132,45 @@ def make_compare_tables_tool(db):
     Build a StructuredTool so the agent can pass arguments by name.
     """
 
-    def _compare(*, table1: str, table2: str, key: str, metrics: List[str]) -> str:
-        # helper to build "SUM(col) AS SUM_col_A"
-        def agg_list(alias: str) -> str:
-            return ", ".join(
-                f"{m} AS {m.replace('(', '_').replace(')', '')}_{alias}"
-                for m in metrics
-            )
+    def _compare(*, table1: str, table2: str, key: str, metrics: List[str],
+                 diff_only: bool = False, top_n: Optional[int] = None,
+                 limit: int = COMPARE_TABLES_MAX_ROWS) -> str:
+        limit = max(1, min(limit, COMPARE_TABLES_MAX_ROWS))
+        sql = build_compare_sql(db._engine.dialect, table1, table2, key, metrics,
+                                diff_only=diff_only, top_n=top_n, limit=limit)
+        _check_read_only(sql)
+        shown = min(limit, top_n) if top_n else limit
 
-        q1 = f"SELECT {key}, {agg_list('A')} FROM {table1} GROUP BY {key}"
-        q2 = f"SELECT {key}, {agg_list('B')} FROM {table2} GROUP BY {key}"
+        cache, conn_key = get_sql_result_cache(), connection_key(db)
+        cached = cache.get(conn_key, sql)
+        if cached is not None:
+            return cached
 
-        df1 = pd.read_sql(text(q1), db._engine)
-        df2 = pd.read_sql(text(q2), db._engine)
-        merged = df1.merge(df2, on=key, how="outer").fillna(0)
+        rows = []
+        with db._engine.connect() as conn, _read_only(conn):
+            result = conn.execution_options(stream_results=True).execute(text(sql))
+            columns = list(result.keys())
+            while len(rows) <= shown:
+                chunk = result.fetchmany(_FETCH_ROWS)
+                if not chunk:
+                    break
+                rows.extend(chunk)
+            result.close()
 
-        return merged.to_markdown(index=False)
+        out = pd.DataFrame(rows[:shown], columns=columns).to_markdown(index=False)
+        if len(rows) > shown and not (top_n and top_n <= limit):   # cut by the cap, not top_n
+            out += f"\n\n(first {limit} rows shown; use diff_only / top_n to narrow down)"
+        cache.put(conn_key, sql, out)
+        return out
 
     return StructuredTool(
         name="compare_tables",
         description=(
-            "Compare aggregates between two tables on a shared key.\n"
-            "Arguments: table1, table2, key, metrics (list of aggregates)."
+            "Compare aggregates between two tables on a shared key; runs as one "
+            "SQL statement in the database.\n"
+            "Arguments: table1, table2, key, metrics (list of aggregates); optional "
+            "diff_only (only keys that differ), top_n (largest differences first), "
+            "limit (max rows)."
         ),
         func=_compare,
         args_schema=CompareTablesArgs,
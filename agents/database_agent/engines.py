@@ -0,0 +1,181 @@
+# agents/database_agent/engines.py
+"""
+Process‑wide SQL connection registry.
+
+One SQLAlchemy engine (and one ``SQLDatabase`` wrapper) per connection
+string, shared by every Streamlit session and API client: pooled with
+``SQL_POOL_*`` sizes, ``pool_pre_ping`` to survive dropped connections
+and ``pool_recycle`` to retire them before server idle timeouts.
+
+The schema text the agent sees (DDL + sample rows per table) is
+snapshotted per connection under ``SCHEMA_CACHE_DIRECTORY`` together
+with a fingerprint that is cheap to recompute:
+
+    sqlite       PRAGMA schema_version
+    postgresql   md5 over information_schema.columns
+    other        the sorted table names
+
+A reconnect only re‑reflects when the fingerprint changed, and the
+snapshot is installed as the wrapper's ``custom_table_info`` so the
+agent's schema tool doesn't reflect either.  Per‑question lookups reuse
+a fingerprint for ``SCHEMA_FINGERPRINT_TTL_SECONDS``; a reconnect always
+recomputes it.
+"""
+import hashlib, json, os, statistics, threading, time
+from pathlib import Path
+
+from sqlalchemy import create_engine, event, inspect, text
+from sqlalchemy.engine import Engine, make_url
+from langchain_community.utilities.sql_database import SQLDatabase
+
+from config.settings import (
+    SQL_POOL_SIZE, SQL_MAX_OVERFLOW, SQL_POOL_TIMEOUT_SECONDS,
+    SQL_POOL_RECYCLE_SECONDS, SCHEMA_CACHE_DIRECTORY, SCHEMA_FINGERPRINT_TTL_SECONDS,
+)
+
+_ENGINES: dict[str, Engine] = {}
+_DATABASES: dict[str, SQLDatabase] = {}
+_LOCK = threading.Lock()
+
+
+class _StdevAggregate:
+    """Population standard deviation for SQLite (``stdev(col)``)."""
+
+    def __init__(self):
+        self.values = []
+
+    def step(self, value):
+        if value is not None:
+            self.values.append(float(value))
+
+    def finalize(self):
+        return statistics.pstdev(self.values) if self.values else None
+
+
+def _register_sqlite_functions(dbapi_conn, _record):
+    dbapi_conn.create_aggregate("stdev", 1, _StdevAggregate)
+
+
+def get_engine(conn_str: str) -> Engine:
+    engine = _ENGINES.get(conn_str)
+    if engine is not None:
+        return engine
+    with _LOCK:
+        engine = _ENGINES.get(conn_str)
+        if engine is None:
+            kwargs = dict(pool_pre_ping=True, pool_recycle=SQL_POOL_RECYCLE_SECONDS)
+            url = make_url(conn_str)
+            sqlite = url.get_backend_name() == "sqlite"
+            if not sqlite or (url.database and url.database != ":memory:"):
+                kwargs.update(pool_size=SQL_POOL_SIZE, max_overflow=SQL_MAX_OVERFLOW,
+                              pool_timeout=SQL_POOL_TIMEOUT_SECONDS)
+            engine = create_engine(url, **kwargs)
+            if sqlite:
+                # every pooled connection, not just the first one
+                event.listen(engine, "connect", _register_sqlite_functions)
+            _ENGINES[conn_str] = engine
+    return engine
+
+
+def get_database(conn_str: str) -> SQLDatabase:
+    """Shared ``SQLDatabase`` over :func:`get_engine`, with the schema
+    snapshot (refreshed if the fingerprint moved) as its table info."""
+    with _LOCK:
+        db = _DATABASES.get(conn_str)
+    if db is None:
+        db = SQLDatabase(get_engine(conn_str), lazy_table_reflection=True)
+        with _LOCK:
+            db = _DATABASES.setdefault(conn_str, db)
+    db._custom_table_info = schema_snapshot(conn_str, db, max_age=0)["tables"]
+    return db
+
+
+def dispose_engines():
+    with _LOCK:
+        for engine in _ENGINES.values():
+            engine.dispose()
+        _ENGINES.clear()
+        _DATABASES.clear()
+        _SNAPSHOTS.clear()
+        _FINGERPRINTS.clear()
+
+
+# ------------------------------------------------------------------
+# Schema snapshots
+# ------------------------------------------------------------------
+_SNAPSHOTS: dict[str, dict] = {}
+_FINGERPRINTS: dict[str, tuple[float, str]] = {}   # conn_str -> (computed at, fingerprint)
+
+
+def schema_fingerprint(engine: Engine) -> str:
+    dialect = engine.dialect.name
+    with engine.connect() as conn:
+        if dialect == "sqlite":
+            return f"sqlite:{conn.execute(text('PRAGMA schema_version')).scalar()}"
+        if dialect == "postgresql":
+            return "pg:" + str(conn.execute(text(
+                "SELECT md5(string_agg(table_schema || '.' || table_name || '.' || "
+                "column_name || ':' || data_type, ',' ORDER BY table_schema, table_name, "
+                "ordinal_position)) FROM information_schema.columns "
+                "WHERE table_schema NOT IN ('pg_catalog', 'information_schema')"
+            )).scalar())
+    names = sorted(inspect(engine).get_table_names())
+    return "tables:" + hashlib.sha256("\n".join(names).encode()).hexdigest()
+
+
+def cached_schema_fingerprint(conn_str: str,
+                              max_age: float = SCHEMA_FINGERPRINT_TTL_SECONDS) -> str:
+    """:func:`schema_fingerprint`, reused while younger than *max_age* seconds."""
+    now = time.monotonic()
+    with _LOCK:
+        cached = _FINGERPRINTS.get(conn_str)
+    if cached is not None and now - cached[0] < max_age:
+        return cached[1]
+    fingerprint = schema_fingerprint(get_engine(conn_str))
+    with _LOCK:
+        _FINGERPRINTS[conn_str] = (now, fingerprint)
+    return fingerprint
+
+
+def _snapshot_path(conn_str: str, directory: Path) -> Path:
+    return Path(directory) / (hashlib.sha256(conn_str.encode()).hexdigest()[:24] + ".json")
+
+
+def schema_snapshot(conn_str: str, db: SQLDatabase | None = None,
+                    directory: Path = SCHEMA_CACHE_DIRECTORY,
+                    max_age: float = SCHEMA_FINGERPRINT_TTL_SECONDS) -> dict:
+    """``{"fingerprint", "tables": {table: DDL + sample rows}}`` for
+    *conn_str*, from memory, then disk, rebuilding only when the schema
+    fingerprint (at most *max_age* seconds old) no longer matches."""
+    engine = get_engine(conn_str)
+    fingerprint = cached_schema_fingerprint(conn_str, max_age)
+    snap = _SNAPSHOTS.get(conn_str)
+    if snap is not None and snap["fingerprint"] == fingerprint:
+        return snap
+    path = _snapshot_path(conn_str, directory)
+    try:
+        with open(path, encoding="utf-8") as fh:
+            snap = json.load(fh)
+    except (FileNotFoundError, ValueError):
+        snap = None
+    if snap is None or snap.get("fingerprint") != fingerprint:
+        db = db or SQLDatabase(engine, lazy_table_reflection=True)
+        saved, db._custom_table_info = db._custom_table_info, None
+        try:
+            tables = {t: db.get_table_info([t]).strip()
+                      for t in sorted(db.get_usable_table_names())}
+        finally:
+            db._custom_table_info = saved
+        snap = {"fingerprint": fingerprint, "tables": tables}
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = path.with_suffix(".tmp")
+        with open(tmp, "w", encoding="utf-8") as fh:
+            json.dump(snap, fh)
+        os.replace(tmp, path)
+    _SNAPSHOTS[conn_str] = snap
+    return snap
+
+
+def schema_text(conn_str: str) -> str:
+    """The whole snapshot as one string (what ``db.get_table_info()`` gives)."""
+    return "\n\n".join(schema_snapshot(conn_str)["tables"].values())
@@ -1,20 +1,43 @@
 # read_only_sql_tool.py   
 from langchain_community.tools.sql_database.tool import QuerySQLDataBaseTool
 
+from .result_cache import get_sql_result_cache, connection_key, normalize_sql, _QUOTED
+from .streaming import run_capped
+
+
+def _check_read_only(query: str):
+    """Prefix check plus one statement only: a ``;`` outside quoted
+    literals (after comments and a trailing ``;`` are stripped) would
+    smuggle a second statement past it.  Statements still run in a
+    read‑only transaction (``streaming.stream_rows``)."""
+    safe = normalize_sql(query)
+    if not safe.lower().startswith(("select", "with")):
+        raise ValueError("Only SELECT / WITH statements are allowed in read‑only mode.")
+    if any(";" in part for part in _QUOTED.split(safe)[::2]):
+        raise ValueError("Only a single statement is allowed in read‑only mode.")
+
+
 class ReadOnlyQuerySQLDataBaseTool(QuerySQLDataBaseTool):
     """
     Drop‑in replacement for QuerySQLDataBaseTool that refuses
-    any statement not starting with SELECT or WITH.
+    any statement not starting with SELECT or WITH.  The row/byte cap
+    (``SQL_MAX_ROWS`` / ``SQL_MAX_RESULT_BYTES``) is pushed into the SQL
+    and rows are fetched in batches, so a bare ``SELECT *`` never pulls
+    the whole table.  Results are memoised per (connection, normalised
+    SQL) in the shared ``result_cache``; errors are never cached.
     """
 
     def _run(self, query: str):
-        safe = query.lower().lstrip()
-        if not (safe.startswith("select") or safe.startswith("with")):
-            raise ValueError("Only SELECT / WITH statements are allowed in read‑only mode.")
-        return super()._run(query)
+        _check_read_only(query)
+        cache, conn = get_sql_result_cache(), connection_key(self.db)
+        result = cache.get(conn, query)
+        if result is None:
+            result = run_capped(self.db, query)
+            if isinstance(result, str) and not result.startswith("Error:"):
+                cache.put(conn, query, result)
+        return result
 
     async def _arun(self, query: str):
-        safe = query.lower().lstrip()
-        if not (safe.startswith("select") or safe.startswith("with")):
-            raise ValueError("Only SELECT / WITH statements are allowed in read‑only mode.")
+        _check_read_only(query)
+        # the base class runs self._run in an executor: cached there
         return await super()._arun(query)
@@ -0,0 +1,159 @@
+# agents/database_agent/result_cache.py
+"""
+Process‑wide cache of read‑only query results.
+
+Keys are ``(connection, normalised SQL)``: comments dropped, whitespace
+collapsed outside quoted literals and identifiers, and a trailing ``;``
+removed, so the agent re‑issuing the same probe with different
+formatting while it self‑corrects is a hit.  Case is kept – identifier
+case is significant on some backends.  Each entry
+remembers the tables its statement reads from; :meth:`invalidate` drops
+a connection's entries (optionally only those touching given tables)
+when the caller knows the data changed, and the TTL bounds staleness
+otherwise.  The cache is bounded by entry count and by total result
+size, evicting least recently used entries first.
+"""
+import re, threading, time
+from collections import OrderedDict
+from dataclasses import dataclass
+from functools import lru_cache
+from typing import Iterable
+
+from config.settings import (
+    SQL_RESULT_CACHE_MAX_ENTRIES, SQL_RESULT_CACHE_MAX_BYTES, SQL_RESULT_CACHE_TTL_SECONDS,
+)
+
+# quoted literals / identifiers survive normalisation untouched
+_QUOTED = re.compile(r"('(?:[^']|'')*'|\"(?:[^\"]|\"\")*\"|`[^`]*`|\[[^\]]*\])")
+_STRING = re.compile(r"'(?:[^']|'')*'")
+_COMMENT = re.compile(r"--[^\n]*|/\*.*?\*/", re.S)
+_TABLE_REF = re.compile(r"(?i)\b(?:from|join)\s+((?:[\w$]+|\"[^\"]+\"|`[^`]+`|\[[^\]]+\])"
+                        r"(?:\.(?:[\w$]+|\"[^\"]+\"|`[^`]+`|\[[^\]]+\]))*)")
+
+
+def normalize_sql(sql: str) -> str:
+    parts = _QUOTED.split(sql)
+    for i in range(0, len(parts), 2):
+        parts[i] = re.sub(r"\s+", " ", _COMMENT.sub(" ", parts[i]))
+    return "".join(parts).strip().rstrip(";").strip()
+
+
+def _bare(name: str) -> str:
+    """Last dotted component, unquoted, lower‑case."""
+    return name.split(".")[-1].strip('"`[]').lower()
+
+
+def referenced_tables(normalized_sql: str) -> frozenset:
+    """Tables after FROM / JOIN (CTE names included – harmless)."""
+    return frozenset(_bare(m) for m in _TABLE_REF.findall(_STRING.sub("''", normalized_sql)))
+
+
+@dataclass
+class _Entry:
+    result: str
+    tables: frozenset
+    size: int
+    expires: float
+
+
+class _ConnStats:
+    __slots__ = ("hits", "misses", "evictions", "invalidations")
+
+    def __init__(self):
+        self.hits = self.misses = self.evictions = self.invalidations = 0
+
+
+class SQLResultCache:
+    def __init__(self,
+                 max_entries: int = SQL_RESULT_CACHE_MAX_ENTRIES,
+                 max_bytes: int = SQL_RESULT_CACHE_MAX_BYTES,
+                 ttl: float = SQL_RESULT_CACHE_TTL_SECONDS):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self._entries: "OrderedDict[tuple[str, str], _Entry]" = OrderedDict()
+        self._bytes = 0
+        self._stats: dict[str, _ConnStats] = {}
+        self._lock = threading.Lock()
+
+    def _conn(self, conn: str) -> _ConnStats:
+        return self._stats.setdefault(conn, _ConnStats())
+
+    def _drop(self, key):
+        self._bytes -= self._entries.pop(key).size
+
+    # ---------------- API ----------------
+    def get(self, conn: str, sql: str) -> str | None:
+        key = (conn, normalize_sql(sql))
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry.expires <= time.monotonic():
+                self._drop(key)
+                self._conn(conn).evictions += 1
+                entry = None
+            if entry is None:
+                self._conn(conn).misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self._conn(conn).hits += 1
+            return entry.result
+
+    def put(self, conn: str, sql: str, result: str):
+        normalized = normalize_sql(sql)
+        size = len(result.encode("utf-8", "ignore"))
+        if size > self.max_bytes:
+            return
+        key = (conn, normalized)
+        with self._lock:
+            if key in self._entries:
+                self._drop(key)
+            self._entries[key] = _Entry(result, referenced_tables(normalized), size,
+                                        time.monotonic() + self.ttl)
+            self._bytes += size
+            while len(self._entries) > self.max_entries or self._bytes > self.max_bytes:
+                old = next(iter(self._entries))
+                self._drop(old)
+                self._conn(old[0]).evictions += 1
+
+    def invalidate(self, conn: str | None = None, tables: Iterable[str] | None = None) -> int:
+        """Drop entries of *conn* (all connections if None) that read any
+        of *tables* (every entry if None); returns how many went."""
+        wanted = None if tables is None else {_bare(t) for t in tables}
+        with self._lock:
+            stale = [k for k, e in self._entries.items()
+                     if (conn is None or k[0] == conn)
+                     and (wanted is None or e.tables & wanted)]
+            for k in stale:
+                self._drop(k)
+                self._conn(k[0]).invalidations += 1
+            return len(stale)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    # ---------------- metrics ----------------
+    def stats(self) -> dict:
+        with self._lock:
+            per_conn = {}
+            for conn, s in self._stats.items():
+                lookups = s.hits + s.misses
+                per_conn[conn] = {
+                    "hits": s.hits, "misses": s.misses,
+                    "hit_rate": s.hits / lookups if lookups else 0.0,
+                    "evictions": s.evictions, "invalidations": s.invalidations,
+                    "entries": sum(1 for k in self._entries if k[0] == conn),
+                }
+            return {"entries": len(self._entries), "bytes": self._bytes,
+                    "max_bytes": self.max_bytes, "connections": per_conn}
+
+
+@lru_cache(maxsize=None)
+def get_sql_result_cache() -> SQLResultCache:
+    return SQLResultCache()
+
+
+def connection_key(db) -> str:
+    """Cache namespace of a ``SQLDatabase``: its URL without the password."""
+    return db._engine.url.render_as_string(hide_password=True)
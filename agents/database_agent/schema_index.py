@@ -0,0 +1,105 @@
+# agents/database_agent/schema_index.py
+"""
+Keyword index over a connection's schema snapshot, so each question is
+answered with the DDL of the few tables it is about instead of the whole
+schema.
+
+Every table is one BM25 document built from its snapshot text (DDL +
+sample rows): identifiers are split on ``_`` and camelCase and naive
+plurals are folded, so "sales per region" matches ``region_sales`` and
+``SalesRegion``.  The table's own name counts ``NAME_BOOST`` times.
+Tables referenced by a hit's foreign keys are appended (one hop) while
+there is room, since a join usually needs them.
+
+Indexes are rebuilt only when the snapshot fingerprint changes.
+"""
+import math, re, threading
+from collections import Counter
+
+from config.settings import SQL_SCHEMA_TOP_K, SQL_SCHEMA_FULL_MAX_TABLES
+from .engines import schema_snapshot
+
+K1, B = 1.5, 0.75   # same BM25 parameters as the document keyword index
+NAME_BOOST = 3
+_WORD_RE = re.compile(r"[A-Z]+(?![a-z])|[A-Z]?[a-z]+|\d+")
+_REF_RE = re.compile(r"REFERENCES\s+[\"`\[]?(\w+)", re.IGNORECASE)
+
+
+def schema_tokens(text: str) -> list[str]:
+    out = []
+    for word in _WORD_RE.findall(text):
+        word = word.lower()
+        if len(word) > 3 and word.endswith("s") and not word.endswith("ss"):
+            word = word[:-1]
+        out.append(word)
+    return out
+
+
+class SchemaIndex:
+    def __init__(self, tables: dict[str, str]):
+        self.tables = tables
+        self.names = list(tables)
+        self.refs = {t: [r for r in dict.fromkeys(_REF_RE.findall(ddl))
+                         if r in tables and r != t]
+                     for t, ddl in tables.items()}
+        self._tf: list[Counter] = []
+        df: Counter = Counter()
+        for name, ddl in tables.items():
+            tf = Counter(schema_tokens(ddl))
+            for tok in schema_tokens(name):
+                tf[tok] += NAME_BOOST
+            self._tf.append(tf)
+            df.update(tf.keys())
+        n = len(self._tf)
+        self._idf = {t: math.log(1 + (n - d + 0.5) / (d + 0.5)) for t, d in df.items()}
+        self._avg = sum(sum(tf.values()) for tf in self._tf) / n if n else 0.0
+
+    def search(self, question: str, k: int = SQL_SCHEMA_TOP_K) -> list[str]:
+        """Up to *k* table names, best first, plus FK neighbours of the hits
+        while under *k*."""
+        terms = [t for t in dict.fromkeys(schema_tokens(question)) if t in self._idf]
+        scored = []
+        for i, tf in enumerate(self._tf):
+            length = sum(tf.values())
+            s = 0.0
+            for t in terms:
+                f = tf.get(t)
+                if f:
+                    s += self._idf[t] * f * (K1 + 1) / (f + K1 * (1 - B + B * length / self._avg))
+            if s > 0:
+                scored.append((s, i))
+        scored.sort(reverse=True)
+        hits = [self.names[i] for _, i in scored[:k]]
+        for name in list(hits):
+            for ref in self.refs[name]:
+                if len(hits) >= k:
+                    break
+                if ref not in hits:
+                    hits.append(ref)
+        return hits
+
+    def context(self, question: str, k: int = SQL_SCHEMA_TOP_K,
+                full_max: int = SQL_SCHEMA_FULL_MAX_TABLES) -> str:
+        """Prompt text for *question*: the whole schema when it is small,
+        otherwise the DDL of :meth:`search`'s tables."""
+        if len(self.tables) <= full_max:
+            names = self.names
+        else:
+            names = self.search(question, k)
+        if not names:
+            return "(no table matched the question; use sql_db_list_tables)"
+        return "\n\n".join(self.tables[n] for n in names)
+
+
+_INDEXES: dict[str, tuple[str, SchemaIndex]] = {}
+_LOCK = threading.Lock()
+
+
+def get_schema_index(conn_str: str) -> SchemaIndex:
+    snap = schema_snapshot(conn_str)
+    with _LOCK:
+        cached = _INDEXES.get(conn_str)
+        if cached is None or cached[0] != snap["fingerprint"]:
+            cached = (snap["fingerprint"], SchemaIndex(snap["tables"]))
+            _INDEXES[conn_str] = cached
+    return cached[1]
@@ -0,0 +1,282 @@
+# agents/database_agent/streaming.py
+"""
+Bounded, streamed retrieval of read‑only query results.
+
+Every statement is wrapped as
+
+    SELECT * FROM (<query>) AS capped_ LIMIT <cap> OFFSET <offset>
+
+so the database stops at the cap instead of the client discarding rows,
+and runs in a read‑only transaction (:func:`_read_only`).  Rows arrive
+through a server‑side cursor (``stream_results``) in ``fetchmany``
+batches of ``SQL_FETCH_ROWS``.  A derived table needs unique column
+names (MySQL rejects duplicates, SQLite renames them), so a query whose
+output names can't be shown unique from its text – ``SELECT *`` over a
+join, unaliased expressions – runs unwrapped, as everything does on SQL
+Server (no ORDER BY inside a derived table), and the cap/offset are
+applied while fetching.
+
+Pages are addressed by continuation tokens: opaque base64 of
+``{digest of the normalised query, next offset}``.  A token only resumes
+the query it was issued for.  Offsets are only stable when the query has
+an ORDER BY.
+
+:func:`ndjson_lines` and :func:`arrow_chunks` encode a row stream for
+the API's raw streaming endpoint.
+"""
+import base64, hashlib, io, json, re
+from contextlib import closing, contextmanager
+from typing import Iterator, List, Sequence, Tuple
+
+import pyarrow as pa
+from sqlalchemy import text
+from sqlalchemy.engine import Connection, Engine
+from sqlalchemy.exc import SQLAlchemyError
+
+from config.settings import (
+    SQL_MAX_ROWS, SQL_MAX_RESULT_BYTES, SQL_FETCH_ROWS, SQL_PAGE_ROWS,
+)
+from .result_cache import normalize_sql, _QUOTED
+
+Batch = Tuple[List[str], List[tuple]]
+
+_NAME = r'"[^"]+"|`[^`]+`|\[[^\]]+\]|[A-Za-z_][\w$]*'
+_COLUMN = re.compile(rf"\s*(?:(?:{_NAME})\s*\.\s*)*({_NAME})\s*")
+_ALIASED = re.compile(rf"(?is).+\s+as\s+({_NAME})\s*")
+_CLAUSES = {"from", "where", "group", "having", "order", "limit", "offset", "fetch",
+            "union", "intersect", "except", "window", "into"}
+
+
+def _unique_columns(sql: str) -> bool:
+    """Whether the top‑level SELECT of *sql* (comment‑free) provably has
+    unique output column names: every item is a column or ``… AS alias``
+    and the names differ, or the list is a lone ``*`` / ``t.*`` over a
+    single FROM source.  Anything else counts as not unique."""
+    masked = _QUOTED.sub(lambda m: " " * len(m.group()), sql)
+    marks, depth = [], 0           # top‑level words and commas
+    for m in re.finditer(r"[(),]|\w+", masked):
+        tok = m.group().lower()
+        if tok == "(":
+            depth += 1
+        elif tok == ")":
+            depth -= 1
+        elif depth == 0:
+            marks.append((m.start(), m.end(), tok))
+    words = [tok for _, _, tok in marks]
+    if "select" not in words:
+        return False
+    i = words.index("select")
+    items, start, j = [], marks[i][1], i + 1
+    while j < len(marks) and marks[j][2] not in _CLAUSES:
+        if marks[j][2] == ",":
+            items.append(sql[start:marks[j][0]])
+            start = marks[j][1]
+        j += 1
+    items.append(sql[start:marks[j][0] if j < len(marks) else len(sql)])
+    items[0] = re.sub(r"(?i)^\s*(?:distinct|all)\b", "", items[0])
+
+    if items[0].strip().endswith("*"):
+        if len(items) > 1 or j == len(marks) or marks[j][2] != "from":
+            return False
+        source = []
+        for _, _, tok in marks[j + 1:]:
+            if tok in _CLAUSES:
+                break
+            source.append(tok)
+        return "join" not in source and "," not in source
+
+    names = []
+    for item in items:
+        m = _ALIASED.fullmatch(item) or _COLUMN.fullmatch(item)
+        if m is None:
+            return False
+        names.append(m.group(1).strip('"`[]').lower())
+    return len(set(names)) == len(names)
+
+
+def cap_sql(query: str, dialect: str, limit: int, offset: int = 0) -> str | None:
+    """*query* with the row cap pushed into the SQL, or ``None`` when it
+    can't be wrapped – SQL Server, or output column names that aren't
+    provably unique (the caller then caps while fetching).  Comments are
+    stripped first – a trailing ``-- …`` would swallow the closing
+    parenthesis – and the parenthesis goes on its own line regardless."""
+    inner = normalize_sql(query)
+    if dialect == "mssql" or not _unique_columns(inner):
+        return None
+    if dialect == "oracle":
+        return (f"SELECT * FROM ({inner}\n) capped_ "
+                f"OFFSET {offset} ROWS FETCH NEXT {limit} ROWS ONLY")
+    return f"SELECT * FROM ({inner}\n) AS capped_ LIMIT {limit} OFFSET {offset}"
+
+
+@contextmanager
+def _read_only(conn: Connection):
+    """Make *conn*'s next transaction read‑only where the dialect can, so a
+    writable CTE or function call can't change data: PostgreSQL
+    ``postgresql_readonly``, MySQL / Oracle ``SET TRANSACTION READ ONLY``,
+    SQLite ``PRAGMA query_only`` (reset afterwards – the connection is
+    pooled).  SQL Server has no equivalent; there only the statement
+    checks apply."""
+    name = conn.dialect.name
+    if name == "postgresql":
+        conn.execution_options(postgresql_readonly=True)
+    elif name in ("mysql", "mariadb", "oracle"):
+        conn.exec_driver_sql("SET TRANSACTION READ ONLY")
+    elif name == "sqlite":
+        conn.exec_driver_sql("PRAGMA query_only = ON")
+    try:
+        yield conn
+    finally:
+        if name == "sqlite":
+            conn.exec_driver_sql("PRAGMA query_only = OFF")
+
+
+def stream_rows(engine: Engine, query: str, max_rows: int, offset: int = 0,
+                fetch_rows: int = SQL_FETCH_ROWS) -> Iterator[Batch]:
+    """Yield ``(columns, rows)`` batches of at most *fetch_rows*, stopping
+    after *max_rows* rows in total (one empty batch for an empty result,
+    so the columns are still known)."""
+    capped = cap_sql(query, engine.dialect.name, max_rows, offset)
+    skip = 0 if capped else offset
+    with engine.connect() as conn, _read_only(conn):
+        result = conn.execution_options(stream_results=True).execute(text(capped or query))
+        columns = list(result.keys())
+        left, sent = max_rows, False
+        try:
+            while left > 0:
+                batch = result.fetchmany(min(fetch_rows, left + skip))
+                if not batch:
+                    break
+                if skip:
+                    dropped = min(skip, len(batch))
+                    batch, skip = batch[dropped:], skip - dropped
+                    if not batch:
+                        continue
+                batch = [tuple(r) for r in batch[:left]]
+                left -= len(batch)
+                sent = True
+                yield columns, batch
+            if not sent:
+                yield columns, []
+        finally:
+            result.close()
+
+
+# ------------------------------------------------------------------
+# Pages and continuation tokens
+# ------------------------------------------------------------------
+def _query_digest(query: str) -> str:
+    return hashlib.sha256(normalize_sql(query).encode()).hexdigest()[:16]
+
+
+def encode_page_token(query: str, offset: int) -> str:
+    raw = json.dumps({"q": _query_digest(query), "o": offset}).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_page_token(token: str, query: str) -> int:
+    """The offset *token* resumes at; ``ValueError`` if it is malformed
+    or was issued for a different query."""
+    try:
+        data = json.loads(base64.urlsafe_b64decode(token + "=" * (-len(token) % 4)))
+        offset = int(data["o"])
+    except Exception as e:
+        raise ValueError("invalid page token") from e
+    if data.get("q") != _query_digest(query) or offset < 0:
+        raise ValueError("page token does not belong to this query")
+    return offset
+
+
+def fetch_page(engine: Engine, query: str, page_token: str | None = None,
+               page_rows: int = SQL_PAGE_ROWS,
+               max_bytes: int = SQL_MAX_RESULT_BYTES) -> dict:
+    """One page of *query*: ``{"columns", "rows", "next_page_token"}``.
+    A page ends at *page_rows* rows or once its rows pass *max_bytes*
+    (estimated from their repr); the token resumes right after it."""
+    offset = decode_page_token(page_token, query) if page_token else 0
+    columns, rows, size, more = [], [], 0, False
+    # one extra row says whether another page exists
+    with closing(stream_rows(engine, query, page_rows + 1, offset)) as batches:
+        for columns, batch in batches:
+            for row in batch:
+                if len(rows) == page_rows or (rows and size >= max_bytes):
+                    more = True
+                    break
+                rows.append(row)
+                size += len(repr(row))
+            if more:
+                break
+    return {
+        "columns": columns,
+        "rows": rows,
+        "next_page_token": encode_page_token(query, offset + len(rows)) if more else None,
+    }
+
+
+def run_capped(db, query: str, max_rows: int = SQL_MAX_ROWS,
+               max_bytes: int = SQL_MAX_RESULT_BYTES) -> str:
+    """What ``SQLDatabase.run`` returns (``str`` of row tuples, long
+    values truncated, ``""`` for no rows), computed from one capped page;
+    a note tells the agent when rows were cut.  Errors come back as
+    ``"Error: …"`` strings, like ``run_no_throw``."""
+    from langchain_community.utilities.sql_database import truncate_word
+
+    try:
+        page = fetch_page(db._engine, query, page_rows=max_rows, max_bytes=max_bytes)
+    except SQLAlchemyError as e:
+        return f"Error: {e}"
+    if not page["rows"]:
+        return ""
+    res = [tuple(truncate_word(v, length=db._max_string_length) for v in row)
+           for row in page["rows"]]
+    out = str(res)
+    if page["next_page_token"]:
+        out += (f"\n(result truncated at {len(res)} rows; aggregate, filter "
+                f"or add LIMIT to see what you need)")
+    return out
+
+
+# ------------------------------------------------------------------
+# Raw stream encoders
+# ------------------------------------------------------------------
+def ndjson_lines(batches: Iterator[Batch]) -> Iterator[bytes]:
+    """``{"columns": [...]}`` first, then one JSON array per row."""
+    header = False
+    for columns, rows in batches:
+        if not header:
+            yield (json.dumps({"columns": columns}) + "\n").encode()
+            header = True
+        yield "".join(json.dumps(list(r), default=str) + "\n" for r in rows).encode()
+
+
+def _arrow_column(values: Sequence, type_=None) -> pa.Array:
+    """*values* as *type_* (inferred when ``None``).  Values that don't fit
+    a fixed type are coerced to it; mixed columns become strings."""
+    try:
+        arr = pa.array(values, type=type_, from_pandas=True)
+    except (pa.ArrowInvalid, pa.ArrowTypeError, TypeError):
+        if type_ is None or pa.types.is_string(type_):
+            return pa.array([None if v is None else str(v) for v in values], type=pa.string())
+        return pa.array(values, from_pandas=True).cast(type_, safe=False)
+    return arr.cast(pa.string()) if pa.types.is_null(arr.type) else arr
+
+
+def arrow_chunks(batches: Iterator[Batch]) -> Iterator[bytes]:
+    """An Arrow IPC stream, one record batch per fetch; the schema is
+    inferred from the first batch."""
+    sink, writer, schema = io.BytesIO(), None, None
+    for columns, rows in batches:
+        cols = list(zip(*rows)) or [()] * len(columns)
+        if schema is None:
+            arrays = [_arrow_column(c) for c in cols]
+            schema = pa.schema([pa.field(n, a.type) for n, a in zip(columns, arrays)])
+            writer = pa.ipc.new_stream(sink, schema)
+        else:
+            arrays = [_arrow_column(c, f.type) for c, f in zip(cols, schema)]
+        writer.write_batch(pa.record_batch(arrays, schema=schema))
+        yield sink.getvalue()
+        sink.seek(0)
+        sink.truncate()
+    if writer is not None:
+        writer.close()
+        yield sink.getvalue()
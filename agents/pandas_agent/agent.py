@@ -3,6 +3,13 @@
 import pandas as pd
 from langchain_openai import ChatOpenAI
 from langchain_experimental.agents import create_pandas_dataframe_agent
+from langchain.agents import AgentExecutor, create_tool_calling_agent
+from langchain_core.prompts import ChatPromptTemplate
+from langchain.tools import StructuredTool
+from pydantic import BaseModel, Field
+
+from config.settings import PANDAS_AGENT_BACKEND
+from utils.table_profile import profile_table, profile_markdown
 from .pandas_tools import make_describe_tool, make_plot_tool
 
 
@@ -11,8 +18,13 @@ def _flatten_sheets(files_dict):
     dfs = [df for sheets in files_dict.values() for df in sheets.values()]
     return dfs[0] if len(dfs) == 1 else dfs
 
-def build_pandas_agent_with_memory(files_dict, temperature=0.0):
+def build_pandas_agent_with_memory(files_dict, temperature=0.0,
+                                   backend=PANDAS_AGENT_BACKEND):
     llm = ChatOpenAI(model_name="gpt-3.5-turbo", temperature=temperature)
+    if backend == "duckdb":
+        return _build_duckdb_agent(files_dict, llm)
+    if backend != "pandas":
+        raise ValueError('PANDAS_AGENT_BACKEND must be "pandas" or "duckdb"')
 
     agent = create_pandas_dataframe_agent(
         llm=llm,
@@ -29,10 +41,67 @@ def build_pandas_agent_with_memory(files_dict, temperature=0.0):
     )
     return agent
 
-def explain_dataframes(files_dict, agent):
+class SQLArgs(BaseModel):
+    query: str = Field(..., description="A single DuckDB SQL statement")
+
+
+_DUCKDB_SYSTEM = (
+    "You are a data analyst answering questions about uploaded spreadsheets.\n"
+    "The data lives in DuckDB; answer with the `sql_query` tool (DuckDB SQL) and "
+    "let the database filter and aggregate – at most {max_rows} result rows come "
+    "back per query. Use `describe_df` for column statistics and `plot_df` for "
+    "bar charts. Quote table and column names with double quotes.\n\n{schema}"
+)
+
+
+def _build_duckdb_agent(files_dict, llm):
+    """Tool‑calling agent over DuckDB views of the table cache."""
+    from .duckdb_backend import DuckDBTables
+
+    tables = DuckDBTables(files_dict)
+    tools = [
+        StructuredTool(
+            name="sql_query",
+            description="Run DuckDB SQL over the uploaded sheets and return the rows as markdown.",
+            func=tables.query,
+            args_schema=SQLArgs,
+        ),
+        make_describe_tool(files_dict, tables),
+        make_plot_tool(files_dict, tables),
+    ]
+    system = _DUCKDB_SYSTEM.format(max_rows=tables.max_rows,
+                                   schema=tables.schema_prompt())
+    prompt = ChatPromptTemplate.from_messages([
+        ("system", system.replace("{", "{{").replace("}", "}}")),
+        ("human", "{input}"),
+        ("placeholder", "{agent_scratchpad}"),
+    ])
+    return AgentExecutor(
+        agent=create_tool_calling_agent(llm, tools, prompt),
+        tools=tools,
+        max_iterations=20,
+        verbose=True,
+    )
+
+
+def _sheet_profiles(files_dict) -> str:
+    parts = []
+    for fname, sheets in files_dict.items():
+        for sname in sheets:
+            profile = (sheets.profile(sname) if hasattr(sheets, "profile")
+                       else profile_table(sheets[sname]))
+            parts.append(f"### `{fname}` / `{sname}`\n{profile_markdown(profile)}")
+    return "\n\n".join(parts)
+
+
+def explain_dataframes(files_dict, temperature=0.0):
+    """One LLM call over the precomputed column profiles (no agent loop,
+    no pass over the data)."""
     prompt = (
         "Generate a concise, reader‑friendly profile of each sheet, covering\n"
         "• column names & types • key stats • missing‑value counts • obvious anomalies.\n"
-        "Finish with three insights or questions the user might explore next."
+        "Finish with three insights or questions the user might explore next.\n\n"
+        "Column profiles:\n\n" + _sheet_profiles(files_dict)
     )
-    return agent.run(prompt)
+    llm = ChatOpenAI(model_name="gpt-3.5-turbo", temperature=temperature)
+    return llm.invoke(prompt).content
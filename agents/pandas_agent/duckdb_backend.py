@@ -0,0 +1,106 @@
+# agents/pandas_agent/duckdb_backend.py
+"""
+Out‑of‑core backend for the pandas agent (``PANDAS_AGENT_BACKEND="duckdb"``).
+
+Every uploaded sheet is registered as a DuckDB view over its Arrow file
+in the table cache (``utils/table_cache.py``).  DuckDB scans those files
+through ``pyarrow.dataset`` with projection and filter pushdown, so a
+query only reads the columns and row groups it needs and nothing is
+loaded into pandas up front.  The agent writes DuckDB SQL instead of
+pandas code; ``describe_df`` / ``plot_df`` run against the same views.
+"""
+import re, threading
+
+import pandas as pd
+
+from config.settings import DUCKDB_MEMORY_LIMIT, DUCKDB_MAX_RESULT_ROWS
+
+
+def _view_name(file: str, sheet: str, taken: set) -> str:
+    stem = file.rsplit(".", 1)[0]
+    base = re.sub(r"[^a-z0-9]+", "_", f"{stem}_{sheet}".lower()).strip("_") or "t"
+    if base[0].isdigit():
+        base = "t_" + base
+    name, n = base, 2
+    while name in taken:
+        name, n = f"{base}_{n}", n + 1
+    taken.add(name)
+    return name
+
+
+def _quote(ident: str) -> str:
+    return '"' + str(ident).replace('"', '""') + '"'
+
+
+class DuckDBTables:
+    """DuckDB views over ``{file: {sheet: ...}}`` uploads.
+
+    Values may be ``TableFile`` objects from the table cache (scanned
+    lazily) or plain dicts of DataFrames (registered as they are).  One
+    in‑memory connection, serialised by a lock.
+    """
+
+    def __init__(self, files_dict: dict,
+                 memory_limit: str = DUCKDB_MEMORY_LIMIT,
+                 max_rows: int = DUCKDB_MAX_RESULT_ROWS):
+        try:
+            import duckdb
+        except ImportError as e:
+            raise RuntimeError(
+                'PANDAS_AGENT_BACKEND="duckdb" needs the duckdb package (pip install duckdb)'
+            ) from e
+        self.con = duckdb.connect(config={"memory_limit": memory_limit})
+        self.max_rows = max_rows
+        self._lock = threading.Lock()
+        self.views: dict[tuple[str, str], str] = {}
+        taken: set = set()
+        for file, sheets in files_dict.items():
+            for sheet in sheets:
+                name = _view_name(file, sheet, taken)
+                source = sheets.dataset(sheet) if hasattr(sheets, "dataset") else sheets[sheet]
+                self.con.register(name, source)
+                self.views[(file, sheet)] = name
+
+    def view(self, file: str, sheet: str | None = None) -> str:
+        if sheet is None:
+            sheet = next(s for f, s in self.views if f == file)
+        return self.views[(file, sheet)]
+
+    def _df(self, sql: str, params=None) -> pd.DataFrame:
+        with self._lock:
+            return self.con.execute(sql, params or []).df()
+
+    def query(self, sql: str) -> str:
+        """Run *sql*; at most ``max_rows`` rows come back, as markdown."""
+        with self._lock:
+            cur = self.con.execute(sql)
+            if cur.description is None:
+                return "OK"
+            columns = [d[0] for d in cur.description]
+            rows = cur.fetchmany(self.max_rows + 1)
+        df = pd.DataFrame(rows[: self.max_rows], columns=columns)
+        out = df.to_markdown(index=False)
+        if len(rows) > self.max_rows:
+            out += f"\n\n(first {self.max_rows} rows only; aggregate or add LIMIT/WHERE)"
+        return out
+
+    def describe(self, file: str, sheet: str | None = None) -> pd.DataFrame:
+        """Per‑column summary (count, nulls, min/max, mean, quantiles…)."""
+        return self._df(f"SUMMARIZE {_quote(self.view(file, sheet))}")
+
+    def select(self, file: str, sheet: str | None, columns: list[str]) -> pd.DataFrame:
+        cols = ", ".join(_quote(c) for c in columns)
+        return self._df(f"SELECT {cols} FROM {_quote(self.view(file, sheet))}")
+
+    def schema_prompt(self, head_rows: int = 5) -> str:
+        """Tables, columns and a few sample rows, for the agent's prompt."""
+        parts = []
+        for (file, sheet), name in self.views.items():
+            n = self._df(f"SELECT count(*) AS n FROM {_quote(name)}")["n"][0]
+            cols = self._df(f"DESCRIBE {_quote(name)}")
+            col_list = ", ".join(f"{c} {t}" for c, t in
+                                 zip(cols["column_name"], cols["column_type"]))
+            head = self._df(f"SELECT * FROM {_quote(name)} LIMIT {int(head_rows)}")
+            parts.append(f'Table "{name}" (file `{file}`, sheet `{sheet}`, {n} rows): '
+                         f"{col_list}\n{head.to_markdown(index=False)}")
+        return "\n\n".join(parts)
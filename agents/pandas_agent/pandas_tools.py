@@ -7,6 +7,8 @@ from langchain.tools import StructuredTool
 import matplotlib.pyplot as plt
 import streamlit as st
 
+from utils.table_profile import profile_table, profile_markdown
+
 # ─────────────────── describe_df ───────────────────
 class DescribeArgs(BaseModel):
     file: Optional[str] = Field(
@@ -21,7 +23,10 @@ class DescribeArgs(BaseModel):
         # nothing to do here; we’ll handle it in the function
         return values
 
-def make_describe_tool(files_dict: dict):
+def make_describe_tool(files_dict: dict, tables=None):
+    """Cached uploads answer from their stored column profile; otherwise
+    *tables* (a ``DuckDBTables``) computes the statistics in DuckDB, or
+    the frame is profiled on the spot."""
     filenames = list(files_dict.keys())
 
     def _describe(file: Optional[str] = None, sheet: Optional[str] = None) -> str:
@@ -36,8 +41,12 @@ def make_describe_tool(files_dict: dict):
         sheets = list(files_dict[file].keys())
         target_sheet = sheet or sheets[0]
 
+        if hasattr(files_dict[file], "profile"):
+            return profile_markdown(files_dict[file].profile(target_sheet))
+        if tables is not None:
+            return tables.describe(file, target_sheet).to_markdown(index=False)
         df = files_dict[file][target_sheet]
-        return df.describe(include="all").to_markdown()
+        return profile_markdown(profile_table(df))
 
     return StructuredTool(
         name="describe_df",
@@ -60,7 +69,7 @@ class PlotArgs(BaseModel):
     x: str = Field(..., description="Column for x-axis")
     y: str = Field(..., description="Column for y-axis")
 
-def make_plot_tool(files_dict: dict):
+def make_plot_tool(files_dict: dict, tables=None):
     filenames = list(files_dict.keys())
 
     def _plot(
@@ -80,7 +89,14 @@ def make_plot_tool(files_dict: dict):
         sheets = list(files_dict[file].keys())
         target_sheet = sheet or sheets[0]
 
-        df = files_dict[file][target_sheet]
+        sheets_of_file = files_dict[file]
+        if tables is not None:
+            df = tables.select(file, target_sheet, [x, y])
+        elif hasattr(sheets_of_file, "read"):
+            # cached upload: only load the two plotted columns
+            df = sheets_of_file.read(target_sheet, columns=[x, y])
+        else:
+            df = sheets_of_file[target_sheet]
 
         # do the plot
         fig, ax = plt.subplots()
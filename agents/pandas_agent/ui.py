@@ -1,9 +1,11 @@
 # agents/pandas_agent/ui.py
 import streamlit as st
-import pandas as pd
 
+from utils.table_cache import open_tables
 from .agent import build_pandas_agent_with_memory, explain_dataframes
 
+PREVIEW_ROWS = 1000
+
 def run_ui(temperature):
     """📊 Upload & Chat with DataFrames"""
     st.subheader("Pandas Agent")
@@ -23,16 +25,10 @@ def run_ui(temperature):
                 if name in st.session_state.pandas_files:
                     continue
                 try:
-                    if name.lower().endswith(".csv"):
-                        df = pd.read_csv(f, na_values=["NA","n/a","---"])
-                        st.session_state.pandas_files[name] = {"Sheet1": df}
-                    else:
-                        sheets = pd.read_excel(
-                            f, sheet_name=None, na_values=["NA","n/a","---"]
-                        )
-                        for k,df in sheets.items():
-                            sheets[k] = df
-                        st.session_state.pandas_files[name] = sheets
+                    # parsed once per content hash, then memory-mapped
+                    st.session_state.pandas_files[name] = open_tables(
+                        f, name, na_values=["NA","n/a","---"]
+                    )
                 except Exception as e:
                     st.error(f"Error loading {name}: {e}")
             st.success("Files loaded!")
@@ -63,9 +59,12 @@ def run_ui(temperature):
         # previews
         for fname, sheets in dfs.items():
             st.markdown(f"#### `{fname}` Previews")
-            for sname, df in sheets.items():
+            for sname in sheets:
                 with st.expander(f"{sname}"):
-                    st.dataframe(df)
+                    n = sheets.num_rows(sname)
+                    if n > PREVIEW_ROWS:
+                        st.caption(f"First {PREVIEW_ROWS} of {n} rows")
+                    st.dataframe(sheets.read(sname, stop=PREVIEW_ROWS))
 
         agent = build_pandas_agent_with_memory(dfs, temperature=temperature)
         chat_box = st.empty()
@@ -79,7 +78,7 @@ def run_ui(temperature):
 
         if not st.session_state.pandas_conversation:
             with st.spinner("Explaining data…"):
-                expl = explain_dataframes(dfs, agent)
+                expl = explain_dataframes(dfs, temperature)
                 st.session_state.pandas_conversation.append(
                     {"role":"agent","content":expl}
                 )
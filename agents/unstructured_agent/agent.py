@@ -1,13 +1,24 @@
 # agents/unstructured_agent/agent.py
-import os, re, json, cohere
-from typing import List
+import os, re, json, time, asyncio, cohere
+from contextlib import contextmanager
+from typing import AsyncIterator, List
 
 import streamlit as st
 from langchain.schema import Document
 from langchain.memory import ConversationSummaryMemory
 from langchain_community.llms import OpenAI
-from langchain_community.retrievers import BM25Retriever
-from agents.unstructured_agent.vector_store import get_vector_store       
+from agents.unstructured_agent.vector_store import (
+    get_vector_store, vector_search_with_scores, keyword_search_with_scores,
+)
+from agents.unstructured_agent.fusion import fuse, FUSION_METHODS
+from agents.unstructured_agent.filters import merge_filters, normalize_filters
+from agents.unstructured_agent.answer_cache import get_answer_cache
+from agents.unstructured_agent.keyword_index import tokenize
+from agents.unstructured_agent.rerank import Reranker
+from config.settings import (
+    LLM_MAX_CONCURRENCY, RETRIEVAL_FUSION, RETRIEVAL_CANDIDATES,
+    VERIFY_MODE, VERIFY_LOCAL_THRESHOLD,
+)
 
 # ------------------------------------------------------------------
 # Keys & clients
@@ -19,8 +30,14 @@ if not COHERE_API_KEY or not OPENAI_API_KEY:
     st.stop()
 
 cohere_client = cohere.Client(COHERE_API_KEY)
+cohere_async_client = cohere.AsyncClient(COHERE_API_KEY)
+reranker = Reranker(cohere_client, cohere_async_client)
 os.environ["OPENAI_API_KEY"] = OPENAI_API_KEY
 
+# per‑backend limit for the async path (one event loop per process);
+# the reranker keeps its own
+_LLM_LIMIT = asyncio.Semaphore(LLM_MAX_CONCURRENCY)
+
 SYSTEM_PROMPT = (
     "You are an AI assistant for an Institutional Research department. "
     "Answer factually, cite sources, and ask follow‑ups when uncertain."
@@ -45,34 +62,74 @@ def _verify_numeric(answer: str, docs: list[Document]) -> bool:
 def rerank_chunks(query: str,
                   docs: List[Document],
                   top_k: int = 3) -> List[Document]:
-    if not docs:
-        return []
-    try:
-        resp = cohere_client.rerank(
-            model="rerank-3-nimble",
-            query=query,
-            documents=[d.page_content for d in docs],
-            top_n=top_k,
-        )
-        return [docs[r.index] for r in resp.results]
-    except Exception:
-        return docs[:top_k]
+    return reranker.rerank(query, docs, top_k=top_k)
+
+async def arerank_chunks(query: str,
+                         docs: List[Document],
+                         top_k: int = 3) -> List[Document]:
+    return await reranker.arerank(query, docs, top_k=top_k)
 
 # --------------- Hallucination check -----
-def verify_answer(answer: str,
-                  docs: List[Document],
-                  llm) -> bool:
+# "llm"     numeric guard, then a second LLM call (the original behaviour)
+# "local"   numeric guard, then a lexical entailment score – no API call
+# "numeric" numeric guard only
+# "off"     no verification
+VERIFY_MODES = ("llm", "local", "numeric", "off")
+
+_STOPWORDS = frozenset(
+    "a an and are as at be by for from has have in is it its of on or that "
+    "the their there these this to was were which with i you we they".split()
+)
+
+def _verify_prompt(answer: str, docs: List[Document]) -> str:
     context = "\n\n".join(d.page_content for d in docs[:5])
-    prompt = (
+    return (
         "If every factual statement in the ANSWER is supported by the PASSAGES, "
         "reply 'yes'; otherwise 'no'.\n\nANSWER:\n"
         f"{answer}\n\nPASSAGES:\n{context}\n"
     )
-    return llm(prompt).strip().lower().startswith("yes")
+
+def verify_answer(answer: str,
+                  docs: List[Document],
+                  llm) -> bool:
+    return llm(_verify_prompt(answer, docs)).strip().lower().startswith("yes")
+
+async def averify_answer(answer: str,
+                         docs: List[Document],
+                         llm) -> bool:
+    async with _LLM_LIMIT:
+        reply = await llm.ainvoke(_verify_prompt(answer, docs))
+    return reply.strip().lower().startswith("yes")
+
+def support_score(answer: str, docs: List[Document]) -> float:
+    """Lowest per‑sentence share of answer content words found in *docs*.
+
+    A cheap stand‑in for an entailment model: a sentence whose words
+    mostly don't occur in the passages is probably not supported by them.
+    """
+    vocab = set(tokenize(" ".join(d.page_content for d in docs[:5])))
+    scores = []
+    for sentence in re.split(r"(?<=[.!?])\s+", answer):
+        words = [w for w in tokenize(sentence) if w not in _STOPWORDS]
+        if words:
+            scores.append(sum(w in vocab for w in words) / len(words))
+    return min(scores, default=1.0)
+
+def verify_local(answer: str, docs: List[Document],
+                 threshold: float = VERIFY_LOCAL_THRESHOLD) -> bool:
+    return support_score(answer, docs) >= threshold
+
+@contextmanager
+def _timed(timings: dict, stage: str):
+    t0 = time.perf_counter()
+    try:
+        yield
+    finally:
+        timings[stage] = round(time.perf_counter() - t0, 4)
 
 # ================================================================
 class HybridQAChain:
-    """Hybrid (vector + BM25) retriever, Cohere re‑rank, numeric guard."""
+    """Hybrid (vector + BM25) retriever, Cohere re‑rank, numeric guard."""
 
     def __init__(
         self,
@@ -80,7 +137,15 @@ class HybridQAChain:
         top_k_vector: int = 10,
         top_k_rerank: int = 3,
         sheet_filter: str | None = None,
+        verify_mode: str = VERIFY_MODE,
+        fusion: str = RETRIEVAL_FUSION,
+        candidate_pool: int = RETRIEVAL_CANDIDATES,
+        filters: dict | None = None,
     ):
+        if verify_mode not in VERIFY_MODES:
+            raise ValueError(f"verify_mode must be one of {VERIFY_MODES}")
+        if fusion not in FUSION_METHODS:
+            raise ValueError(f"fusion must be one of {FUSION_METHODS}")
         self.llm = OpenAI(temperature=temperature,
                           openai_api_key=OPENAI_API_KEY)
 
@@ -91,61 +156,190 @@ class HybridQAChain:
             output_key="answer",
         )
 
-        # Vector side (always initialized)
-        self.vec_retriever = get_vector_store().as_retriever(
-            search_kwargs={"k": top_k_vector, "filter": {"level": "row"}}
-        )
+        # Metadata filters (sheet, department, year, source, level) are
+        # pushed into both searches rather than applied to their results
+        self.sheet_filter = sheet_filter
+        self.filters = merge_filters(filters, {"sheet_name": sheet_filter})
+        normalize_filters(self.filters)   # fail fast on unknown fields
+
+        # Vector side (always initialized); row‑level chunks unless the
+        # caller asked for a level explicitly
+        self.vector_store = get_vector_store()
+        self.top_k_vector = top_k_vector
+        self._vector_filters = merge_filters({"level": "row"}, self.filters)
 
-        # BM25 initialized lazily
-        self._kw_retriever: BM25Retriever | None = None
+        # Keyword side: corpus‑wide on‑disk BM25 index
+        self.top_k_keyword = top_k_vector
 
+        # both lists are fused (deduplicated by chunk id) into a pool of
+        # candidate_pool docs for the reranker, which keeps top_k_rerank
         self._weights = (0.6, 0.4)
+        self.fusion = fusion
+        self.k_candidates = max(candidate_pool, top_k_rerank)
         self.k_rerank = top_k_rerank
-        self.sheet_filter = sheet_filter
+        self.verify_mode = verify_mode
+
+        # everything besides the question that changes the answer
+        self._cache_scope = (temperature, top_k_vector, top_k_rerank,
+                             json.dumps(self.filters, sort_keys=True),
+                             verify_mode, fusion, self.k_candidates)
 
     # ---------------------------------------------------------
-    def _fetch(self, query: str) -> List[Document]:
-        # ① semantic search
-        vector_docs = self.vec_retriever.get_relevant_documents(query)
+    def _combine(self,
+                 vector_hits: list[tuple[Document, float]],
+                 keyword_hits: list[tuple[Document, float]]) -> List[Document]:
+        return fuse([vector_hits, keyword_hits], self._weights,
+                    limit=self.k_candidates, method=self.fusion)
 
-        # ② keyword search – build BM25 index the *first* time
-        if self._kw_retriever is None and vector_docs:
-            self._kw_retriever = BM25Retriever.from_documents(vector_docs)
+    def _vector_hits(self, query: str):
+        return vector_search_with_scores(query, self.top_k_vector,
+                                         filters=self._vector_filters,
+                                         vector_store=self.vector_store)
 
-        keyword_docs = (
-            self._kw_retriever.get_relevant_documents(query)
-            if self._kw_retriever else []
-        )
+    def _keyword_hits(self, query: str):
+        return keyword_search_with_scores(query, self.top_k_keyword,
+                                          vector_store=self.vector_store,
+                                          filters=self.filters)
 
-        # Combine vector and keyword docs
-        docs = vector_docs[: int(self._weights[0] * self.k_rerank)] + \
-               keyword_docs[: int(self._weights[1] * self.k_rerank)]
+    def retrieve(self, query: str) -> List[Document]:
+        """Fused candidate pool (before rerank)."""
+        return self._combine(self._vector_hits(query), self._keyword_hits(query))
 
-        # Optional sheet restriction
-        if self.sheet_filter:
-            docs = [d for d in docs
-                    if d.metadata.get("sheet_name") == self.sheet_filter]
+    def _fetch(self, query: str, timings: dict) -> List[Document]:
+        with _timed(timings, "retrieve"):
+            # ① semantic search + ② keyword search over the persistent
+            # corpus‑wide index, fused
+            docs = self.retrieve(query)
 
-        return rerank_chunks(query, docs, top_k=self.k_rerank)
+        with _timed(timings, "rerank"):
+            return rerank_chunks(query, docs, top_k=self.k_rerank)
+
+    async def _afetch(self, query: str, timings: dict) -> List[Document]:
+        # ①+② concurrently on the default executor (Chroma + the query
+        # embedding, and the keyword index's disk I/O)
+        with _timed(timings, "retrieve"):
+            vector_hits, keyword_hits = await asyncio.gather(
+                asyncio.to_thread(self._vector_hits, query),
+                asyncio.to_thread(self._keyword_hits, query),
+            )
+            docs = self._combine(vector_hits, keyword_hits)
+        with _timed(timings, "rerank"):
+            return await arerank_chunks(query, docs, top_k=self.k_rerank)
 
     # ---------------------------------------------------------
-    def run(self, query: str):
-        docs = self._fetch(query)
+    @staticmethod
+    def _prompt(query: str, docs: List[Document]) -> str:
         context = "\n\n".join(d.page_content for d in docs)
-
-        prompt = (
+        return (
             f"{SYSTEM_PROMPT}\n\nUser question: {query}\n\n"
             f"Relevant context:\n{context}\n\n"
             "Answer the question. If not enough info, ask follow‑up or say 'I don't know'."
         )
-        draft = self.llm(prompt)
-
-        is_valid = (verify_answer(draft, docs, self.llm)
-                    and _verify_numeric(draft, docs))
 
+    @staticmethod
+    def _result(draft: str, is_valid: bool, docs: List[Document],
+                timings: dict) -> dict:
         answer = draft if is_valid else (
             "I'm not fully confident the retrieved info is sufficient. "
             "Could you provide more context?"
         )
+        return {"answer": answer, "verified": is_valid,
+                "source_documents": docs, "timings": timings}
+
+    def _cheap_verdict(self, draft: str, docs: List[Document],
+                       timings: dict) -> bool | None:
+        """Run the local guards; None means the LLM check still has to decide."""
+        if self.verify_mode == "off":
+            return True
+        with _timed(timings, "verify_numeric"):
+            if not _verify_numeric(draft, docs):
+                return False          # short‑circuit: no second LLM call
+        if self.verify_mode == "numeric":
+            return True
+        if self.verify_mode == "local":
+            with _timed(timings, "verify_local"):
+                return verify_local(draft, docs)
+        return None
+
+    def _cache_lookup(self, query: str, timings: dict):
+        with _timed(timings, "cache"):
+            cached, query_vec = get_answer_cache().get(query, self._cache_scope)
+        if cached is not None:
+            cached["timings"] = timings
+        return cached, query_vec
+
+    # ---------------------------------------------------------
+    def run(self, query: str, use_cache: bool = True):
+        timings: dict = {}
+        query_vec = None
+        if use_cache:
+            cached, query_vec = self._cache_lookup(query, timings)
+            if cached is not None:
+                return cached
+
+        docs = self._fetch(query, timings)
+        with _timed(timings, "generate"):
+            draft = self.llm(self._prompt(query, docs))
+
+        is_valid = self._cheap_verdict(draft, docs, timings)
+        if is_valid is None:
+            with _timed(timings, "verify_llm"):
+                is_valid = verify_answer(draft, docs, self.llm)
+
+        result = self._result(draft, is_valid, docs, timings)
+        if use_cache and result["verified"]:   # never replay the fallback answer
+            get_answer_cache().put(query, result, self._cache_scope, vector=query_vec)
+        return result
+
+    async def arun(self, query: str, use_cache: bool = True):
+        """:meth:`run` without blocking the event loop (see :meth:`astream`)."""
+        result = None
+        async for event in self.astream(query, use_cache=use_cache):
+            if event["type"] == "final":
+                result = event["result"]
+        return result
+
+    async def astream(self, query: str,
+                      use_cache: bool = True) -> AsyncIterator[dict]:
+        """Yield ``{"type": "token", "text": …}`` events while the draft is
+        generated, then one ``{"type": "final", "result": …}``.
+
+        The client shows the draft while it is generated, so the
+        verification call no longer adds to the time to first word; the
+        final event says whether the draft survived verification (and
+        replaces it if not).  Retrieval, rerank and both LLM calls are
+        awaited; the blocking bits (answer‑cache lookup, which may embed
+        the question, and the keyword index) run on the default executor.
+        """
+        timings: dict = {}
+        query_vec = None
+        if use_cache:
+            cached, query_vec = await asyncio.to_thread(
+                self._cache_lookup, query, timings)
+            if cached is not None:
+                yield {"type": "token", "text": cached["answer"]}
+                yield {"type": "final", "result": cached}
+                return
+
+        docs = await self._afetch(query, timings)
+
+        parts = []
+        t0 = time.perf_counter()
+        async with _LLM_LIMIT:
+            async for token in self.llm.astream(self._prompt(query, docs)):
+                if not parts:
+                    timings["first_token"] = round(time.perf_counter() - t0, 4)
+                parts.append(token)
+                yield {"type": "token", "text": token}
+        timings["generate"] = round(time.perf_counter() - t0, 4)
+        draft = "".join(parts)
+
+        is_valid = self._cheap_verdict(draft, docs, timings)
+        if is_valid is None:
+            with _timed(timings, "verify_llm"):
+                is_valid = await averify_answer(draft, docs, self.llm)
 
-        return {"answer": answer, "source_documents": docs}
+        result = self._result(draft, is_valid, docs, timings)
+        if use_cache and result["verified"]:   # never replay the fallback answer
+            get_answer_cache().put(query, result, self._cache_scope, vector=query_vec)
+        yield {"type": "final", "result": result}
@@ -0,0 +1,173 @@
+# agents/unstructured_agent/answer_cache.py
+"""
+In‑process answer cache for ``HybridQAChain.run``.
+
+Entries are keyed on the normalised question plus the chain settings
+that change the answer (temperature, top‑k, sheet filter) and are only
+valid for the corpus version they were computed against – any ingest or
+delete bumps the manifest's ``corpus_version`` and drops them.  With a
+similarity threshold set, a miss on the exact key falls back to cosine
+similarity between query embeddings, so "fall 2023 enrollment by
+department" and "Fall 2023 enrolment by dept." share one answer.  A near
+hit also needs the same numbers in both questions – embeddings barely
+separate "fall 2023" from "fall 2024".  The chain only stores answers
+that passed verification, never the "not confident" fallback.  The
+query embedding goes through the embedding cache, so the retriever that
+runs on a miss doesn't pay for it twice.
+"""
+import re, threading, time
+from collections import OrderedDict
+from dataclasses import dataclass
+from functools import lru_cache
+
+import numpy as np
+
+from config.settings import (
+    ANSWER_CACHE_MAX_ENTRIES, ANSWER_CACHE_TTL_SECONDS, ANSWER_CACHE_SIMILARITY,
+)
+from agents.unstructured_agent.embedding_cache import normalize_text
+from agents.unstructured_agent.manifest import get_manifest
+
+_NUMBER_RE = re.compile(r"\d+(?:[.,]\d+)*")
+
+
+@dataclass
+class _Entry:
+    result: dict
+    scope: tuple
+    expires: float
+    vector: np.ndarray | None
+    numbers: tuple = ()
+
+
+class AnswerCache:
+    """LRU + TTL cache of chain results with optional near‑duplicate lookup."""
+
+    def __init__(self,
+                 max_entries: int = ANSWER_CACHE_MAX_ENTRIES,
+                 ttl: float = ANSWER_CACHE_TTL_SECONDS,
+                 similarity: float = ANSWER_CACHE_SIMILARITY,
+                 embeddings=None,
+                 version_fn=None):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.similarity = similarity
+        self._embeddings = embeddings
+        self._version_fn = version_fn or (lambda: get_manifest().corpus_version())
+        self._version = None
+        self._entries: "OrderedDict[tuple, _Entry]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.near_hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    # ---------------- helpers ----------------
+    @staticmethod
+    def _normalize(query: str) -> str:
+        return normalize_text(query).lower().rstrip("?.! ")
+
+    @staticmethod
+    def _numbers(query: str) -> tuple:
+        """Years, amounts, ids… in *query*; near hits must match them exactly."""
+        return tuple(sorted(_NUMBER_RE.findall(query)))
+
+    def _embed(self, query: str) -> np.ndarray | None:
+        if self.similarity <= 0:
+            return None
+        if self._embeddings is None:
+            from agents.unstructured_agent.vector_store import get_embeddings
+            self._embeddings = get_embeddings()
+        vec = np.asarray(self._embeddings.embed_query(query), dtype=np.float32)
+        norm = np.linalg.norm(vec)
+        return vec / norm if norm else vec
+
+    def _sync_version(self):
+        """Drop everything computed against an older corpus (lock held)."""
+        version = self._version_fn()
+        if version != self._version:
+            if self._entries:
+                self.invalidations += 1
+            self._entries.clear()
+            self._version = version
+
+    def _expire(self, now: float):
+        stale = [k for k, e in self._entries.items() if e.expires <= now]
+        for k in stale:
+            del self._entries[k]
+        self.evictions += len(stale)
+
+    # ---------------- API ----------------
+    def get(self, query: str, scope: tuple = ()) -> tuple[dict | None, np.ndarray | None]:
+        """Return ``(result, query_vector)``; *result* is None on a miss.
+
+        Pass the returned vector back to :meth:`put` so a miss embeds the
+        question only once.
+        """
+        key = (self._normalize(query), scope)
+        now = time.monotonic()
+        with self._lock:
+            self._sync_version()
+            entry = self._entries.get(key)
+            if entry is not None and entry.expires > now:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return dict(entry.result), entry.vector
+
+        vector = self._embed(query)
+        with self._lock:
+            if vector is not None:
+                self._expire(now)
+                numbers = self._numbers(query)
+                cands = [(k, e) for k, e in self._entries.items()
+                         if e.scope == scope and e.vector is not None
+                         and e.numbers == numbers]
+                if cands:
+                    sims = np.stack([e.vector for _, e in cands]) @ vector
+                    best = int(np.argmax(sims))
+                    if sims[best] >= self.similarity:
+                        self._entries.move_to_end(cands[best][0])
+                        self.near_hits += 1
+                        return dict(cands[best][1].result), vector
+            self.misses += 1
+        return None, vector
+
+    def put(self, query: str, result: dict, scope: tuple = (),
+            vector: np.ndarray | None = None):
+        key = (self._normalize(query), scope)
+        with self._lock:
+            self._sync_version()
+            self._entries[key] = _Entry(result=dict(result), scope=scope,
+                                        expires=time.monotonic() + self.ttl,
+                                        vector=vector, numbers=self._numbers(query))
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    # ---------------- metrics ----------------
+    def stats(self) -> dict:
+        total = self.hits + self.near_hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "max_entries": self.max_entries,
+            "ttl_seconds": self.ttl,
+            "similarity": self.similarity,
+            "corpus_version": self._version,
+            "hits": self.hits,
+            "near_hits": self.near_hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "invalidations": self.invalidations,
+            "hit_rate": (self.hits + self.near_hits) / total if total else 0.0,
+        }
+
+
+@lru_cache(maxsize=None)
+def get_answer_cache() -> AnswerCache:
+    return AnswerCache()
@@ -1,13 +1,20 @@
 # agents/unstructured_agent/document_loaders.py
-import os, re
+import hashlib, io, mmap, os, re, tempfile, threading
+from collections import OrderedDict
+from itertools import chain
 import pandas as pd
-from io import BytesIO
+from typing import Iterator
+from openpyxl import load_workbook
 from PyPDF2 import PdfReader
 from langchain.docstore.document import Document
 from langchain.text_splitter import RecursiveCharacterTextSplitter
-from langchain_community.document_loaders import UnstructuredExcelLoader
-from agents.unstructured_agent.table_loaders import dataframe_to_docs
-from langchain_community.document_loaders import UnstructuredWordDocumentLoader
+from agents.unstructured_agent.table_loaders import (
+    dataframe_to_docs, iter_table_docs, column_values, SERIALIZE_CHUNK_ROWS
+)
+from config.settings import INGEST_TABLE_CHUNK_ROWS, INGEST_STREAM_THRESHOLD_BYTES
+
+# parsed uploads remembered so ingestion and the UI table cache share a parse
+_TABLE_CACHE_ENTRIES = 8
 
 # ------------------------------------------------------------------
 # Helpers
@@ -28,65 +35,206 @@ def parse_filename_for_metadata(filename: str) -> dict:
     return {"department": dept, "year": year}
 
 
+def file_size(file_obj) -> int:
+    pos = file_obj.tell()
+    file_obj.seek(0, os.SEEK_END)
+    size = file_obj.tell()
+    file_obj.seek(pos)
+    return size
+
+
+# ------------------------------------------------------------------
+# In‑memory uploads
+# ------------------------------------------------------------------
+class BufferReader(io.RawIOBase):
+    """Seekable read‑only file over a buffer, without copying it."""
+
+    def __init__(self, buf):
+        self._buf = memoryview(buf).cast("B")
+        self._pos = 0
+
+    def readable(self):
+        return True
+
+    def seekable(self):
+        return True
+
+    def readinto(self, b):
+        n = max(0, min(len(b), len(self._buf) - self._pos))
+        b[:n] = self._buf[self._pos: self._pos + n]
+        self._pos += n
+        return n
+
+    def seek(self, offset, whence=os.SEEK_SET):
+        base = {os.SEEK_SET: 0, os.SEEK_CUR: self._pos, os.SEEK_END: len(self._buf)}[whence]
+        self._pos = max(0, base + offset)
+        return self._pos
+
+    def tell(self):
+        return self._pos
+
+    def getbuffer(self) -> memoryview:
+        return self._buf[:]
+
+    def close(self):
+        if not self.closed:
+            self._buf.release()
+        super().close()
+
+
+def file_buffer(file_obj) -> memoryview:
+    """An upload's bytes as a buffer, copied only as a last resort: the
+    buffer of an in‑memory upload (Streamlit, small Starlette spools), an
+    mmap of one spooled to disk, else a single read()."""
+    if isinstance(file_obj, (bytes, bytearray, memoryview)):
+        return memoryview(file_obj)
+    raw = file_obj._file if isinstance(file_obj, tempfile.SpooledTemporaryFile) else file_obj
+    if hasattr(raw, "getbuffer"):   # BytesIO, BufferReader
+        return raw.getbuffer()
+    try:
+        if os.fstat(raw.fileno()).st_size:
+            return memoryview(mmap.mmap(raw.fileno(), 0, access=mmap.ACCESS_READ))
+    except (AttributeError, OSError, io.UnsupportedOperation):
+        pass
+    file_obj.seek(0)
+    data = file_obj.read()
+    file_obj.seek(0)
+    return memoryview(data)
+
+
+_TABLES: OrderedDict[str, dict] = OrderedDict()
+_TABLES_LOCK = threading.Lock()
+
+
+def table_key(buf) -> str:
+    """Cache key of a parsed upload: sha256 of its bytes (= the manifest digest)."""
+    return hashlib.sha256(buf).hexdigest()
+
+
+def remember_tables(key: str, tables: dict):
+    with _TABLES_LOCK:
+        _TABLES[key] = tables
+        _TABLES.move_to_end(key)
+        while len(_TABLES) > _TABLE_CACHE_ENTRIES:
+            _TABLES.popitem(last=False)
+
+
+def cached_tables(buf) -> dict | None:
+    with _TABLES_LOCK:
+        return _TABLES.get(table_key(buf))
+
+
+def read_tables(file_obj, filename) -> dict[str | None, pd.DataFrame]:
+    """Parse a CSV / XLSX upload once: ``{sheet: frame}`` (``{None: frame}``
+    for CSV), straight from memory.  Results are remembered by content
+    hash so the loaders and the UI's table cache share a single parse;
+    treat the frames as read‑only."""
+    buf = file_buffer(file_obj)
+    key = table_key(buf)
+    with _TABLES_LOCK:
+        tables = _TABLES.get(key)
+    if tables is None:
+        if filename.rsplit(".", 1)[-1].lower() == "xlsx":
+            tables = pd.read_excel(BufferReader(buf), sheet_name=None)
+        else:
+            tables = {None: pd.read_csv(BufferReader(buf))}
+        remember_tables(key, tables)
+    return tables
+
+
+def _iter_sheet_frames(ws, chunk_rows: int) -> Iterator[pd.DataFrame]:
+    """Yield a read‑only openpyxl worksheet as DataFrames of *chunk_rows*."""
+    rows = ws.iter_rows(values_only=True)
+    header = next(rows, None)
+    if header is None:
+        return
+    columns = [str(c) if c is not None else f"Unnamed: {i}"
+               for i, c in enumerate(header)]
+    buf, start = [], 0
+    for row in rows:
+        buf.append(row[: len(columns)])
+        if len(buf) >= chunk_rows:
+            yield pd.DataFrame(buf, columns=columns,
+                               index=range(start, start + len(buf))).infer_objects()
+            start += len(buf)
+            buf = []
+    if buf:
+        yield pd.DataFrame(buf, columns=columns,
+                           index=range(start, start + len(buf))).infer_objects()
+
+
+def iter_row_docs(df: pd.DataFrame, src: str, level: str,
+                  chunk_rows: int = SERIALIZE_CHUNK_ROWS,
+                  **base_meta) -> Iterator[Document]:
+    """Lazy :func:`df_to_row_docs`; rows are formatted a column at a time."""
+    df.columns = [c.strip().lower() for c in df.columns]
+    template = {
+        "source": src,
+        "row_id": None,
+        "columns": ",".join(df.columns),
+        "level": level,  # 'row' or 'section'
+        **base_meta,
+    }
+    unique = df.columns.is_unique
+    prefixes = [f"{k}: " for k in df.columns]
+    for start in range(0, len(df), chunk_rows):
+        part = df.iloc[start: start + chunk_rows]
+        if unique:
+            cols = [[p + s for s in map(str, vals)]
+                    for p, vals in zip(prefixes, column_values(part, box=False))]
+            texts = map("; ".join, zip(*cols)) if cols else [""] * len(part)
+        else:
+            # row[k] is a Series for a repeated label; keep the old formatting
+            texts = ("; ".join(f"{k}: {row[k]}" for k in part.columns)
+                     for _, row in part.iterrows())
+        for ridx, row_txt in zip(part.index.tolist(), texts):
+            meta = template.copy()
+            meta["row_id"] = ridx
+            yield Document(page_content=row_txt, metadata=meta)
+
+
 def df_to_row_docs(df: pd.DataFrame, src: str, level: str, **base_meta):
     """Return one Document per row with explicit row / col lineage."""
-    df.columns = [c.strip().lower() for c in df.columns]
-    docs: list[Document] = []
-    for ridx, row in df.iterrows():
-        row_txt = "; ".join(f"{k}: {row[k]}" for k in df.columns)
-        meta = {
-            "source": src,
-            "row_id": ridx,
-            "columns": ",".join(df.columns),
-            "level": level,  # 'row' or 'section'
-            **base_meta,
-        }
-        docs.append(Document(page_content=row_txt, metadata=meta))
-    return docs
+    return list(iter_row_docs(df, src, level, **base_meta))
 
 # ------------------------------------------------------------------
 # Loaders
 # ------------------------------------------------------------------
-def load_pdf(file_obj, filename):
+def pdf_page_count(file_obj) -> int:
+    return len(PdfReader(file_obj).pages)
+
+
+def iter_pdf(file_obj, filename, pages: range | None = None) -> Iterator[Document]:
+    """Yield one Document per page (optionally only *pages*), lazily."""
     base_meta = parse_filename_for_metadata(filename)
     reader = PdfReader(file_obj)
-    docs = []
-    for i, page in enumerate(reader.pages):
-        txt = page.extract_text() or ""
+    for i in pages or range(len(reader.pages)):
+        txt = reader.pages[i].extract_text() or ""
         meta = {"source": filename, "page_number": i + 1, **base_meta}
-        docs.append(Document(page_content=txt, metadata=meta))
-    return docs
+        yield Document(page_content=txt, metadata=meta)
+
+
+def load_pdf(file_obj, filename):
+    return list(iter_pdf(file_obj, filename))
 
 
 def load_docx(file_obj, filename):
+    """Whole document as one Document, partitioned from memory (the
+    same text UnstructuredWordDocumentLoader produces in "single" mode)."""
+    from unstructured.partition.docx import partition_docx
     base_meta = parse_filename_for_metadata(filename)
-    tmp = f"tmp_{filename}"
-    with open(tmp, "wb") as f:
-        f.write(file_obj.getvalue())
-    loader = UnstructuredWordDocumentLoader(tmp)
-    docs = loader.load()
-    for d in docs:
-        d.metadata = {"source": filename, **d.metadata, **base_meta}
-    os.remove(tmp)
-    return docs
+    with BufferReader(file_buffer(file_obj)) as fh:
+        elements = partition_docx(file=fh)
+    text = "\n\n".join(str(el) for el in elements)
+    return [Document(page_content=text, metadata={"source": filename, **base_meta})]
 
 
 def load_excel(file_obj, filename):
+    """Per‑row JSON docs (+ a summary per sheet) from one in‑memory
+    parse, shared with :func:`read_tables` callers."""
     base_meta = parse_filename_for_metadata(filename)
-    # ▶  First try high‑fidelity loader that preserves cell structure
-    try:
-        loader = UnstructuredExcelLoader(file_obj, mode="elements")
-        docs = loader.load()
-        # Enrich metadata uniformly
-        for d in docs:
-            d.metadata.update({"source": filename, **base_meta})
-        return docs
-    except Exception:
-        pass  # fall back to pandas if python‑docx/xlrd etc. fail
-
-    # ▶  Fallback – pandas per‑row JSON docs
     try:
-        dfs = pd.read_excel(file_obj, sheet_name=None)
+        dfs = read_tables(file_obj, filename)
     except Exception:
         return []
 
@@ -106,15 +254,55 @@ def load_excel(file_obj, filename):
     return docs
 
 
+def iter_excel(file_obj, filename,
+               chunk_rows: int = INGEST_TABLE_CHUNK_ROWS) -> Iterator[Document]:
+    """Stream row docs sheet by sheet without materialising the workbook.
+
+    Workbooks under INGEST_STREAM_THRESHOLD_BYTES go through
+    :func:`load_excel` unchanged; larger ones are read with openpyxl in
+    read‑only mode, *chunk_rows* rows at a time.
+    """
+    if file_size(file_obj) <= INGEST_STREAM_THRESHOLD_BYTES:
+        yield from load_excel(file_obj, filename)
+        return
+    base_meta = parse_filename_for_metadata(filename)
+    wb = load_workbook(file_obj, read_only=True, data_only=True)
+    try:
+        for ws in wb.worksheets:
+            frames = _iter_sheet_frames(ws, chunk_rows)
+            first = next(frames, None)
+            if first is None or first.empty:
+                continue
+            yield from iter_table_docs(chain([first], frames), filename,
+                                       sheet_name=ws.title,
+                                       level="row", **base_meta)
+    finally:
+        wb.close()
+
+
 def load_csv(file_obj, filename):
     base_meta = parse_filename_for_metadata(filename)
     try:
-        df = pd.read_csv(file_obj)
+        df = read_tables(file_obj, filename)[None]
     except Exception:
         return []
     return dataframe_to_docs(df, filename, level="row", **base_meta)
 
 
+def iter_csv(file_obj, filename,
+             chunk_rows: int = INGEST_TABLE_CHUNK_ROWS) -> Iterator[Document]:
+    """Chunked :func:`load_csv` for files above the streaming threshold."""
+    if file_size(file_obj) <= INGEST_STREAM_THRESHOLD_BYTES:
+        yield from load_csv(file_obj, filename)
+        return
+    base_meta = parse_filename_for_metadata(filename)
+    try:
+        reader = pd.read_csv(file_obj, chunksize=chunk_rows)
+    except Exception:
+        return
+    yield from iter_table_docs(reader, filename, level="row", **base_meta)
+
+
 # ------------------------------------------------------------------
 # One splitter shared by all formats
 # ------------------------------------------------------------------
@@ -0,0 +1,43 @@
+# agents/unstructured_agent/filters.py
+"""
+Metadata filters shared by the vector and keyword sides.
+
+A filter is a plain dict ``{field: value | [values]}`` over
+``FILTER_FIELDS``; values are OR‑ed within a field and fields are AND‑ed.
+:func:`to_chroma_where` compiles it into a Chroma ``where`` clause and
+``KeywordIndex.search`` resolves it against its per‑segment field
+indexes, so both retrievers only score the matching partition.
+"""
+FILTER_FIELDS = ("source", "sheet_name", "department", "year", "level")
+
+
+def normalize_filters(filters: dict | None) -> dict[str, list[str]]:
+    """``{field: [str values]}`` with empty entries dropped."""
+    out: dict[str, list[str]] = {}
+    for field, value in (filters or {}).items():
+        if field not in FILTER_FIELDS:
+            raise ValueError(f"cannot filter on {field!r}; use one of {FILTER_FIELDS}")
+        if value is None or value == "":
+            continue
+        values = value if isinstance(value, (list, tuple, set)) else [value]
+        if values:
+            out[field] = [str(v) for v in values]
+    return out
+
+
+def merge_filters(*filters: dict | None) -> dict:
+    """Later filters override earlier ones field by field."""
+    out: dict = {}
+    for f in filters:
+        out.update({k: v for k, v in (f or {}).items() if v not in (None, "", [])})
+    return out
+
+
+def to_chroma_where(filters: dict | None) -> dict | None:
+    clauses = [
+        {field: {"$eq": values[0]}} if len(values) == 1 else {field: {"$in": values}}
+        for field, values in normalize_filters(filters).items()
+    ]
+    if not clauses:
+        return None
+    return clauses[0] if len(clauses) == 1 else {"$and": clauses}
@@ -0,0 +1,72 @@
+# agents/unstructured_agent/fusion.py
+"""
+Merge ranked (vector, keyword, …) hit lists into one candidate pool.
+
+    rrf       Σ wᵢ / (RRF_K + rankᵢ)        rank‑only, robust to score scales
+    weighted  Σ wᵢ · min‑max(scoreᵢ)        uses how far ahead a hit is
+                                            (1.0 for a list with one hit or
+                                            all‑equal scores)
+
+Hits are deduplicated by chunk id (``Document.id``, falling back to the
+text) so a chunk found by both retrievers is scored once, with both
+contributions.
+"""
+from typing import List, Sequence, Tuple
+
+from langchain.schema import Document
+
+from config.settings import RRF_K
+
+FUSION_METHODS = ("rrf", "weighted")
+
+Hits = Sequence[Tuple[Document, float]]
+
+
+def _key(doc: Document) -> str:
+    return doc.id or doc.page_content
+
+
+def rrf_fuse(hit_lists: Sequence[Hits],
+             weights: Sequence[float],
+             limit: int,
+             k: int = RRF_K) -> List[Document]:
+    scores: dict[str, float] = {}
+    docs: dict[str, Document] = {}
+    for hits, w in zip(hit_lists, weights):
+        for rank, (doc, _) in enumerate(hits, start=1):
+            key = _key(doc)
+            docs.setdefault(key, doc)
+            scores[key] = scores.get(key, 0.0) + w / (k + rank)
+    best = sorted(scores, key=scores.get, reverse=True)[:limit]
+    return [docs[key] for key in best]
+
+
+def weighted_fuse(hit_lists: Sequence[Hits],
+                  weights: Sequence[float],
+                  limit: int) -> List[Document]:
+    """Scores must be "higher is better" within each list."""
+    scores: dict[str, float] = {}
+    docs: dict[str, Document] = {}
+    for hits, w in zip(hit_lists, weights):
+        if not hits:
+            continue
+        raw = [s for _, s in hits]
+        lo, hi = min(raw), max(raw)
+        for doc, s in hits:
+            key = _key(doc)
+            docs.setdefault(key, doc)
+            # a degenerate list has no spread to normalise: each hit counts fully
+            scores[key] = scores.get(key, 0.0) + w * ((s - lo) / (hi - lo) if hi > lo else 1.0)
+    best = sorted(scores, key=scores.get, reverse=True)[:limit]
+    return [docs[key] for key in best]
+
+
+def fuse(hit_lists: Sequence[Hits],
+         weights: Sequence[float],
+         limit: int,
+         method: str = "rrf") -> List[Document]:
+    if method == "rrf":
+        return rrf_fuse(hit_lists, weights, limit)
+    if method == "weighted":
+        return weighted_fuse(hit_lists, weights, limit)
+    raise ValueError(f"fusion method must be one of {FUSION_METHODS}")
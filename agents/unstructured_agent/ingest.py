@@ -0,0 +1,387 @@
+# agents/unstructured_agent/ingest.py
+"""
+Bounded‑memory ingestion: parse → split → embed → upsert.
+
+Each stage is a generator or a worker thread connected by small bounded
+queues, so only ``INGEST_QUEUE_SIZE`` batches of chunks are ever held in
+memory and PDF/CSV parsing overlaps with the embedding round trips and
+Chroma writes.  :func:`ingest_files` additionally spreads parsing of a
+batch of uploads (and of large PDFs, page range by page range) across a
+process pool feeding the same single writer.
+"""
+import multiprocessing as mp
+import queue, threading
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from multiprocessing.shared_memory import SharedMemory
+from itertools import islice
+from typing import Callable, Iterable, Iterator, List
+
+from langchain.docstore.document import Document
+
+from config.settings import (
+    INGEST_BATCH_SIZE, INGEST_QUEUE_SIZE, INGEST_WORKERS,
+    INGEST_PDF_PAGES_PER_TASK, INGEST_STREAM_THRESHOLD_BYTES,
+)
+from agents.unstructured_agent.document_loaders import (
+    iter_pdf, load_docx, iter_excel, iter_csv, text_splitter,
+    pdf_page_count, file_size, file_buffer, BufferReader,
+    cached_tables, remember_tables,
+)
+from agents.unstructured_agent.manifest import get_manifest, file_digest, chunk_hash
+from agents.unstructured_agent.keyword_index import get_keyword_index
+from agents.unstructured_agent.vector_store import (
+    get_vector_store, index_chunks, delete_chunks, delete_file_vectors
+)
+
+_DONE = object()
+
+
+# ------------------------------------------------------------------
+# Generator stages
+# ------------------------------------------------------------------
+def iter_documents(file_obj, filename: str) -> Iterator[Document]:
+    """Dispatch on extension to the streaming loaders."""
+    ext = filename.rsplit(".", 1)[-1].lower()
+    if ext == "pdf":
+        yield from iter_pdf(file_obj, filename)
+    elif ext == "docx":
+        yield from load_docx(file_obj, filename)
+    elif ext == "xlsx":
+        yield from iter_excel(file_obj, filename)
+    elif ext == "csv":
+        yield from iter_csv(file_obj, filename)
+    else:
+        text = file_obj.read().decode("utf-8", errors="ignore")
+        yield Document(page_content=text, metadata={"source": filename})
+
+
+def iter_chunks(docs: Iterable[Document], splitter=text_splitter) -> Iterator[Document]:
+    for doc in docs:
+        yield from splitter.split_documents([doc])
+
+
+def batched(items: Iterable, n: int) -> Iterator[List]:
+    it = iter(items)
+    while batch := list(islice(it, n)):
+        yield batch
+
+
+# ------------------------------------------------------------------
+# Threaded pipeline
+# ------------------------------------------------------------------
+def _put(q: queue.Queue, item, stop: threading.Event):
+    """Blocking put that gives up once the pipeline is stopping."""
+    while not stop.is_set():
+        try:
+            q.put(item, timeout=0.1)
+            return
+        except queue.Full:
+            continue
+
+
+def _needs_ingest(filename: str, digest: str, vs) -> bool:
+    """False for an unchanged file; clears untracked leftovers otherwise."""
+    known = get_manifest().file_hash(filename)
+    if known == digest:
+        return False
+    if known is None:
+        # never tracked (or ingested before the manifest existed): start clean
+        delete_file_vectors(filename, vs)
+    return True
+
+
+def _diff_batches(batches: Iterable[tuple[str, List[Document], bool]]):
+    """Keep only chunks the manifest hasn't seen; report the vanished ones.
+
+    Yields ``(filename, new_chunks, new_ids, last, stale_ids)``, where
+    *stale_ids* is only filled on a file's last batch.
+    """
+    manifest = get_manifest()
+    known: dict[str, set] = {}
+    seen: dict[str, set] = {}
+    for filename, chunks, last in batches:
+        if filename not in known:
+            known[filename] = manifest.chunk_ids(filename)
+            seen[filename] = set()
+        fresh, ids = [], []
+        for chunk in chunks:
+            h = chunk_hash(chunk)
+            if h in seen[filename]:
+                continue
+            seen[filename].add(h)
+            if h not in known[filename]:
+                fresh.append(chunk)
+                ids.append(h)
+        stale = sorted(known[filename] - seen[filename]) if last else []
+        yield filename, fresh, ids, last, stale
+
+
+def _run_pipeline(batches: Iterable[tuple[str, List[Document], bool]],
+                  vs,
+                  queue_size: int,
+                  digests: dict[str, str],
+                  on_written: Callable[[str, int, bool], None] | None = None,
+                  sizes: dict[str, int] | None = None) -> int:
+    """Drive ``(filename, chunks, last)`` batches through diff → embed → upsert.
+
+    *batches* is consumed (and diffed against the manifest) on a parser
+    thread, embeddings run on a second thread and the calling thread
+    upserts – so Streamlit calls made from *on_written* stay on the
+    script thread.  Once a file's last batch is written, its vanished
+    chunks are deleted and its new *digests* entry (and upload size from
+    *sizes*) is recorded.
+    """
+    manifest = get_manifest()
+    batches = _diff_batches(batches)
+    embedder = vs.embeddings
+    parsed: queue.Queue = queue.Queue(maxsize=queue_size)
+    embedded: queue.Queue = queue.Queue(maxsize=queue_size)
+    stop = threading.Event()
+
+    def parse():
+        try:
+            for item in batches:
+                if stop.is_set():
+                    return
+                _put(parsed, item, stop)
+            _put(parsed, _DONE, stop)
+        except BaseException as e:
+            _put(parsed, e, stop)
+
+    def embed():
+        while not stop.is_set():
+            try:
+                item = parsed.get(timeout=0.1)
+            except queue.Empty:
+                continue
+            if item is _DONE or isinstance(item, BaseException):
+                _put(embedded, item, stop)
+                return
+            chunks = item[1]
+            try:
+                vectors = (embedder.embed_documents([c.page_content for c in chunks])
+                           if chunks else [])
+            except BaseException as e:
+                _put(embedded, e, stop)
+                return
+            _put(embedded, (*item, vectors), stop)
+
+    workers = [threading.Thread(target=parse, daemon=True, name="ingest-parse"),
+               threading.Thread(target=embed, daemon=True, name="ingest-embed")]
+    for w in workers:
+        w.start()
+
+    n_chunks = 0
+    try:
+        while True:
+            item = embedded.get()
+            if item is _DONE:
+                break
+            if isinstance(item, BaseException):
+                raise item
+            filename, chunks, ids, last, stale, vectors = item
+            index_chunks(chunks, vs, embeddings=vectors, ids=ids)
+            manifest.add_chunks(filename, ids, chunks)
+            n_chunks += len(chunks)
+            if last:
+                delete_chunks(stale, vs)
+                manifest.finish_file(filename, digests[filename], stale,
+                                     (sizes or {}).get(filename))
+            if on_written:
+                on_written(filename, len(chunks), last)
+    finally:
+        stop.set()
+        for w in workers:
+            w.join()
+        get_keyword_index().flush()   # chunks written so far are in Chroma
+    vs.persist()
+    return n_chunks
+
+
+def _file_batches(file_obj, filename: str, batch_size: int):
+    batch = None
+    for nxt in batched(iter_chunks(iter_documents(file_obj, filename)), batch_size):
+        if batch is not None:
+            yield filename, batch, False
+        batch = nxt
+    yield filename, batch or [], True
+
+
+def ingest_file(file_obj,
+                filename: str,
+                vector_store=None,
+                batch_size: int = INGEST_BATCH_SIZE,
+                queue_size: int = INGEST_QUEUE_SIZE) -> int:
+    """Stream one upload into the vector store; returns the number of
+    new or changed chunks written (0 for an unchanged file)."""
+    vs = get_vector_store() if vector_store is None else vector_store
+    digest = file_digest(file_obj)
+    if not _needs_ingest(filename, digest, vs):
+        return 0
+    return _run_pipeline(_file_batches(file_obj, filename, batch_size), vs,
+                         queue_size, {filename: digest},
+                         sizes={filename: file_size(file_obj)})
+
+
+# ------------------------------------------------------------------
+# Multi‑file ingestion over a process pool
+# ------------------------------------------------------------------
+_POOL: ProcessPoolExecutor | None = None
+_POOL_LOCK = threading.Lock()
+
+
+def _get_pool(max_workers: int) -> ProcessPoolExecutor:
+    """Process‑wide parser pool (spawned, so no forked Chroma/Rust threads)."""
+    global _POOL
+    with _POOL_LOCK:
+        if _POOL is None:
+            _POOL = ProcessPoolExecutor(max_workers=max_workers,
+                                        mp_context=mp.get_context("spawn"))
+        return _POOL
+
+
+def shutdown_ingest_pool():
+    global _POOL
+    with _POOL_LOCK:
+        if _POOL is not None:
+            _POOL.shutdown(cancel_futures=True)
+            _POOL = None
+
+
+def _parse_task(block: tuple[str, int], filename: str, pages: range | None):
+    """Worker entry point: parse + split one file or one PDF page range,
+    read in place from the parent's shared memory *block* ``(name, size)``.
+
+    Returns ``(chunks, tables)``; *tables* are the parsed CSV/XLSX frames
+    (else None) so the parent can reuse them instead of parsing again.
+    """
+    shm = SharedMemory(name=block[0])
+    try:
+        buf = shm.buf[:block[1]]
+        with BufferReader(buf) as fh:
+            docs = (iter_pdf(fh, filename, pages) if pages is not None
+                    else iter_documents(fh, filename))
+            chunks = list(iter_chunks(docs))
+        tables = cached_tables(buf) if pages is None else None
+        buf.release()
+        return chunks, tables
+    finally:
+        try:
+            shm.close()
+        except BufferError:
+            pass   # a parser still holds a view; the mapping goes with it
+
+
+def _plan_tasks(buf, filename: str, pages_per_task: int) -> List[range | None]:
+    if not filename.lower().endswith(".pdf"):
+        return [None]
+    n_pages = pdf_page_count(BufferReader(buf))
+    return [range(i, min(i + pages_per_task, n_pages))
+            for i in range(0, n_pages, pages_per_task)] or [None]
+
+
+def _pooled_batches(tasks, max_workers: int, batch_size: int):
+    """Yield writer batches as pool tasks finish, keeping ≤ 2×workers in flight.
+
+    *tasks* are ``(block, filename, pages, table_key)``; parsed tables sent
+    back by a worker are remembered under *table_key*.
+    """
+    pool = _get_pool(max_workers)
+    remaining: dict[str, int] = {}
+    for _, filename, _, _ in tasks:
+        remaining[filename] = remaining.get(filename, 0) + 1
+
+    pending = iter(tasks)
+    in_flight = {}
+
+    def submit_next():
+        task = next(pending, None)
+        if task is not None:
+            in_flight[pool.submit(_parse_task, *task[:3])] = (task[1], task[3])
+
+    for _ in range(2 * max_workers):
+        submit_next()
+    while in_flight:
+        done, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+        for fut in done:
+            filename, key = in_flight.pop(fut)
+            chunks, tables = fut.result()
+            if tables is not None:
+                remember_tables(key, tables)
+            submit_next()
+            remaining[filename] -= 1
+            parts = list(batched(chunks, batch_size)) or [[]]
+            for i, part in enumerate(parts):
+                yield filename, part, remaining[filename] == 0 and i == len(parts) - 1
+
+
+def ingest_files(files: Iterable[tuple[str, object]],
+                 vector_store=None,
+                 max_workers: int = INGEST_WORKERS,
+                 pages_per_task: int = INGEST_PDF_PAGES_PER_TASK,
+                 batch_size: int = INGEST_BATCH_SIZE,
+                 queue_size: int = INGEST_QUEUE_SIZE,
+                 progress: Callable[[str, int, bool], None] | None = None) -> dict[str, int]:
+    """Ingest ``(filename, file_obj)`` pairs, parsing on all cores.
+
+    Uploads are read from memory (see ``document_loaders.file_buffer``);
+    when the work is spread over the pool each one is copied once into a
+    shared memory block that workers parse in place, whole files or PDF
+    page ranges, returning split chunks which a single writer (this
+    thread) embeds and upserts.  Parsed CSV/XLSX frames come back too and
+    land in the loaders' table cache, so ``read_tables`` afterwards (the
+    UI) doesn't parse again.  Tables above the streaming threshold skip
+    the pool and are streamed in‑process so their memory stays flat.
+    Files whose hash matches the manifest are skipped, and changed ones
+    only write their new chunks.  *progress* is called as ``(filename,
+    chunks written so far, finished)``.  Returns new‑chunk counts per file.
+    """
+    vs = get_vector_store() if vector_store is None else vector_store
+    written: dict[str, int] = {}
+
+    def on_written(filename, n, last):
+        written[filename] = written.get(filename, 0) + n
+        if progress:
+            progress(filename, written[filename], last)
+
+    digests: dict[str, str] = {}
+    sizes: dict[str, int] = {}
+    buffered, streamed = [], []
+    for filename, file_obj in files:
+        digests[filename] = file_digest(file_obj)
+        if not _needs_ingest(filename, digests[filename], vs):
+            on_written(filename, 0, True)   # unchanged: nothing to do
+            continue
+        ext = filename.rsplit(".", 1)[-1].lower()
+        sizes[filename] = file_size(file_obj)
+        if ext in ("csv", "xlsx") and sizes[filename] > INGEST_STREAM_THRESHOLD_BYTES:
+            streamed.append((filename, file_obj))
+            continue
+        buf = file_buffer(file_obj)
+        buffered.append((filename, buf, _plan_tasks(buf, filename, pages_per_task)))
+
+    if sum(len(plan) for _, _, plan in buffered) > 1 and max_workers > 1:
+        blocks = []
+        try:
+            tasks = []
+            for filename, buf, plan in buffered:
+                shm = SharedMemory(create=True, size=max(len(buf), 1))
+                blocks.append(shm)
+                shm.buf[:len(buf)] = buf
+                tasks += [((shm.name, len(buf)), filename, pages, digests[filename])
+                          for pages in plan]
+            _run_pipeline(_pooled_batches(tasks, max_workers, batch_size),
+                          vs, queue_size, digests, on_written, sizes)
+        finally:
+            for shm in blocks:
+                shm.close()
+                shm.unlink()
+    else:
+        for filename, buf, _ in buffered:
+            _run_pipeline(_file_batches(BufferReader(buf), filename, batch_size),
+                          vs, queue_size, digests, on_written, sizes)
+
+    for filename, file_obj in streamed:
+        _run_pipeline(_file_batches(file_obj, filename, batch_size),
+                      vs, queue_size, digests, on_written, sizes)
+    return written
@@ -0,0 +1,541 @@
+# agents/unstructured_agent/keyword_index.py
+"""
+Corpus‑wide BM25 index kept on disk next to the Chroma store.
+
+The index is a list of immutable *segments* plus a small ``index.json``
+manifest.  Adds are buffered in memory and written
+``KEYWORD_INDEX_SEGMENT_DOCS`` at a time (ingest flushes the remainder),
+so a large ingest makes a few big segments rather than one per batch.
+Each segment holds
+
+    lexicon.json   term -> [offset, df]  into postings.bin
+    postings.bin   (doc ordinal, term frequency) pairs, grouped by term
+    doclens.bin    token count per doc
+    ids.bin        Chroma id per doc (fixed width)
+    fields.json    field -> value -> doc ordinals, for the filter fields
+                   (source, sheet_name, department, year, level)
+    deleted.bin    tombstone byte per doc
+
+Postings, lengths, ids and tombstones are memory‑mapped, so a query only
+touches the pages of the terms it contains – chunk text never leaves
+Chroma.  A filtered query resolves its filter against ``fields.json``
+first and skips segments with no matching docs.
+
+The Streamlit UI and the API write the same directory, so every write
+holds a file lock (``.lock``) and re‑reads the manifest under it.
+Searches take no file lock: segments that a merge or delete takes out of
+the manifest are only removed once no search in this process has them
+pinned and ``RETIRE_GRACE_S`` has passed.  A live id → (segment,
+ordinal) map, rebuilt when another process changes the manifest, keeps
+duplicate checks and deletes from scanning every segment.
+"""
+import atexit, json, os, re, shutil, threading, time
+from collections import Counter, defaultdict
+from contextlib import contextmanager
+from functools import lru_cache
+from pathlib import Path
+from typing import List, Sequence, Tuple
+
+import numpy as np
+from langchain.docstore.document import Document
+
+from config.settings import KEYWORD_INDEX_DIRECTORY, KEYWORD_INDEX_SEGMENT_DOCS
+from agents.unstructured_agent.filters import FILTER_FIELDS, normalize_filters
+from utils.file_lock import file_lock
+
+POSTING_DTYPE = np.dtype([("doc", "<u4"), ("tf", "<u4")])
+ID_DTYPE = np.dtype("S64")
+
+# BM25 parameters (same defaults as rank_bm25 / BM25Retriever)
+K1, B = 1.5, 0.75
+
+# once there are more segments than this, the smallest ones get merged
+MAX_SEGMENTS = 16
+# merged / emptied segments are deleted this long after leaving the manifest
+RETIRE_GRACE_S = 60
+
+_TOKEN_RE = re.compile(r"\w+", re.UNICODE)
+
+
+def tokenize(text: str) -> List[str]:
+    return _TOKEN_RE.findall(text.lower())
+
+
+def _open_array(path: Path, dtype, mode: str = "r"):
+    """np.memmap that tolerates empty files (mmap refuses length 0)."""
+    if not path.exists() or path.stat().st_size == 0:
+        return np.zeros(0, dtype=dtype)
+    return np.memmap(path, dtype=dtype, mode=mode)
+
+
+def _write_json(path: Path, obj):
+    tmp = path.with_suffix(".tmp")
+    with open(tmp, "w", encoding="utf-8") as fh:
+        json.dump(obj, fh, ensure_ascii=False)
+    os.replace(tmp, path)
+
+
+# ------------------------------------------------------------------
+# Segment
+# ------------------------------------------------------------------
+class _Segment:
+    """Read view over one segment directory."""
+
+    def __init__(self, path: Path):
+        self.path = path
+        with open(path / "lexicon.json", encoding="utf-8") as fh:
+            self.lexicon: dict = json.load(fh)
+        self.postings = _open_array(path / "postings.bin", POSTING_DTYPE)
+        self.doclens = _open_array(path / "doclens.bin", np.dtype("<u4"))
+        self.ids = _open_array(path / "ids.bin", ID_DTYPE)
+        self.deleted = _open_array(path / "deleted.bin", np.dtype("u1"), mode="r+")
+        self._fields: dict | None = None
+
+    @property
+    def n_docs(self) -> int:
+        return len(self.doclens)
+
+    @property
+    def fields(self) -> dict:
+        # only needed for deletes and filters, so loaded on demand
+        if self._fields is None:
+            if (self.path / "fields.json").exists():
+                with open(self.path / "fields.json", encoding="utf-8") as fh:
+                    self._fields = json.load(fh)
+            else:  # segment written before field indexes existed
+                with open(self.path / "sources.json", encoding="utf-8") as fh:
+                    self._fields = {"source": json.load(fh)}
+        return self._fields
+
+    @property
+    def sources(self) -> dict:
+        return self.fields.get("source", {})
+
+    def allowed(self, filters: dict[str, list[str]]) -> np.ndarray | None:
+        """Boolean mask of docs matching normalised *filters* (None = all)."""
+        if not filters:
+            return None
+        mask = np.ones(self.n_docs, dtype=bool)
+        for field, values in filters.items():
+            index = self.fields.get(field, {})
+            field_mask = np.zeros(self.n_docs, dtype=bool)
+            for v in values:
+                field_mask[index.get(v, [])] = True
+            mask &= field_mask
+        return mask
+
+    def df(self, term: str) -> int:
+        entry = self.lexicon.get(term)
+        return entry[1] if entry else 0
+
+    def live_df(self, term: str) -> int:
+        """Document frequency among docs that are not tombstoned."""
+        plist = self.term_postings(term)
+        if plist is None:
+            return 0
+        return int((self.deleted[plist["doc"]] == 0).sum())
+
+    def term_postings(self, term: str):
+        entry = self.lexicon.get(term)
+        if entry is None:
+            return None
+        offset, df = entry
+        return self.postings[offset: offset + df]
+
+    def doc_id(self, ordinal: int) -> str:
+        return self.ids[ordinal].decode("ascii")
+
+    def live_count(self) -> int:
+        return int(self.n_docs - self.deleted.sum())
+
+    @staticmethod
+    def write(path: Path,
+              ids: Sequence[str],
+              term_counts: Sequence[Counter],
+              metas: Sequence[dict]):
+        """Serialise already‑tokenised docs into a new segment directory.
+
+        *metas* holds each doc's filter‑field values (see ``FILTER_FIELDS``).
+        """
+        postings: dict[str, list] = defaultdict(list)
+        doclens = np.zeros(len(ids), dtype="<u4")
+        fields: dict[str, dict] = {f: defaultdict(list) for f in FILTER_FIELDS}
+        for ordinal, (counts, meta) in enumerate(zip(term_counts, metas)):
+            doclens[ordinal] = sum(counts.values())
+            for term, tf in counts.items():
+                postings[term].append((ordinal, tf))
+            for field, value in meta.items():
+                if value is not None:
+                    fields[field][str(value)].append(ordinal)
+
+        lexicon = {}
+        flat = np.empty(sum(len(p) for p in postings.values()), dtype=POSTING_DTYPE)
+        offset = 0
+        for term in sorted(postings):
+            plist = postings[term]
+            flat[offset: offset + len(plist)] = plist
+            lexicon[term] = [offset, len(plist)]
+            offset += len(plist)
+        return _Segment.write_arrays(path, ids, doclens, flat, lexicon, fields)
+
+    @staticmethod
+    def write_arrays(path: Path, ids: Sequence[str], doclens: np.ndarray,
+                     postings: np.ndarray, lexicon: dict, fields: dict) -> int:
+        """Write a segment whose *postings* are already grouped by term in
+        *lexicon* order; returns the total token count."""
+        path.mkdir(parents=True)
+        postings.tofile(path / "postings.bin")
+        np.asarray(doclens, dtype="<u4").tofile(path / "doclens.bin")
+        np.array([i.encode("ascii") for i in ids], dtype=ID_DTYPE).tofile(path / "ids.bin")
+        np.zeros(len(ids), dtype="u1").tofile(path / "deleted.bin")
+        _write_json(path / "fields.json", fields)
+        _write_json(path / "lexicon.json", lexicon)
+        return int(np.asarray(doclens, dtype=np.int64).sum())
+
+
+def _merge_segments(path: Path, segments: Sequence[_Segment]) -> None:
+    """Write the live docs of *segments* as one new segment at *path*.
+
+    Postings are remapped and regrouped with numpy: each segment's
+    postings file is laid out in its lexicon's offset order, so a term id
+    per posting is one ``np.repeat`` away."""
+    terms = sorted(set().union(*(seg.lexicon for seg in segments)))
+    term_ids = {t: n for n, t in enumerate(terms)}
+    ids, doclens, tids, docs, tfs = [], [], [], [], []
+    fields: dict[str, dict] = {f: defaultdict(list) for f in FILTER_FIELDS}
+    for seg in segments:
+        live = np.flatnonzero(seg.deleted == 0)
+        remap = np.full(seg.n_docs, -1, dtype=np.int64)
+        remap[live] = np.arange(len(ids), len(ids) + len(live))
+        ids.extend(seg.doc_id(i) for i in live)
+        doclens.append(np.asarray(seg.doclens[live]))
+        for field, index in seg.fields.items():
+            for value, ords in index.items():
+                new = remap[np.asarray(ords, dtype=np.int64)]
+                fields.setdefault(field, defaultdict(list))[value].extend(new[new >= 0].tolist())
+        if not seg.lexicon:
+            continue
+        entries = sorted(seg.lexicon.items(), key=lambda kv: kv[1][0])
+        n = sum(df for _, (_, df) in entries)
+        tid = np.repeat(np.array([term_ids[t] for t, _ in entries], dtype=np.int64),
+                        [df for _, (_, df) in entries])
+        new = remap[seg.postings[:n]["doc"]]
+        keep = new >= 0
+        tids.append(tid[keep])
+        docs.append(new[keep])
+        tfs.append(np.asarray(seg.postings[:n]["tf"])[keep])
+
+    tids = np.concatenate(tids) if tids else np.zeros(0, dtype=np.int64)
+    docs = np.concatenate(docs) if docs else np.zeros(0, dtype=np.int64)
+    tfs = np.concatenate(tfs) if tfs else np.zeros(0, dtype="<u4")
+    order = np.lexsort((docs, tids))
+    flat = np.empty(len(order), dtype=POSTING_DTYPE)
+    flat["doc"], flat["tf"] = docs[order], tfs[order]
+    counts = np.bincount(tids, minlength=len(terms))
+    offsets = np.concatenate(([0], np.cumsum(counts)[:-1])) if len(terms) else counts
+    lexicon = {terms[t]: [int(offsets[t]), int(counts[t])] for t in np.flatnonzero(counts)}
+    _Segment.write_arrays(path, ids,
+                          np.concatenate(doclens) if doclens else np.zeros(0, dtype="<u4"),
+                          flat, lexicon, fields)
+
+
+# ------------------------------------------------------------------
+# Index
+# ------------------------------------------------------------------
+class KeywordIndex:
+    """Incrementally maintained, memory‑mapped BM25 index over Chroma ids."""
+
+    def __init__(self, directory: Path = KEYWORD_INDEX_DIRECTORY,
+                 segment_docs: int = KEYWORD_INDEX_SEGMENT_DOCS):
+        self.directory = Path(directory)
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self._manifest_path = self.directory / "index.json"
+        self._lock_path = self.directory / ".lock"
+        self.segment_docs = segment_docs
+        self._lock = threading.RLock()
+        self._writing_depth = 0
+        self._segments: dict[str, _Segment] = {}
+        self._manifest: dict | None = None
+        self._mtime = None
+        self._where: dict[str, tuple[str, int]] | None = None   # live id -> (segment, ordinal)
+        self._pending: dict[str, tuple[Counter, dict]] = {}      # adds not yet in a segment
+        self._pins: Counter = Counter()                          # segments in use by searches
+
+    # ---------------- manifest ----------------
+    def _load(self) -> dict:
+        """(Re)load the manifest if another process changed it."""
+        mtime = (self._manifest_path.stat().st_mtime_ns
+                 if self._manifest_path.exists() else None)
+        if self._manifest is None or mtime != self._mtime:
+            if mtime is None:
+                self._manifest = {"segments": [], "next_segment": 0,
+                                  "n_docs": 0, "total_len": 0}
+            else:
+                with open(self._manifest_path, encoding="utf-8") as fh:
+                    self._manifest = json.load(fh)
+            self._mtime = mtime
+            self._segments = {
+                name: self._segments.get(name) or _Segment(self.directory / name)
+                for name in self._manifest["segments"]
+            }
+            self._where = None
+        return self._manifest
+
+    def _save(self):
+        self._reap()
+        _write_json(self._manifest_path, self._manifest)
+        self._mtime = self._manifest_path.stat().st_mtime_ns
+
+    @contextmanager
+    def _writing(self):
+        """Serialise writers: the in‑process lock plus a file lock shared
+        with other processes, the manifest reloaded once it is held."""
+        with self._lock:
+            if self._writing_depth:
+                yield self._load()
+                return
+            with file_lock(self._lock_path):
+                self._writing_depth += 1
+                try:
+                    yield self._load()
+                finally:
+                    self._writing_depth -= 1
+
+    def _id_map(self) -> dict[str, tuple[str, int]]:
+        """Where each live id sits; built once per manifest version and
+        kept up to date by this process's own writes."""
+        if self._where is None:
+            self._where = {
+                seg.doc_id(o): (name, int(o))
+                for name, seg in self._segments.items()
+                for o in np.flatnonzero(seg.deleted == 0)
+            }
+        return self._where
+
+    def __len__(self) -> int:
+        with self._lock:
+            return self._load()["n_docs"] + len(self._pending)
+
+    # ---------------- segment lifecycle ----------------
+    def _retire(self, names: Sequence[str]):
+        """Take segments out of the manifest; their files stay until no
+        search can still be reading them (see :meth:`_reap`)."""
+        now = time.time()
+        retired = self._manifest.setdefault("retired", [])
+        for name in names:
+            self._manifest["segments"].remove(name)
+            self._segments.pop(name, None)
+            retired.append([name, now])
+
+    def _reap(self):
+        """Delete retired segments past ``RETIRE_GRACE_S`` (searches in
+        other processes hold no lock) that no search here has pinned."""
+        keep, now = [], time.time()
+        for name, when in self._manifest.get("retired", []):
+            if now - when < RETIRE_GRACE_S or self._pins[name]:
+                keep.append([name, when])
+            else:
+                shutil.rmtree(self.directory / name, ignore_errors=True)
+        self._manifest["retired"] = keep
+
+    # ---------------- writes ----------------
+    def add(self, ids: Sequence[str], docs: Sequence[Document]):
+        """Index freshly upserted chunks under their Chroma ids; ids that
+        are already live (a re-run after a crashed ingest) are skipped.
+        Adds are buffered and written as one segment per ``segment_docs``
+        chunks – :meth:`flush` writes the rest (ingest does at the end)."""
+        if not ids:
+            return
+        new = {}
+        for i, d in zip(ids, docs):
+            if i not in new:
+                new[i] = (Counter(tokenize(d.page_content)),
+                          {f: d.metadata.get(f) for f in FILTER_FIELDS})
+        with self._lock:
+            self._load()
+            where = self._id_map()
+            for i, entry in new.items():
+                if i not in where:
+                    self._pending.setdefault(i, entry)
+            if len(self._pending) >= self.segment_docs:
+                self.flush()
+
+    def flush(self):
+        """Write buffered adds as one segment."""
+        with self._lock:
+            if not self._pending:
+                return
+            with self._writing() as manifest:
+                where = self._id_map()   # another process may have added them meanwhile
+                pending = {i: v for i, v in self._pending.items() if i not in where}
+                self._pending = {}
+                if not pending:
+                    return
+                ids = list(pending)
+                name = f"seg_{manifest['next_segment']:06d}"
+                total = _Segment.write(self.directory / name, ids,
+                                       [c for c, _ in pending.values()],
+                                       [m for _, m in pending.values()])
+                manifest["next_segment"] += 1
+                manifest["segments"].append(name)
+                manifest["n_docs"] += len(ids)
+                manifest["total_len"] += total
+                self._segments[name] = _Segment(self.directory / name)
+                where.update((i, (name, o)) for o, i in enumerate(ids))
+                self._maybe_merge()
+                self._save()
+
+    def _tombstone(self, seg: _Segment, ordinals) -> None:
+        ordinals = np.asarray(ordinals, dtype=np.int64)
+        ordinals = ordinals[seg.deleted[ordinals] == 0]
+        if not len(ordinals):
+            return
+        seg.deleted[ordinals] = 1
+        seg.deleted.flush()
+        self._manifest["n_docs"] -= len(ordinals)
+        self._manifest["total_len"] -= int(seg.doclens[ordinals].sum())
+        if self._where is not None:
+            for o in ordinals:
+                self._where.pop(seg.doc_id(o), None)
+
+    def _drop_empty_segments(self):
+        self._retire([name for name, seg in self._segments.items()
+                      if seg.live_count() == 0])
+
+    def delete_source(self, source: str):
+        """Remove every chunk that came from *source*."""
+        with self._lock:
+            self._pending = {i: (c, m) for i, (c, m) in self._pending.items()
+                             if m.get("source") != source}
+            with self._writing():
+                for seg in self._segments.values():
+                    ordinals = seg.sources.get(source)
+                    if ordinals:
+                        self._tombstone(seg, ordinals)
+                self._drop_empty_segments()
+                self._save()
+
+    def delete_ids(self, ids: Sequence[str]):
+        """Remove individual chunks by Chroma id."""
+        if not ids:
+            return
+        with self._lock:
+            for i in ids:
+                self._pending.pop(i, None)
+            with self._writing():
+                where = self._id_map()
+                by_segment: dict[str, list[int]] = defaultdict(list)
+                for i in ids:
+                    if i in where:
+                        name, ordinal = where[i]
+                        by_segment[name].append(ordinal)
+                for name, ordinals in by_segment.items():
+                    self._tombstone(self._segments[name], ordinals)
+                self._drop_empty_segments()
+                self._save()
+
+    def clear(self):
+        with self._lock:
+            self._pending = {}
+            with self._writing() as manifest:
+                self._retire(list(self._segments))
+                manifest.update(n_docs=0, total_len=0)
+                self._where = {}
+                self._save()
+
+    def compact(self, names: Sequence[str] | None = None):
+        """Merge *names* (default: all segments, after a :meth:`flush`)
+        into one, dropping tombstones."""
+        with self._lock:
+            if names is None:
+                self.flush()
+            with self._writing() as manifest:
+                names = [n for n in (names or self._segments) if n in self._segments]
+                if len(names) < 2:
+                    return
+                # live doc count and total length are unchanged by a merge
+                name = f"seg_{manifest['next_segment']:06d}"
+                _merge_segments(self.directory / name, [self._segments[n] for n in names])
+                manifest["next_segment"] += 1
+                self._retire(names)
+                manifest["segments"].append(name)
+                seg = self._segments[name] = _Segment(self.directory / name)
+                if self._where is not None:
+                    self._where.update((seg.doc_id(o), (name, o)) for o in range(seg.n_docs))
+                self._save()
+
+    def _maybe_merge(self):
+        """Tiered policy: fold the smallest half into one segment."""
+        if len(self._segments) <= MAX_SEGMENTS:
+            return
+        by_size = sorted(self._segments, key=lambda n: self._segments[n].live_count())
+        self.compact(by_size[: MAX_SEGMENTS // 2 + 1])
+
+    # ---------------- reads ----------------
+    def search(self, query: str, k: int = 10,
+               filters: dict | None = None) -> List[Tuple[str, float]]:
+        """Return up to *k* ``(chroma_id, bm25_score)`` pairs, best first,
+        among docs matching *filters* (see ``filters.normalize_filters``)."""
+        terms = set(tokenize(query))
+        filters = normalize_filters(filters)
+        with self._lock:
+            self.flush()
+            manifest = self._load()
+            segments = list(self._segments.values())
+            self._pins.update(seg.path.name for seg in segments)
+        try:
+            return self._search(terms, k, filters, manifest, segments)
+        finally:
+            with self._lock:
+                self._pins.subtract(seg.path.name for seg in segments)
+
+    @staticmethod
+    def _search(terms, k, filters, manifest, segments) -> List[Tuple[str, float]]:
+        n_docs = manifest["n_docs"]
+        if not terms or not n_docs:
+            return []
+        avgdl = manifest["total_len"] / n_docs
+
+        idf = {}
+        for t in terms:
+            df = sum(seg.live_df(t) for seg in segments)
+            if df:
+                idf[t] = np.log1p((n_docs - df + 0.5) / (df + 0.5))
+
+        hits: list[tuple[float, str]] = []
+        for seg in segments:
+            allowed = seg.allowed(filters)
+            if allowed is not None and not allowed.any():
+                continue
+            scores = None
+            for t, w in idf.items():
+                plist = seg.term_postings(t)
+                if plist is None:
+                    continue
+                if scores is None:
+                    scores = np.zeros(seg.n_docs, dtype=np.float32)
+                docs = plist["doc"]
+                tf = plist["tf"].astype(np.float32)
+                norm = K1 * (1 - B + B * seg.doclens[docs] / avgdl)
+                scores[docs] += w * tf * (K1 + 1) / (tf + norm)
+            if scores is None:
+                continue
+            scores[seg.deleted != 0] = 0
+            if allowed is not None:
+                scores[~allowed] = 0
+            top = np.flatnonzero(scores > 0)
+            if len(top) > k:
+                top = top[np.argpartition(-scores[top], k - 1)[:k]]
+            hits.extend((float(scores[i]), seg.doc_id(i)) for i in top)
+
+        hits.sort(reverse=True)
+        return [(doc_id, score) for score, doc_id in hits[:k]]
+
+
+@lru_cache(maxsize=None)
+def get_keyword_index(directory: Path = KEYWORD_INDEX_DIRECTORY) -> KeywordIndex:
+    """One index object per directory and process; buffered adds are
+    flushed at exit."""
+    index = KeywordIndex(directory)
+    atexit.register(index.flush)
+    return index
@@ -0,0 +1,258 @@
+# agents/unstructured_agent/manifest.py
+"""
+Persistent ingest manifest: which file versions and chunks are in the
+vector store.
+
+    files   source -> sha256 of the uploaded bytes
+    chunks  chroma id (= chunk hash) -> source, sheet, text bytes
+    catalog source -> chunk count, text/file bytes, ingest time, sheets
+    meta    corpus_version, bumped whenever a file is (re)ingested or removed
+
+Chunk ids are content hashes, so re‑ingesting a changed file only embeds
+chunks whose text/metadata changed and deletes the ones that vanished;
+an unchanged file is skipped before it is even parsed.  The catalog is
+updated in the same transactions as ``chunks``, so corpus statistics are
+a single small query instead of a scan of the whole collection.
+"""
+import hashlib, json, sqlite3, threading, time
+from functools import lru_cache
+from pathlib import Path
+from typing import Iterable
+
+from langchain.docstore.document import Document
+
+from config.settings import INGEST_MANIFEST_PATH
+
+_READ_BLOCK = 1024 * 1024
+_SQLITE_MAX_VARS = 500
+
+
+def file_digest(file_obj) -> str:
+    """sha256 of a file‑like object, read in blocks; rewinds afterwards."""
+    h = hashlib.sha256()
+    file_obj.seek(0)
+    while block := file_obj.read(_READ_BLOCK):
+        h.update(block)
+    file_obj.seek(0)
+    return h.hexdigest()
+
+
+def chunk_hash(doc: Document) -> str:
+    """Stable id for a chunk: its text plus (primitive) metadata."""
+    payload = json.dumps(
+        {"text": doc.page_content, "meta": doc.metadata},
+        sort_keys=True, ensure_ascii=False, default=str,
+    )
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class IngestManifest:
+    def __init__(self, path: Path = INGEST_MANIFEST_PATH):
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(str(path), check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.executescript("""
+            CREATE TABLE IF NOT EXISTS files (
+                source     TEXT PRIMARY KEY,
+                file_hash  TEXT NOT NULL,
+                updated_at REAL NOT NULL
+            );
+            CREATE TABLE IF NOT EXISTS chunks (
+                chroma_id  TEXT PRIMARY KEY,
+                source     TEXT NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS chunks_source ON chunks(source);
+            CREATE TABLE IF NOT EXISTS catalog (
+                source      TEXT PRIMARY KEY,
+                chunks      INTEGER NOT NULL DEFAULT 0,
+                text_bytes  INTEGER NOT NULL DEFAULT 0,
+                file_bytes  INTEGER,
+                ingested_at REAL,
+                sheets      TEXT NOT NULL DEFAULT '[]'
+            );
+            CREATE TABLE IF NOT EXISTS meta (
+                key        TEXT PRIMARY KEY,
+                value      INTEGER NOT NULL
+            );
+            INSERT OR IGNORE INTO meta(key, value) VALUES ('corpus_version', 0);
+        """)
+        # manifests created before the catalog existed
+        cols = {r[1] for r in self._conn.execute("PRAGMA table_info(chunks)")}
+        if "sheet_name" not in cols:
+            self._conn.execute("ALTER TABLE chunks ADD COLUMN sheet_name TEXT")
+        if "text_bytes" not in cols:
+            self._conn.execute(
+                "ALTER TABLE chunks ADD COLUMN text_bytes INTEGER NOT NULL DEFAULT 0")
+        self._conn.execute(
+            "CREATE INDEX IF NOT EXISTS chunks_source_sheet ON chunks(source, sheet_name)")
+        self._conn.commit()
+
+    # ---------------- reads ----------------
+    def file_hash(self, source: str) -> str | None:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT file_hash FROM files WHERE source = ?", (source,)
+            ).fetchone()
+        return row[0] if row else None
+
+    def chunk_ids(self, source: str) -> set[str]:
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT chroma_id FROM chunks WHERE source = ?", (source,)
+            ).fetchall()
+        return {r[0] for r in rows}
+
+    def corpus_version(self) -> int:
+        """Monotonic counter; changes whenever the indexed corpus does."""
+        with self._lock:
+            return self._conn.execute(
+                "SELECT value FROM meta WHERE key = 'corpus_version'"
+            ).fetchone()[0]
+
+    def sources(self) -> list[str]:
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT source FROM files ORDER BY updated_at"
+            ).fetchall()
+        return [r[0] for r in rows]
+
+    def catalog(self, source: str | None = None) -> list[dict]:
+        """Per‑source stats, oldest ingest first (or just *source*)."""
+        sql = ("SELECT source, chunks, text_bytes, file_bytes, ingested_at, sheets "
+               "FROM catalog")
+        args: tuple = ()
+        if source is not None:
+            sql, args = sql + " WHERE source = ?", (source,)
+        with self._lock:
+            rows = self._conn.execute(sql + " ORDER BY ingested_at", args).fetchall()
+        return [
+            {"source": src, "chunks": n, "text_bytes": tb, "file_bytes": fb,
+             "ingested_at": at, "sheets": json.loads(sheets)}
+            for src, n, tb, fb, at, sheets in rows
+        ]
+
+    def stats(self) -> dict:
+        with self._lock:
+            docs, chunks, text_bytes, file_bytes = self._conn.execute(
+                "SELECT COUNT(*), COALESCE(SUM(chunks), 0), COALESCE(SUM(text_bytes), 0), "
+                "COALESCE(SUM(file_bytes), 0) FROM catalog"
+            ).fetchone()
+        return {"documents": docs, "chunks": chunks, "text_bytes": text_bytes,
+                "file_bytes": file_bytes, "corpus_version": self.corpus_version()}
+
+    # ---------------- writes ----------------
+    def add_chunks(self, source: str, ids: Iterable[str],
+                   docs: Iterable[Document] | None = None):
+        """Record chunk ids (and, given *docs*, their sheet and size)."""
+        ids = list(ids)
+        docs = list(docs) if docs is not None else [None] * len(ids)
+        with self._lock:
+            added, nbytes, sheets = 0, 0, set()
+            for i, doc in zip(ids, docs):
+                sheet = doc.metadata.get("sheet_name") if doc is not None else None
+                size = len(doc.page_content.encode("utf-8")) if doc is not None else 0
+                cur = self._conn.execute(
+                    "INSERT OR IGNORE INTO chunks(chroma_id, source, sheet_name, text_bytes) "
+                    "VALUES (?, ?, ?, ?)", (i, source, sheet, size),
+                )
+                if cur.rowcount:
+                    added += 1
+                    nbytes += size
+                    if sheet is not None:
+                        sheets.add(str(sheet))
+            if added:
+                self._adjust(source, added, nbytes, sheets)
+            self._conn.commit()
+
+    def remove_chunks(self, ids: Iterable[str]):
+        with self._lock:
+            self._remove_chunks(list(ids))
+            self._conn.commit()
+
+    def set_file(self, source: str, file_hash: str, file_bytes: int | None = None):
+        with self._lock:
+            self._set_file(source, file_hash, file_bytes)
+            self._conn.commit()
+
+    def finish_file(self, source: str, file_hash: str,
+                    stale_ids: Iterable[str] = (), file_bytes: int | None = None):
+        """Drop a re‑ingested file's vanished chunks and record its new
+        hash in one transaction."""
+        with self._lock:
+            self._remove_chunks(list(stale_ids))
+            self._set_file(source, file_hash, file_bytes)
+            self._conn.commit()
+
+    def remove_file(self, source: str):
+        with self._lock:
+            self._conn.execute("DELETE FROM files WHERE source = ?", (source,))
+            self._conn.execute("DELETE FROM chunks WHERE source = ?", (source,))
+            self._conn.execute("DELETE FROM catalog WHERE source = ?", (source,))
+            self._bump()
+            self._conn.commit()
+
+    # ---------------- helpers (lock held) ----------------
+    def _adjust(self, source: str, chunks: int, text_bytes: int, sheets: set):
+        row = self._conn.execute(
+            "SELECT sheets FROM catalog WHERE source = ?", (source,)
+        ).fetchone()
+        if row is None:
+            self._conn.execute(
+                "INSERT INTO catalog(source, chunks, text_bytes, sheets) VALUES (?, ?, ?, ?)",
+                (source, chunks, text_bytes, json.dumps(sorted(sheets))),
+            )
+            return
+        merged = set(json.loads(row[0])) | sheets
+        self._conn.execute(
+            "UPDATE catalog SET chunks = chunks + ?, text_bytes = text_bytes + ?, "
+            "sheets = ? WHERE source = ?",
+            (chunks, text_bytes, json.dumps(sorted(merged)), source),
+        )
+
+    def _remove_chunks(self, ids: list[str]):
+        touched = {}
+        for i in range(0, len(ids), _SQLITE_MAX_VARS):
+            batch = ids[i: i + _SQLITE_MAX_VARS]
+            marks = ",".join("?" * len(batch))
+            for source, n, nbytes in self._conn.execute(
+                f"SELECT source, COUNT(*), SUM(text_bytes) FROM chunks "
+                f"WHERE chroma_id IN ({marks}) GROUP BY source", batch,
+            ):
+                prev = touched.get(source, (0, 0))
+                touched[source] = (prev[0] + n, prev[1] + nbytes)
+            self._conn.execute(f"DELETE FROM chunks WHERE chroma_id IN ({marks})", batch)
+        for source, (n, nbytes) in touched.items():
+            sheets = [r[0] for r in self._conn.execute(
+                "SELECT DISTINCT sheet_name FROM chunks "
+                "WHERE source = ? AND sheet_name IS NOT NULL ORDER BY sheet_name", (source,)
+            )]
+            self._conn.execute(
+                "UPDATE catalog SET chunks = chunks - ?, text_bytes = text_bytes - ?, "
+                "sheets = ? WHERE source = ?",
+                (n, nbytes, json.dumps(sheets), source),
+            )
+
+    def _set_file(self, source: str, file_hash: str, file_bytes: int | None):
+        now = time.time()
+        self._conn.execute(
+            "INSERT OR REPLACE INTO files(source, file_hash, updated_at) VALUES (?, ?, ?)",
+            (source, file_hash, now),
+        )
+        self._conn.execute(
+            "INSERT INTO catalog(source, file_bytes, ingested_at) VALUES (?, ?, ?) "
+            "ON CONFLICT(source) DO UPDATE SET "
+            "file_bytes = COALESCE(excluded.file_bytes, file_bytes), "
+            "ingested_at = excluded.ingested_at",
+            (source, file_bytes, now),
+        )
+        self._bump()
+
+    def _bump(self):
+        self._conn.execute(
+            "UPDATE meta SET value = value + 1 WHERE key = 'corpus_version'"
+        )
+
+
+@lru_cache(maxsize=None)
+def get_manifest(path: Path = INGEST_MANIFEST_PATH) -> IngestManifest:
+    return IngestManifest(path)
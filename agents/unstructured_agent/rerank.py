@@ -0,0 +1,247 @@
+# agents/unstructured_agent/rerank.py
+"""
+Rerank subsystem: Cohere behind a score cache, a timeout and a circuit
+breaker, with a local CPU scorer as fallback.
+
+    (query hash, passage hash) -> relevance score   LRU, remote scores only
+
+Only passages without a cached score for the query go to Cohere, and
+concurrent async requests for the same question share one in‑flight call.
+After ``RERANK_BREAKER_FAILURES`` consecutive errors/timeouts the breaker
+opens and every request is scored locally until the cool‑down has passed;
+the next request then probes Cohere again.
+"""
+import asyncio, hashlib, math, threading, time
+from collections import Counter, OrderedDict
+from typing import List, Protocol, Sequence
+
+from langchain.schema import Document
+
+from config.settings import (
+    RERANK_MODEL, RERANK_TIMEOUT_SECONDS, RERANK_CACHE_MAX_ENTRIES,
+    RERANK_BREAKER_FAILURES, RERANK_BREAKER_COOLDOWN_SECONDS,
+    RERANK_MAX_CONCURRENCY,
+)
+from agents.unstructured_agent.embedding_cache import normalize_text
+from agents.unstructured_agent.keyword_index import tokenize, K1, B
+
+
+def _digest(text: str) -> str:
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+# ------------------------------------------------------------------
+# Local scorers
+# ------------------------------------------------------------------
+class LocalReranker(Protocol):
+    def score(self, query: str, passages: Sequence[str]) -> List[float]: ...
+
+
+class BM25Reranker:
+    """BM25 over the candidate passages themselves – no model, no I/O."""
+
+    def score(self, query: str, passages: Sequence[str]) -> List[float]:
+        docs = [Counter(tokenize(p)) for p in passages]
+        if not docs:
+            return []
+        lens = [sum(d.values()) for d in docs]
+        avgdl = (sum(lens) / len(lens)) or 1.0
+        n = len(docs)
+        scores = [0.0] * n
+        for term in set(tokenize(query)):
+            df = sum(term in d for d in docs)
+            if not df:
+                continue
+            idf = math.log1p((n - df + 0.5) / (df + 0.5))
+            for i, d in enumerate(docs):
+                tf = d.get(term, 0)
+                if tf:
+                    scores[i] += idf * tf * (K1 + 1) / (tf + K1 * (1 - B + B * lens[i] / avgdl))
+        return scores
+
+
+# ------------------------------------------------------------------
+class Reranker:
+    """Cached, time‑boxed remote reranker that degrades to *local*."""
+
+    def __init__(self,
+                 client=None,
+                 async_client=None,
+                 local: LocalReranker | None = None,
+                 model: str = RERANK_MODEL,
+                 timeout: float = RERANK_TIMEOUT_SECONDS,
+                 max_entries: int = RERANK_CACHE_MAX_ENTRIES,
+                 breaker_failures: int = RERANK_BREAKER_FAILURES,
+                 breaker_cooldown: float = RERANK_BREAKER_COOLDOWN_SECONDS,
+                 max_concurrency: int = RERANK_MAX_CONCURRENCY):
+        self.client = client
+        self.async_client = async_client
+        self.local = local or BM25Reranker()
+        self.model = model
+        self.timeout = timeout
+        self.max_entries = max_entries
+        self.breaker_failures = breaker_failures
+        self.breaker_cooldown = breaker_cooldown
+        self._scores: "OrderedDict[tuple[str, str], float]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._limit = asyncio.Semaphore(max_concurrency)
+        self._inflight: dict[str, asyncio.Future] = {}
+        self._failures = 0
+        self._opened_at: float | None = None
+        self.hits = 0
+        self.misses = 0
+        self.remote_calls = 0
+        self.remote_errors = 0
+        self.fallbacks = 0
+
+    # ---------------- cache ----------------
+    def _cached(self, qkey: str, pkeys: List[str]) -> dict[str, float]:
+        found = {}
+        with self._lock:
+            for pk in pkeys:
+                score = self._scores.get((qkey, pk))
+                if score is not None:
+                    self._scores.move_to_end((qkey, pk))
+                    found[pk] = score
+        return found
+
+    def _remember(self, qkey: str, scores: dict[str, float]):
+        with self._lock:
+            for pk, score in scores.items():
+                self._scores[(qkey, pk)] = score
+            while len(self._scores) > self.max_entries:
+                self._scores.popitem(last=False)
+
+    # ---------------- circuit breaker ----------------
+    def _breaker_open(self) -> bool:
+        with self._lock:
+            if self._opened_at is None:
+                return False
+            if time.monotonic() - self._opened_at >= self.breaker_cooldown:
+                self._opened_at = None   # half‑open: let the next call probe
+                self._failures = self.breaker_failures - 1
+                return False
+            return True
+
+    def _record(self, ok: bool):
+        with self._lock:
+            self.remote_calls += 1
+            if ok:
+                self._failures = 0
+                return
+            self.remote_errors += 1
+            self._failures += 1
+            if self._failures >= self.breaker_failures:
+                self._opened_at = time.monotonic()
+
+    # ---------------- scoring ----------------
+    def _split(self, query: str, passages: Sequence[str]):
+        qkey = _digest(f"{self.model}\0{normalize_text(query).lower()}")
+        pkeys = [_digest(normalize_text(p)) for p in passages]
+        found = self._cached(qkey, pkeys)
+        missing = {pk: p for pk, p in zip(pkeys, passages) if pk not in found}
+        return qkey, pkeys, found, missing
+
+    def _remote_request(self, query: str, missing: dict[str, str]) -> dict:
+        return dict(model=self.model, query=query,
+                    documents=list(missing.values()), top_n=len(missing),
+                    request_options={"timeout_in_seconds": math.ceil(self.timeout)})
+
+    @staticmethod
+    def _unpack(resp, missing: dict[str, str]) -> dict[str, float]:
+        keys = list(missing)
+        return {keys[r.index]: r.relevance_score for r in resp.results}
+
+    def score(self, query: str, passages: Sequence[str]) -> List[float]:
+        qkey, pkeys, found, missing = self._split(query, passages)
+        cached = len(found)
+        if missing and self.client is not None and not self._breaker_open():
+            try:
+                resp = self.client.rerank(**self._remote_request(query, missing))
+                fresh = self._unpack(resp, missing)
+                self._record(True)
+                self._remember(qkey, fresh)
+                found.update(fresh)
+                self.misses += len(missing)
+            except Exception:
+                self._record(False)
+        if len(found) < len(pkeys):
+            self.fallbacks += 1
+            return self.local.score(query, passages)
+        self.hits += cached
+        return [found[pk] for pk in pkeys]
+
+    async def ascore(self, query: str, passages: Sequence[str]) -> List[float]:
+        qkey, pkeys, found, missing = self._split(query, passages)
+        pending = self._inflight.get(qkey)
+        if missing and pending is not None:
+            # same question already on its way to Cohere: wait and re‑check
+            await asyncio.wait([pending])
+            found.update(self._cached(qkey, list(missing)))
+            missing = {pk: p for pk, p in missing.items() if pk not in found}
+        cached = len(pkeys) - len(missing)
+        if missing and self.async_client is not None and not self._breaker_open():
+            call = asyncio.ensure_future(self._acall(qkey, query, missing))
+            self._inflight[qkey] = call
+            try:
+                found.update(await call)
+            except Exception:
+                pass
+            finally:
+                if self._inflight.get(qkey) is call:
+                    del self._inflight[qkey]
+        if len(found) < len(pkeys):
+            self.fallbacks += 1
+            return await asyncio.to_thread(self.local.score, query, passages)
+        self.hits += cached
+        return [found[pk] for pk in pkeys]
+
+    async def _acall(self, qkey: str, query: str, missing: dict[str, str]) -> dict:
+        try:
+            async with self._limit:
+                resp = await asyncio.wait_for(
+                    self.async_client.rerank(**self._remote_request(query, missing)),
+                    timeout=self.timeout,
+                )
+        except Exception:
+            self._record(False)
+            raise
+        self._record(True)
+        fresh = self._unpack(resp, missing)
+        self._remember(qkey, fresh)
+        self.misses += len(missing)
+        return fresh
+
+    # ---------------- API ----------------
+    def rerank(self, query: str, docs: List[Document], top_k: int = 3) -> List[Document]:
+        if not docs:
+            return []
+        scores = self.score(query, [d.page_content for d in docs])
+        return _top(docs, scores, top_k)
+
+    async def arerank(self, query: str, docs: List[Document], top_k: int = 3) -> List[Document]:
+        if not docs:
+            return []
+        scores = await self.ascore(query, [d.page_content for d in docs])
+        return _top(docs, scores, top_k)
+
+    def stats(self) -> dict:
+        total = self.hits + self.misses
+        return {
+            "model": self.model,
+            "entries": len(self._scores),
+            "max_entries": self.max_entries,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / total if total else 0.0,
+            "remote_calls": self.remote_calls,
+            "remote_errors": self.remote_errors,
+            "fallbacks": self.fallbacks,
+            "breaker_open": self._opened_at is not None,
+        }
+
+
+def _top(docs: List[Document], scores: List[float], top_k: int) -> List[Document]:
+    # stable: ties keep retrieval order
+    order = sorted(range(len(docs)), key=lambda i: -scores[i])
+    return [docs[i] for i in order[:top_k]]
@@ -0,0 +1,71 @@
+# agents/unstructured_agent/shards.py
+"""
+Shard naming and routing for the optional per‑department / per‑year
+split of the vector store (``VECTOR_SHARDING``).
+
+    none              everything in ``COLLECTION_NAME``
+    department        ``institutional_docs.finance``
+    department_year   ``institutional_docs.finance.2024``
+
+The shard keys are the ``department`` / ``year`` fields that
+``parse_filename_for_metadata`` puts on every chunk.  A query whose
+filters pin those fields is routed to the matching shard(s) only; any
+other query fans out to every shard.  The unsuffixed base collection is
+always kept in the read set so data indexed before sharding was turned
+on stays searchable.
+"""
+import re
+from typing import Iterable, List
+
+from config.settings import COLLECTION_NAME, VECTOR_SHARDING
+from agents.unstructured_agent.filters import normalize_filters
+
+SHARD_SCHEMES = {
+    "none": (),
+    "department": ("department",),
+    "department_year": ("department", "year"),
+}
+_MAX_NAME = 63   # chromadb collection name limit
+
+
+def shard_fields(scheme: str = VECTOR_SHARDING) -> tuple:
+    try:
+        return SHARD_SCHEMES[scheme]
+    except KeyError:
+        raise ValueError(f"VECTOR_SHARDING must be one of {tuple(SHARD_SCHEMES)}") from None
+
+
+def _slug(value) -> str:
+    return re.sub(r"[^a-z0-9]+", "_", str(value).lower()).strip("_") or "unknown"
+
+
+def shard_name(metadata: dict, base: str = COLLECTION_NAME,
+               scheme: str = VECTOR_SHARDING) -> str:
+    """Collection a chunk with *metadata* is written to."""
+    fields = shard_fields(scheme)
+    if not fields:
+        return base
+    parts = [_slug(metadata.get(f) or "unknown") for f in fields]
+    return ".".join([base, *parts])[:_MAX_NAME].rstrip("._")
+
+
+def route(filters: dict | None, existing: Iterable[str],
+          base: str = COLLECTION_NAME, scheme: str = VECTOR_SHARDING) -> List[str]:
+    """Collections among *existing* that can hold chunks matching *filters*."""
+    fields = shard_fields(scheme)
+    existing = set(existing)
+    if not fields:
+        return [base]
+    wanted = normalize_filters(filters)
+    out = []
+    for name in sorted(existing):
+        if not name.startswith(base + "."):
+            continue
+        parts = name[len(base) + 1:].split(".")
+        # a shard written under a coarser scheme has fewer parts: keep it
+        if all(f not in wanted or i >= len(parts) or parts[i] in {_slug(v) for v in wanted[f]}
+               for i, f in enumerate(fields)):
+            out.append(name)
+    if base in existing:
+        out.append(base)   # pre‑sharding data
+    return out
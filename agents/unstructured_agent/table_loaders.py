@@ -1,7 +1,134 @@
 # agents/unstructured_agent/table_loaders.py
 import json, pandas as pd
+import numpy as np
+from pandas.core.dtypes.cast import maybe_box_native
+from functools import partial
+from json.encoder import encode_basestring
+from typing import Iterable, Iterator
 from langchain.docstore.document import Document
 
+# rows serialised per slice; bounds the temporary per‑column string lists
+SERIALIZE_CHUNK_ROWS = 10_000
+
+_dumps = partial(json.dumps, ensure_ascii=False)
+_NON_FINITE = {"nan": "NaN", "inf": "Infinity", "-inf": "-Infinity"}
+
+
+def column_values(df: pd.DataFrame, box: bool = True) -> list[list]:
+    """Per‑column Python values exactly as ``df.iterrows()`` yields them.
+
+    iterrows() goes through ``df.values``, so a frame of only int/float
+    columns is upcast to float and any other mix becomes object.  We
+    reproduce that common dtype column by column instead of row by row.
+    *box* applies the extra NA -> None boxing of ``row.to_dict()``.
+    """
+    dtypes = list(df.dtypes)
+    if dtypes and all(isinstance(dt, np.dtype) for dt in dtypes):
+        if len(set(dtypes)) == 1:
+            common = dtypes[0]
+        elif {dt.kind for dt in dtypes} <= set("iuf"):
+            common = np.result_type(*dtypes)
+        else:
+            common = np.dtype(object)
+        if common.kind in "Mm":
+            common = np.dtype(object)   # keep Timestamp / Timedelta boxes
+        return [df.iloc[:, j].to_numpy(dtype=common).tolist()
+                for j in range(df.shape[1])]
+    # extension dtypes (Int64, category, …): box like Series.to_dict()
+    values = df.to_numpy()
+    cols = [values[:, j].tolist() for j in range(values.shape[1])]
+    return [list(map(maybe_box_native, c)) for c in cols] if box else cols
+
+
+def _json_fragments(values: list) -> list[str]:
+    """``json.dumps`` of every value, with direct paths for plain columns."""
+    kinds = set(map(type, values))
+    if kinds == {str}:
+        return list(map(encode_basestring, values))
+    if kinds == {int}:
+        return list(map(int.__repr__, values))
+    if kinds == {float}:
+        return [_NON_FINITE.get(r, r) for r in map(float.__repr__, values)]
+    if kinds == {bool}:
+        return ["true" if v else "false" for v in values]
+    return list(map(_dumps, values))
+
+
+def _row_json(df: pd.DataFrame) -> list[str]:
+    """``json.dumps(row.to_dict())`` for every row, built column‑wise."""
+    cols = column_values(df)
+    if not df.columns.is_unique:
+        # to_dict() keeps the first key position and the last value
+        keys = list(df.columns)
+        return [_dumps(dict(zip(keys, row))) for row in zip(*cols)]
+    if not cols:
+        return ["{}"] * len(df)
+    # '"col": ' exactly as json.dumps renders the key
+    keys = [_dumps({c: None})[1:-len("null}")] for c in df.columns]
+    template = "{" + ", ".join(k.replace("%", "%%") + "%s" for k in keys) + "}"
+    return [template % row for row in zip(*map(_json_fragments, cols))]
+
+
+def _row_docs(df: pd.DataFrame,
+              source: str,
+              sheet_name: str | None,
+              level: str,
+              dtypes_json: str,
+              base_meta: dict,
+              chunk_rows: int = SERIALIZE_CHUNK_ROWS) -> Iterator[Document]:
+    # one metadata template; only row_id differs per row
+    template = {
+        **base_meta,
+        "source": source,
+        "sheet_name": sheet_name,
+        "row_id": None,
+        # 2️⃣ convert list -> comma‑sep string
+        "columns": ",".join(df.columns),
+        "dtypes": dtypes_json,
+        "level": level,
+    }
+    for start in range(0, len(df), chunk_rows):
+        part = df.iloc[start: start + chunk_rows]
+        for idx, text in zip(part.index.tolist(), _row_json(part)):
+            meta = template.copy()
+            meta["row_id"] = int(idx)
+            yield Document(page_content=text, metadata=meta)
+
+
+def iter_table_docs(frames: Iterable[pd.DataFrame],
+                    source: str,
+                    sheet_name: str | None = None,
+                    level: str = "row",
+                    **base_meta) -> Iterator[Document]:
+    """Streaming form of :func:`dataframe_to_docs` over row chunks.
+
+    Row docs are yielded chunk by chunk (row ids follow each chunk's
+    index) and the sheet summary comes last.  Column dtypes are taken
+    from the first chunk.
+    """
+    n_rows, columns, dtypes_json = 0, [], None
+    for df in frames:
+        df = df.copy()
+        df.columns = [c.strip() for c in df.columns]
+        if dtypes_json is None:
+            columns = list(df.columns)
+            # 1️⃣ stringify the dtypes dict
+            dtypes_json = json.dumps({c: str(dt) for c, dt in df.dtypes.items()})
+        yield from _row_docs(df, source, sheet_name, level, dtypes_json, base_meta)
+        n_rows += len(df)
+
+    summary = f"Sheet {sheet_name or 'data'} – {n_rows} rows. Columns: {', '.join(columns)}."
+    yield Document(
+        page_content=summary,
+        metadata={
+            **base_meta,
+            "source": source,
+            "sheet_name": sheet_name,
+            "level": "section",
+        },
+    )
+
+
 def dataframe_to_docs(df: pd.DataFrame,
                       source: str,
                       sheet_name: str | None = None,
@@ -9,40 +136,5 @@ def dataframe_to_docs(df: pd.DataFrame,
                       **base_meta):
     """Return one document per row + a sheet summary, using ONLY
     primitive metadata values so Chroma is happy."""
-    df = df.copy()
-    df.columns = [c.strip() for c in df.columns]
-
-    # 1️⃣ stringify the dtypes dict
-    dtypes_json = json.dumps({c: str(dt) for c, dt in df.dtypes.items()})   # 👈
-
-    docs: list[Document] = []
-    for idx, row in df.iterrows():
-        docs.append(
-            Document(
-                page_content=json.dumps(row.to_dict(), ensure_ascii=False),
-                metadata={
-                    **base_meta,
-                    "source": source,
-                    "sheet_name": sheet_name,
-                    "row_id": int(idx),
-                    # 2️⃣ convert list -> comma‑sep string
-                    "columns": ",".join(df.columns),                       
-                    "dtypes": dtypes_json,                                 
-                    "level": level,
-                },
-            )
-        )
-
-    summary = f"Sheet {sheet_name or 'data'} – {len(df)} rows. Columns: {', '.join(df.columns)}."
-    docs.append(
-        Document(
-            page_content=summary,
-            metadata={
-                **base_meta,
-                "source": source,
-                "sheet_name": sheet_name,
-                "level": "section",
-            },
-        )
-    )
-    return docs
+    return list(iter_table_docs([df], source, sheet_name=sheet_name,
+                                level=level, **base_meta))
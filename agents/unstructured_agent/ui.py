@@ -1,13 +1,10 @@
 # agents/unstructured_agent/ui.py
-import io
 import streamlit as st
-import pandas as pd
-from langchain.docstore.document import Document
 
 from config.settings import PERSIST_DIRECTORY
-from .document_loaders import (
-    load_pdf, load_docx, load_excel, load_csv, text_splitter
-)
+from utils.table_cache import open_tables
+from .ingest import ingest_files
+from .manifest import get_manifest, file_digest
 from .vector_store import (
     get_vector_store,
     delete_file_vectors,
@@ -21,6 +18,13 @@ def run_ui(sheet_filter, temperature, top_k_vector, top_k_rerank):
     """📁 Upload & Manage Documents + 💬 Chat UI"""
     st.subheader("📁 Upload & Manage Documents")
     vector_store = get_vector_store()
+    manifest = get_manifest()
+    if not st.session_state.uploaded_files:
+        # files ingested in earlier sessions are still in the store
+        st.session_state.uploaded_files = [
+            {"name": name, "hash": manifest.file_hash(name)}
+            for name in manifest.sources()
+        ]
     st.write(f"**Total documents in the vector store:** {get_document_count()}")
 
     uploaded = st.file_uploader(
@@ -30,41 +34,36 @@ def run_ui(sheet_filter, temperature, top_k_vector, top_k_rerank):
     )
     if uploaded:
         with st.spinner("Processing uploaded files..."):
-            for file in uploaded:
-                # avoid duplicates
-                names = [f["name"] for f in st.session_state.uploaded_files]
-                if file.name in names:
-                    continue
+            # avoid duplicates: same name *and* same bytes
+            known = {(f["name"], f.get("hash")) for f in st.session_state.uploaded_files}
+            hashes = {f.name: file_digest(f) for f in uploaded}
+            new_files = [f for f in uploaded if (f.name, hashes[f.name]) not in known]
+
+            # per-file progress; parsing runs on all cores, one writer
+            bars = {f.name: st.progress(0.0, text=f"{f.name}: queued")
+                    for f in new_files}
+
+            def report(filename, n_chunks, done):
+                bars[filename].progress(
+                    1.0 if done else 0.5,
+                    text=f"{filename}: {n_chunks} chunks{' ✓' if done else '…'}",
+                )
+
+            ingest_files([(f.name, f) for f in new_files], vector_store,
+                         progress=report)
 
+            for file in new_files:
                 ext = file.name.rsplit(".", 1)[-1].lower()
-                docs = []
-                if ext == "pdf":
-                    docs = load_pdf(file, file.name)
-                elif ext == "docx":
-                    docs = load_docx(file, file.name)
-                elif ext == "xlsx":
-                    docs = load_excel(file, file.name)
-                elif ext == "csv":
-                    docs = load_csv(file, file.name)
-                else:
-                    text = file.read().decode("utf-8", errors="ignore")
-                    docs = [Document(page_content=text, metadata={"source": file.name})]
-
-                # cache any raw DataFrames
+
+                st.session_state.raw_files[file.name] = file.getvalue()
+                # cache the DataFrames on disk, reusing ingestion's parse
                 if ext in ("xlsx", "csv"):
-                    buf = io.BytesIO(file.getvalue())
-                    if ext == "xlsx":
-                        st.session_state.tables[file.name] = (
-                            pd.read_excel(buf, sheet_name=None)
-                        )
-                    else:
-                        st.session_state.tables[file.name] = pd.read_csv(buf)
-
-                chunks = text_splitter.split_documents(docs)
-                vector_store.add_documents(chunks, batch_size=128)
-                vector_store.persist()
-
-                st.session_state.uploaded_files.append({"name": file.name})
+                    st.session_state.tables[file.name] = open_tables(file, file.name)
+
+                st.session_state.uploaded_files = [
+                    e for e in st.session_state.uploaded_files
+                    if e["name"] != file.name
+                ] + [{"name": file.name, "hash": hashes[file.name]}]
 
             st.success("✅ Documents added to vector DB.")
             st.write(f"**New total:** {get_document_count()}")
@@ -1,54 +1,346 @@
 # vector_store.py
-import os
+import heapq, os, threading, uuid
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+import chromadb
 from chromadb.config import Settings                # ← NEW
 from langchain_community.embeddings import OpenAIEmbeddings
 from langchain_community.vectorstores import Chroma
-from config.settings import PERSIST_DIRECTORY, COLLECTION_NAME
+from langchain.docstore.document import Document
+from config.settings import (
+    PERSIST_DIRECTORY, COLLECTION_NAME,
+    HNSW_M, HNSW_CONSTRUCTION_EF, HNSW_SEARCH_EF,
+    VECTOR_SHARDING, VECTOR_SHARD_FANOUT_WORKERS,
+)
+from agents.unstructured_agent.keyword_index import get_keyword_index
+from agents.unstructured_agent.embedding_cache import CachedEmbeddings
+from agents.unstructured_agent.manifest import get_manifest
+from agents.unstructured_agent.filters import to_chroma_where
+from agents.unstructured_agent.shards import shard_name, route
+
+# ------------------------------------------------------------------
+# Process‑wide store registry
+# ------------------------------------------------------------------
+# One chromadb client per persist dir and one Chroma wrapper per
+# (persist dir, collection), shared by the FastAPI app and every
+# Streamlit rerun in the same process.
+_CLIENTS: dict[str, "chromadb.ClientAPI"] = {}
+_STORES: dict[tuple[str, str], Chroma] = {}
+_EMBEDDINGS: CachedEmbeddings | None = None
+_REGISTRY_LOCK = threading.Lock()
+
+
+def _get_client(persist_directory: str):
+    client = _CLIENTS.get(persist_directory)
+    if client is None:
+        client = chromadb.PersistentClient(
+            path=persist_directory,
+            settings=Settings(anonymized_telemetry=False),  # ← FIX
+        )
+        _CLIENTS[persist_directory] = client
+    return client
+
+
+def get_embeddings() -> CachedEmbeddings:
+    """OpenAI embeddings behind the on‑disk content‑addressed cache."""
+    global _EMBEDDINGS
+    if _EMBEDDINGS is None:
+        with _REGISTRY_LOCK:
+            if _EMBEDDINGS is None:
+                _EMBEDDINGS = CachedEmbeddings(OpenAIEmbeddings())
+    return _EMBEDDINGS
+
+
+def hnsw_metadata(m: int = HNSW_M,
+                  ef_construction: int = HNSW_CONSTRUCTION_EF,
+                  ef_search: int = HNSW_SEARCH_EF) -> dict:
+    """Collection metadata understood by Chroma's HNSW segment."""
+    return {"hnsw:M": m, "hnsw:construction_ef": ef_construction,
+            "hnsw:search_ef": ef_search}
+
+
+def _apply_search_ef(collection, ef_search: int):
+    # M and ef_construction are baked into an existing index; ef_search isn't
+    try:
+        current = (collection.configuration_json or {}).get("hnsw", {}).get("ef_search")
+        if current is not None and current != ef_search:
+            collection.modify(configuration={"hnsw": {"ef_search": ef_search}})
+    except Exception:
+        pass   # older chromadb: only the creation‑time metadata applies
 
 
-def get_vector_store():
+def get_vector_store(persist_directory: str | Path = PERSIST_DIRECTORY,
+                     collection_name: str = COLLECTION_NAME,
+                     hnsw: dict | None = None) -> Chroma:
     """
-    Return a Chroma vector‑store in classic single‑tenant mode.
-    The explicit Settings() silences the “default_tenant” error introduced in
-    chromadb v0.4.22+.
+    Return the shared Chroma vector‑store for (persist dir, collection),
+    opening it on first use.  The explicit Settings() silences the
+    “default_tenant” error introduced in chromadb v0.4.22+.
+
+    *hnsw* overrides the ``HNSW_*`` settings for this collection
+    (keys of :func:`hnsw_metadata`); it only matters on first open.
     """
-    return Chroma(
-        embedding_function=OpenAIEmbeddings(),
-        persist_directory=PERSIST_DIRECTORY,
-        collection_name=COLLECTION_NAME,
-        client_settings=Settings(anonymized_telemetry=False),  # ← FIX
-    )
+    key = (str(Path(persist_directory).resolve()), collection_name)
+    store = _STORES.get(key)
+    if store is not None:
+        return store
+    embeddings = get_embeddings()
+    with _REGISTRY_LOCK:
+        store = _STORES.get(key)
+        if store is None:
+            params = hnsw_metadata(**(hnsw or {}))
+            store = Chroma(
+                client=_get_client(key[0]),
+                collection_name=collection_name,
+                embedding_function=embeddings,
+                persist_directory=key[0],
+                collection_metadata=params,
+            )
+            _apply_search_ef(store._collection, params["hnsw:search_ef"])
+            _STORES[key] = store
+    return store
+
+
+def close_vector_store(persist_directory: str | Path = PERSIST_DIRECTORY,
+                       collection_name: str = COLLECTION_NAME):
+    """Forget one collection wrapper; the next call re‑opens it."""
+    key = (str(Path(persist_directory).resolve()), collection_name)
+    with _REGISTRY_LOCK:
+        _STORES.pop(key, None)
+
+
+def close_vector_stores():
+    """Drop every cached store and stop the underlying chromadb clients."""
+    with _REGISTRY_LOCK:
+        _STORES.clear()
+        for client in _CLIENTS.values():
+            try:
+                client._system.stop()
+            except Exception:
+                pass
+        _CLIENTS.clear()
+        chromadb.api.client.SharedSystemClient.clear_system_cache()
+
+
+# ------------------------------------------------------------------
+# Shards (VECTOR_SHARDING, see shards.py)
+# ------------------------------------------------------------------
+_FANOUT = ThreadPoolExecutor(max_workers=VECTOR_SHARD_FANOUT_WORKERS,
+                             thread_name_prefix="shard")
+
+
+def shard_stores(vs=None, filters: dict | None = None) -> list[Chroma]:
+    """Collections a read through *vs* has to touch: *vs* itself when
+    sharding is off, otherwise the shards *filters* route to (plus the
+    base collection while it still holds pre‑sharding chunks)."""
+    vs = get_vector_store() if vs is None else vs
+    if VECTOR_SHARDING == "none":
+        return [vs]
+    base = vs._collection.name
+    existing = [getattr(c, "name", c) for c in vs._client.list_collections()]
+    stores = [vs if name == base else get_vector_store(vs._persist_directory, name)
+              for name in route(filters, existing, base=base)]
+    return [s for s in stores if s is not vs or vs._collection.count()]
+
+
+def _fan_out(fn, stores: list) -> list:
+    """``[fn(store) for store in stores]``, concurrently when there are several."""
+    if len(stores) <= 1:
+        return [fn(s) for s in stores]
+    return list(_FANOUT.map(fn, stores))
+
+
+def _get_by_ids(vs, ids: list[str], include: list[str],
+                filters: dict | None = None) -> dict:
+    """``collection.get`` across every shard, results concatenated."""
+    where = to_chroma_where(filters)
+    out = {"ids": [], **{f: [] for f in include}}
+    for part in _fan_out(lambda s: s._collection.get(ids=ids, where=where, include=include),
+                         shard_stores(vs, filters)):
+        out["ids"].extend(part["ids"])
+        for f in include:
+            out[f].extend(part[f])
+    return out
+
+
+def _iter_pages(include: list[str], page_size: int):
+    """Every chunk of every shard, *page_size* at a time."""
+    for store in shard_stores():
+        offset = 0
+        while True:
+            page = store._collection.get(include=include, limit=page_size, offset=offset)
+            if not len(page["ids"]):
+                break
+            yield page
+            offset += len(page["ids"])
 
 
 # ------------------------------------------------------------------
 # Convenience wrappers
 # ------------------------------------------------------------------
-def filtered_search(query: str, k: int, where: dict | None = None):
-    """Similarity search with optional metadata filter."""
-    vs = get_vector_store()
-    return vs.similarity_search(query, k=k, filter=where or {})
+def index_chunks(chunks: list[Document],
+                 vector_store=None,
+                 embeddings: list[list[float]] | None = None,
+                 ids: list[str] | None = None) -> list[str]:
+    """Embed + upsert *chunks* and mirror them into the keyword index.
+
+    Pass *embeddings* when the vectors were computed upstream (see
+    ``ingest.ingest_file``) to skip the embedding call here, and *ids*
+    to use stable (content‑hash) ids instead of random ones.
+    """
+    if not chunks:
+        return []
+    vs = get_vector_store() if vector_store is None else vector_store
+    texts = [c.page_content for c in chunks]
+    if embeddings is None:
+        embeddings = vs.embeddings.embed_documents(texts)
+    ids = ids or [str(uuid.uuid4()) for _ in chunks]
+    # Chroma rejects None values (e.g. sheet_name for CSV rows)
+    metadatas = [{k: v for k, v in c.metadata.items() if v is not None} for c in chunks]
+    by_shard: dict[str, list[int]] = {}
+    for i, meta in enumerate(metadatas):
+        by_shard.setdefault(shard_name(meta, base=vs._collection.name), []).append(i)
+    for name, rows in by_shard.items():
+        store = vs if name == vs._collection.name else \
+            get_vector_store(vs._persist_directory, name)
+        store._collection.upsert(
+            ids=[ids[i] for i in rows],
+            embeddings=[embeddings[i] for i in rows],
+            documents=[texts[i] for i in rows],
+            metadatas=[metadatas[i] for i in rows],
+        )
+    get_keyword_index().add(ids, chunks)
+    return ids
+
+
+def vector_search_with_scores(query: str, k: int, filters: dict | None = None,
+                              vector_store=None) -> list[tuple[Document, float]]:
+    """Nearest chunks with their ids set and a "higher is better" score
+    (negated distance), ready for fusion with keyword hits.  *filters*
+    are compiled into the Chroma ``where`` clause.  With sharding on,
+    the query is embedded once and sent to every routed shard
+    concurrently; the per‑shard top *k* lists are merged."""
+    vs = get_vector_store() if vector_store is None else vector_store
+    qvec = vs.embeddings.embed_query(query)
+    where = to_chroma_where(filters)
+
+    def _query(store):
+        res = store._collection.query(
+            query_embeddings=[qvec],
+            n_results=k,
+            where=where,
+            include=["documents", "metadatas", "distances"],
+        )
+        return [
+            (Document(id=i, page_content=txt, metadata=meta or {}), -dist)
+            for i, txt, meta, dist in zip(res["ids"][0], res["documents"][0],
+                                          res["metadatas"][0], res["distances"][0])
+        ]
+
+    per_shard = _fan_out(_query, shard_stores(vs, filters))
+    if len(per_shard) == 1:
+        return per_shard[0]
+    return heapq.nlargest(k, (hit for hits in per_shard for hit in hits),
+                          key=lambda hit: hit[1])
+
+
+def keyword_search_with_scores(query: str, k: int, vector_store=None,
+                               filters: dict | None = None) -> list[tuple[Document, float]]:
+    """BM25 over the whole corpus (or the *filters* partition); chunk
+    bodies are fetched from Chroma."""
+    hits = get_keyword_index().search(query, k=k, filters=filters)
+    if not hits:
+        return []
+    # an id indexed twice (crashed or concurrent ingest) is scored once,
+    # and chromadb rejects duplicate ids in get()
+    seen: set[str] = set()
+    hits = [(i, s) for i, s in hits if not (i in seen or seen.add(i))]
+    vs = get_vector_store() if vector_store is None else vector_store
+    data = _get_by_ids(vs, [doc_id for doc_id, _ in hits],
+                       ["documents", "metadatas"], filters)
+    by_id = {
+        i: Document(id=i, page_content=txt, metadata=meta or {})
+        for i, txt, meta in zip(data["ids"], data["documents"], data["metadatas"])
+    }
+    return [(by_id[doc_id], score) for doc_id, score in hits if doc_id in by_id]
+
+
+def keyword_search(query: str, k: int, vector_store=None,
+                   filters: dict | None = None) -> list[Document]:
+    return [doc for doc, _ in keyword_search_with_scores(query, k, vector_store, filters)]
+
+
+def rebuild_keyword_index(page_size: int = 5000):
+    """Re‑create the keyword index from whatever is already in Chroma."""
+    index = get_keyword_index()
+    index.clear()
+    for page in _iter_pages(["documents", "metadatas"], page_size):
+        index.add(page["ids"], [
+            Document(page_content=txt or "", metadata=meta or {})
+            for txt, meta in zip(page["documents"], page["metadatas"])
+        ])
+    index.compact()
+
+
+def filtered_search(query: str, k: int, filters: dict | None = None):
+    """Similarity search restricted to *filters* (see ``filters.py``)."""
+    return [doc for doc, _ in vector_search_with_scores(query, k, filters)]
 
 
 def get_document_count():
     try:
-        return get_vector_store()._collection.count()
+        return sum(s._collection.count() for s in shard_stores())
     except Exception:
         return 0
 
 
 def get_document_and_chunk_count():
-    try:
-        data = get_vector_store()._collection.get()
-        total_chunks = len(data["documents"])
-        total_docs = len(
-            {m.get("source") for m in data["metadatas"] if "source" in m}
-        )
-        return total_docs, total_chunks
-    except Exception:
-        return 0, 0
+    """(distinct sources, chunks) from the maintained catalog."""
+    stats = get_catalog_stats(per_source=False)
+    return stats["documents"], stats["chunks"]
+
+
+def get_catalog_stats(per_source: bool = True) -> dict:
+    """Corpus totals (plus per‑source rows) without touching Chroma,
+    except for a one‑off backfill of stores that predate the catalog."""
+    manifest = get_manifest()
+    stats = manifest.stats()
+    if not stats["documents"] and get_document_count():
+        backfill_catalog()
+        stats = manifest.stats()
+    if per_source:
+        stats["sources"] = manifest.catalog()
+    return stats
+
+
+def backfill_catalog(page_size: int = 5000):
+    """Register chunks that were ingested before the manifest tracked them."""
+    manifest = get_manifest()
+    for page in _iter_pages(["documents", "metadatas"], page_size):
+        by_source: dict[str, tuple[list, list]] = {}
+        for i, txt, meta in zip(page["ids"], page["documents"], page["metadatas"]):
+            meta = meta or {}
+            ids, docs = by_source.setdefault(meta.get("source", ""), ([], []))
+            ids.append(i)
+            docs.append(Document(page_content=txt or "", metadata=meta))
+        for source, (ids, docs) in by_source.items():
+            manifest.add_chunks(source, ids, docs)
+
+
+def delete_chunks(ids: list[str], vector_store=None):
+    """Remove individual chunks from Chroma and the keyword index."""
+    if not ids:
+        return
+    vs = get_vector_store() if vector_store is None else vector_store
+    _fan_out(lambda s: s._collection.delete(ids=ids), shard_stores(vs))
+    get_keyword_index().delete_ids(ids)
 
 
-def delete_file_vectors(filename):
-    vs = get_vector_store()
-    vs.delete(where={"source": filename})
-    vs.persist()
+def delete_file_vectors(filename, vector_store=None):
+    """Drop every trace of *filename*: vectors in all shards, keyword
+    postings and its manifest entry."""
+    vs = get_vector_store() if vector_store is None else vector_store
+    _fan_out(lambda s: s._collection.delete(where={"source": filename}),
+             shard_stores(vs, {"source": filename}))
+    get_keyword_index().delete_source(filename)
+    get_manifest().remove_file(filename)
@@ -1,12 +1,12 @@
 # agent/unstructured_agent/viewer.py
-import base64, streamlit as st, pandas as pd
+import base64, streamlit as st
 from io import BytesIO
 
-def _show_csv_or_excel(bytes_obj, ext, sample=500):
-    if ext == "xlsx":
-        df = pd.read_excel(BytesIO(bytes_obj), nrows=sample)
-    else:
-        df = pd.read_csv(BytesIO(bytes_obj), nrows=sample)
+from utils.table_cache import open_tables
+
+def _show_csv_or_excel(bytes_obj, filename, sample=500):
+    # first sheet, sliced from the memory-mapped table cache
+    df = open_tables(bytes_obj, filename).read(stop=sample)
     st.markdown(f"Showing first {len(df)} rows (max {sample})")
     st.dataframe(df)
 
@@ -31,7 +31,7 @@ def view_document(filename, raw_files):
         st.text_area("DOCX preview (plain text):", text, height=500)
 
     elif ext in ("xlsx", "csv"):
-        _show_csv_or_excel(data, ext)
+        _show_csv_or_excel(data, filename)
 
     else:
         st.info("Unsupported preview type.")
@@ -1,100 +1,295 @@
-from fastapi import FastAPI, UploadFile, File, Form
-from fastapi.responses import JSONResponse
+import asyncio, json, threading
+from concurrent.futures import ThreadPoolExecutor
+from fastapi import FastAPI, UploadFile, File, Form, HTTPException
+from fastapi.responses import JSONResponse, StreamingResponse
 from typing import List
-from io import BytesIO
-from langchain.docstore.document import Document
-import pandas as pd
 
-from agents.unstructured_agent.document_loaders import (
-    load_pdf, load_docx, load_excel, load_csv, text_splitter
+from config.settings import (
+    API_THREAD_POOL_SIZE, API_MAX_CONCURRENT_CHATS,
+    API_MAX_CONCURRENT_SQL, API_MAX_CONCURRENT_PANDAS, API_MAX_CONCURRENT_SQL_STREAMS,
+    VERIFY_MODE,
+    SQL_PAGE_ROWS, SQL_STREAM_MAX_ROWS,
 )
-from agents.unstructured_agent.vector_store import get_vector_store
-from agents.unstructured_agent.agent import HybridQAChain
+
+from agents.unstructured_agent.ingest import ingest_files, shutdown_ingest_pool
+from agents.unstructured_agent.vector_store import (
+    get_vector_store, get_embeddings, close_vector_stores, get_catalog_stats,
+)
+from agents.unstructured_agent.answer_cache import get_answer_cache
+from agents.unstructured_agent.agent import HybridQAChain, reranker
 from agents.database_agent.agent import build_sql_agent_with_memory
+from agents.database_agent.result_cache import get_sql_result_cache
+from agents.database_agent.engines import get_engine
+from agents.database_agent.read_only_sql_tool import _check_read_only
+from agents.database_agent.streaming import (
+    fetch_page, stream_rows, ndjson_lines, arrow_chunks,
+)
 from agents.pandas_agent.agent import build_pandas_agent_with_memory
+from utils.table_cache import open_tables
 
 app = FastAPI(title="Analytiq API")
 
 # In-memory state (very basic) -----------------------------------------
 vector_store = get_vector_store()
 sql_agent = None
+sql_conn_str = None
 pandas_agent = None
 
+# Blocking work (agents without an async path, ingestion, Chroma) runs on
+# one bounded pool; each backend also gets its own admission limit so a
+# burst of SQL questions can't starve document chat.
+_executor = ThreadPoolExecutor(API_THREAD_POOL_SIZE, thread_name_prefix="api")
+_limits = {
+    "chat": asyncio.Semaphore(API_MAX_CONCURRENT_CHATS),
+    "sql": asyncio.Semaphore(API_MAX_CONCURRENT_SQL),
+    "pandas": asyncio.Semaphore(API_MAX_CONCURRENT_PANDAS),
+    "sql_stream": asyncio.Semaphore(API_MAX_CONCURRENT_SQL_STREAMS),
+}
+
+
+async def _offload(backend: str, fn, *args):
+    async with _limits[backend]:
+        return await asyncio.get_running_loop().run_in_executor(_executor, fn, *args)
+
+
+@app.on_event("startup")
+async def _use_bounded_executor():
+    # asyncio.to_thread / LangChain's run_in_executor use the default executor
+    asyncio.get_running_loop().set_default_executor(_executor)
+
+
+@app.on_event("shutdown")
+def _close_stores():
+    shutdown_ingest_pool()
+    close_vector_stores()
+    _executor.shutdown(wait=False, cancel_futures=True)
+
 # ----------------------------------------------------------------------
 @app.post("/docs/upload")
 async def upload_docs(files: List[UploadFile] = File(...)):
-    """Upload documents into the vector store."""
-    for file in files:
-        data = await file.read()
-        buf = BytesIO(data)
-        ext = file.filename.rsplit(".", 1)[-1].lower()
-        if ext == "pdf":
-            docs = load_pdf(buf, file.filename)
-        elif ext == "docx":
-            docs = load_docx(buf, file.filename)
-        elif ext == "xlsx":
-            docs = load_excel(buf, file.filename)
-        elif ext == "csv":
-            docs = load_csv(buf, file.filename)
-        else:
-            text = data.decode("utf-8", errors="ignore")
-            docs = [Document(page_content=text, metadata={"source": file.filename})]
-        chunks = text_splitter.split_documents(docs)
-        vector_store.add_documents(chunks, batch_size=128)
-    vector_store.persist()
+    """Upload documents into the vector store.
+
+    Starlette already spools each upload to a temp file past 1 MB, so the
+    pipeline reads ``file.file`` directly instead of buffering it here;
+    files are parsed in parallel and written by a single writer.
+    """
+    await asyncio.get_running_loop().run_in_executor(
+        _executor, ingest_files, [(f.filename, f.file) for f in files], vector_store)
     return {"status": "ok", "files": [f.filename for f in files]}
 
 
+@app.get("/docs/stats")
+async def docs_stats(per_source: bool = True):
+    """Document/chunk/byte totals and per‑file catalog rows (chunks,
+    bytes, ingest time, sheets), read from the ingest manifest."""
+    # an empty catalog backfills by paging through Chroma: keep it off the loop
+    return await asyncio.get_running_loop().run_in_executor(
+        _executor, lambda: get_catalog_stats(per_source=per_source))
+
+
+def _chat_chain(temperature, top_k_vector, top_k_rerank, sheet_filter, verify_mode,
+                filters):
+    """*filters* is a JSON object over source / sheet_name / department /
+    year / level, e.g. ``{"department": "Finance", "year": ["2023", "2024"]}``."""
+    try:
+        return HybridQAChain(
+            temperature=temperature,
+            top_k_vector=top_k_vector,
+            top_k_rerank=top_k_rerank,
+            sheet_filter=sheet_filter or None,
+            verify_mode=verify_mode or VERIFY_MODE,
+            filters=json.loads(filters) if filters else None,
+        )
+    except ValueError as e:   # bad JSON, unknown filter field or mode
+        raise HTTPException(status_code=400, detail=str(e))
+
+
+def _chat_payload(result: dict) -> dict:
+    sources = [d.metadata.get("source", "") for d in result.get("source_documents", [])]
+    return {"answer": result.get("answer"), "verified": result.get("verified"),
+            "sources": sources, "timings": result.get("timings", {})}
+
+
 @app.post("/docs/chat")
 async def chat_docs(question: str = Form(...),
                     temperature: float = Form(0.0),
                     top_k_vector: int = Form(10),
                     top_k_rerank: int = Form(3),
-                    sheet_filter: str | None = Form(None)):
-    chain = HybridQAChain(
-        temperature=temperature,
-        top_k_vector=top_k_vector,
-        top_k_rerank=top_k_rerank,
-        sheet_filter=sheet_filter or None,
-    )
-    result = chain.run(question)
-    sources = [d.metadata.get("source", "") for d in result.get("source_documents", [])]
-    return {"answer": result.get("answer"), "sources": sources}
+                    sheet_filter: str | None = Form(None),
+                    verify_mode: str | None = Form(None),
+                    filters: str | None = Form(None)):
+    chain = _chat_chain(temperature, top_k_vector, top_k_rerank, sheet_filter,
+                        verify_mode, filters)
+    async with _limits["chat"]:
+        result = await chain.arun(question)
+    return _chat_payload(result)
+
+
+@app.post("/docs/chat/stream")
+async def chat_docs_stream(question: str = Form(...),
+                           temperature: float = Form(0.0),
+                           top_k_vector: int = Form(10),
+                           top_k_rerank: int = Form(3),
+                           sheet_filter: str | None = Form(None),
+                           verify_mode: str | None = Form(None),
+                           filters: str | None = Form(None)):
+    """NDJSON: ``{"type": "token", "text": …}`` lines while the draft is
+    generated, then one ``{"type": "final", …}`` line carrying the
+    verified answer, sources and per‑stage timings."""
+    chain = _chat_chain(temperature, top_k_vector, top_k_rerank, sheet_filter,
+                        verify_mode, filters)
+
+    async def events():
+        async with _limits["chat"]:
+            async for event in chain.astream(question):
+                if event["type"] == "final":
+                    event = {"type": "final", **_chat_payload(event["result"])}
+                yield json.dumps(event, ensure_ascii=False) + "\n"
+
+    return StreamingResponse(events(), media_type="application/x-ndjson")
+
+
+@app.get("/metrics")
+async def metrics():
+    """Hit rates of the answer, embedding and rerank caches."""
+    return {
+        "answer_cache": get_answer_cache().stats(),
+        "embedding_cache": get_embeddings().stats(),
+        "rerank": reranker.stats(),
+        "sql_result_cache": get_sql_result_cache().stats(),
+    }
 
 
 @app.post("/sql/connect")
 async def connect_db(conn_str: str = Form(...), temperature: float = Form(0.0)):
-    global sql_agent
-    sql_agent = build_sql_agent_with_memory(conn_str, temperature=temperature)
+    global sql_agent, sql_conn_str
+    # reflects / snapshots the schema on first connect: keep it off the loop
+    sql_agent = await _offload("sql", build_sql_agent_with_memory, conn_str, temperature)
+    sql_conn_str = conn_str
     return {"status": "connected"}
 
 
+@app.post("/sql/cache/invalidate")
+async def invalidate_sql_cache(tables: str = Form("")):
+    """Drop cached query results after the data changed; *tables* is a
+    comma‑separated list (empty = every cached result)."""
+    names = [t.strip() for t in tables.split(",") if t.strip()] or None
+    return {"invalidated": get_sql_result_cache().invalidate(tables=names)}
+
+
 @app.post("/sql/query")
 async def run_sql(query: str = Form(...)):
     if sql_agent is None:
         return JSONResponse({"error": "Connect first."}, status_code=400)
     try:
-        res = sql_agent.run(query)
+        res = await _offload("sql", sql_agent.run, query)
         return {"result": str(res)}
     except Exception as e:
         return JSONResponse({"error": str(e)}, status_code=500)
 
 
+class _ClosingStreamingResponse(StreamingResponse):
+    """Awaits *cleanup* once the response is over, however it ended – also
+    when the client went away before the body was iterated."""
+
+    def __init__(self, content, cleanup, **kwargs):
+        super().__init__(content, **kwargs)
+        self._cleanup = cleanup
+
+    async def __call__(self, scope, receive, send):
+        try:
+            await super().__call__(scope, receive, send)
+        finally:
+            await self._cleanup()
+
+
+def _raw_sql_engine(query: str):
+    if sql_conn_str is None:
+        raise HTTPException(status_code=400, detail="Connect first.")
+    try:
+        _check_read_only(query)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return get_engine(sql_conn_str)
+
+
+@app.post("/sql/execute")
+async def execute_sql(query: str = Form(...),
+                      page_token: str | None = Form(None),
+                      page_rows: int = Form(SQL_PAGE_ROWS)):
+    """Run a read‑only statement directly (no agent) and return one page:
+    ``{"columns", "rows", "next_page_token"}``.  Send the same query with
+    ``next_page_token`` for the following page; it is null on the last."""
+    engine = _raw_sql_engine(query)
+    try:
+        return await _offload("sql", lambda: fetch_page(
+            engine, query, page_token, page_rows=max(1, min(page_rows, SQL_STREAM_MAX_ROWS))))
+    except ValueError as e:   # bad / foreign page token
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        return JSONResponse({"error": str(e)}, status_code=500)
+
+
+@app.post("/sql/stream")
+async def stream_sql(query: str = Form(...),
+                     format: str = Form("ndjson"),
+                     max_rows: int = Form(SQL_STREAM_MAX_ROWS)):
+    """Raw result stream, fetched in batches through a server‑side cursor
+    and capped at ``SQL_STREAM_MAX_ROWS``: NDJSON (a ``{"columns": …}``
+    line, then one JSON array per row) or an Arrow IPC stream."""
+    if format not in ("ndjson", "arrow"):
+        raise HTTPException(status_code=400, detail="format must be 'ndjson' or 'arrow'")
+    engine = _raw_sql_engine(query)
+    encode = ndjson_lines if format == "ndjson" else arrow_chunks
+    chunks = encode(stream_rows(engine, query, max(1, min(max_rows, SQL_STREAM_MAX_ROWS))))
+    loop = asyncio.get_running_loop()
+    lock = threading.Lock()   # close() must not run while a fetch is in flight
+
+    def pull():
+        with lock:
+            return next(chunks, None)
+
+    def close():
+        with lock:
+            chunks.close()
+
+    async def fetch():
+        # the permit covers one batch, so a slow reader doesn't hold it
+        async with _limits["sql_stream"]:
+            return await loop.run_in_executor(_executor, pull)
+
+    # the first chunk runs the statement: SQL errors still get a JSON reply
+    try:
+        first = await fetch()
+    except Exception as e:
+        await loop.run_in_executor(_executor, close)
+        return JSONResponse({"error": str(e)}, status_code=500)
+
+    async def body():
+        chunk = first
+        while chunk is not None:
+            yield chunk
+            chunk = await fetch()
+
+    async def cleanup():
+        await loop.run_in_executor(_executor, close)
+
+    media = "application/x-ndjson" if format == "ndjson" else "application/vnd.apache.arrow.stream"
+    return _ClosingStreamingResponse(body(), cleanup, media_type=media)
+
+
 @app.post("/pandas/upload")
 async def upload_tables(files: List[UploadFile] = File(...), temperature: float = Form(0.0)):
+    # parsed once per content hash into the columnar table cache
+    loop = asyncio.get_running_loop()
     dfs = {}
     for file in files:
-        data = await file.read()
-        buf = BytesIO(data)
-        name = file.filename
-        if name.lower().endswith(".csv"):
-            df = pd.read_csv(buf)
-            dfs[name] = {"Sheet1": df}
-        else:
-            sheets = pd.read_excel(buf, sheet_name=None)
-            dfs[name] = sheets
+        dfs[file.filename] = await loop.run_in_executor(
+            _executor, open_tables, file.file, file.filename)
     global pandas_agent
-    pandas_agent = build_pandas_agent_with_memory(dfs, temperature=temperature)
+    # registers every table with DuckDB and profiles it: off the loop too
+    pandas_agent = await loop.run_in_executor(
+        _executor, lambda: build_pandas_agent_with_memory(dfs, temperature=temperature))
     return {"status": "loaded", "files": list(dfs)}
 
 
@@ -103,7 +298,7 @@ async def query_tables(question: str = Form(...)):
     if pandas_agent is None:
         return JSONResponse({"error": "Upload tables first."}, status_code=400)
     try:
-        out = pandas_agent.run(question)
+        out = await _offload("pandas", pandas_agent.run, question)
         return {"result": str(out)}
     except Exception as e:
         return JSONResponse({"error": str(e)}, status_code=500)
@@ -14,6 +14,112 @@ PERSIST_DIRECTORY.mkdir(parents=True, exist_ok=True)
 # 3) collection name
 COLLECTION_NAME = "institutional_docs"
 
+# 3a) HNSW parameters for new collections (M / ef_construction are fixed at
+#     creation; ef_search is applied to existing collections on open)
+HNSW_M = int(os.getenv("HNSW_M", "16"))
+HNSW_CONSTRUCTION_EF = int(os.getenv("HNSW_CONSTRUCTION_EF", "100"))
+HNSW_SEARCH_EF = int(os.getenv("HNSW_SEARCH_EF", "100"))
+
+# 3b) on-disk keyword (BM25) index that mirrors the vector store
+KEYWORD_INDEX_DIRECTORY = PROJECT_ROOT / "data" / "keyword_index"
+KEYWORD_INDEX_DIRECTORY.mkdir(parents=True, exist_ok=True)
+KEYWORD_INDEX_SEGMENT_DOCS = int(os.getenv("KEYWORD_INDEX_SEGMENT_DOCS", "5000"))  # adds buffered per segment
+
+# 3c) local embedding cache (SQLite, float32 blobs, LRU‑evicted)
+EMBEDDING_CACHE_PATH = PROJECT_ROOT / "data" / "embedding_cache.sqlite3"
+EMBEDDING_CACHE_MAX_ENTRIES = int(os.getenv("EMBEDDING_CACHE_MAX_ENTRIES", "500000"))
+
+# 3d) streaming ingestion (parse → split → embed → upsert)
+INGEST_BATCH_SIZE = int(os.getenv("INGEST_BATCH_SIZE", "128"))          # chunks per embed/upsert call
+INGEST_QUEUE_SIZE = int(os.getenv("INGEST_QUEUE_SIZE", "4"))            # batches buffered between stages
+INGEST_TABLE_CHUNK_ROWS = int(os.getenv("INGEST_TABLE_CHUNK_ROWS", "10000"))
+INGEST_STREAM_THRESHOLD_BYTES = int(os.getenv("INGEST_STREAM_THRESHOLD_BYTES", str(25 * 1024 * 1024)))
+INGEST_WORKERS = int(os.getenv("INGEST_WORKERS", str(os.cpu_count() or 1)))  # parser processes
+INGEST_PDF_PAGES_PER_TASK = int(os.getenv("INGEST_PDF_PAGES_PER_TASK", "50"))
+INGEST_MANIFEST_PATH = PROJECT_ROOT / "data" / "ingest_manifest.sqlite3"  # file + chunk hashes
+
+# 3e) answer cache for HybridQAChain.run (in‑process, keyed on corpus version)
+ANSWER_CACHE_MAX_ENTRIES = int(os.getenv("ANSWER_CACHE_MAX_ENTRIES", "1024"))
+ANSWER_CACHE_TTL_SECONDS = float(os.getenv("ANSWER_CACHE_TTL_SECONDS", "3600"))
+# cosine similarity above which a paraphrased question reuses a cached answer; 0 disables.
+# Off by default: ada-002 cosines bunch high, so only enable it with a measured threshold
+# (numbers/years must match exactly either way).
+ANSWER_CACHE_SIMILARITY = float(os.getenv("ANSWER_CACHE_SIMILARITY", "0"))
+
+# 3f) answer verification: "llm" | "local" | "numeric" | "off"
+VERIFY_MODE = os.getenv("VERIFY_MODE", "llm")
+VERIFY_LOCAL_THRESHOLD = float(os.getenv("VERIFY_LOCAL_THRESHOLD", "0.6"))  # min share of supported words
+
+# 3g) rerank: Cohere behind a score cache and circuit breaker, local BM25 fallback
+RERANK_MODEL = os.getenv("RERANK_MODEL", "rerank-3-nimble")
+RERANK_TIMEOUT_SECONDS = float(os.getenv("RERANK_TIMEOUT_SECONDS", "5"))
+RERANK_CACHE_MAX_ENTRIES = int(os.getenv("RERANK_CACHE_MAX_ENTRIES", "100000"))  # (query, passage) scores
+RERANK_BREAKER_FAILURES = int(os.getenv("RERANK_BREAKER_FAILURES", "3"))          # consecutive errors to open
+RERANK_BREAKER_COOLDOWN_SECONDS = float(os.getenv("RERANK_BREAKER_COOLDOWN_SECONDS", "30"))
+
+# 3h) retrieval: vector + keyword hits fused into one candidate pool for the reranker
+RETRIEVAL_FUSION = os.getenv("RETRIEVAL_FUSION", "rrf")                  # "rrf" | "weighted"
+RETRIEVAL_CANDIDATES = int(os.getenv("RETRIEVAL_CANDIDATES", "20"))      # docs handed to the reranker
+RRF_K = int(os.getenv("RRF_K", "60"))
+
+# 3i) API concurrency (async endpoints on a single worker)
+API_THREAD_POOL_SIZE = int(os.getenv("API_THREAD_POOL_SIZE", "32"))      # blocking calls offloaded here
+LLM_MAX_CONCURRENCY = int(os.getenv("LLM_MAX_CONCURRENCY", "16"))        # in‑flight OpenAI calls
+RERANK_MAX_CONCURRENCY = int(os.getenv("RERANK_MAX_CONCURRENCY", "8"))   # in‑flight Cohere rerank calls
+API_MAX_CONCURRENT_CHATS = int(os.getenv("API_MAX_CONCURRENT_CHATS", "64"))
+# the SQL / pandas agents are shared and carry conversation memory, so one at a time each
+API_MAX_CONCURRENT_SQL = int(os.getenv("API_MAX_CONCURRENT_SQL", "1"))
+API_MAX_CONCURRENT_PANDAS = int(os.getenv("API_MAX_CONCURRENT_PANDAS", "1"))
+# raw /sql/stream fetches have their own limit, held per batch rather than per stream
+API_MAX_CONCURRENT_SQL_STREAMS = int(os.getenv("API_MAX_CONCURRENT_SQL_STREAMS", "4"))
+
+# 3j) optional sharding of the vector store into one collection per
+#     department (and year); filtered queries hit one shard, the rest fan out
+VECTOR_SHARDING = os.getenv("VECTOR_SHARDING", "none")       # "none" | "department" | "department_year"
+VECTOR_SHARD_FANOUT_WORKERS = int(os.getenv("VECTOR_SHARD_FANOUT_WORKERS", "8"))
+
+# 3k) columnar cache of uploaded spreadsheets (one Arrow IPC file per sheet,
+#     memory-mapped on read, LRU-evicted past the size cap)
+TABLE_CACHE_DIRECTORY = PROJECT_ROOT / "data" / "table_cache"
+TABLE_CACHE_MAX_MB = int(os.getenv("TABLE_CACHE_MAX_MB", "2048"))
+# column profiles stored with each cached sheet (describe_df / explain_dataframes)
+PROFILE_SAMPLE_ROWS = int(os.getenv("PROFILE_SAMPLE_ROWS", "1000000"))   # distinct / top‑k above this
+PROFILE_TOP_K = int(os.getenv("PROFILE_TOP_K", "5"))
+
+# 3l) pandas agent execution: "pandas" loads every sheet into memory;
+#     "duckdb" (pip install duckdb) answers with SQL over the memory-mapped
+#     table cache, so only the rows/columns a query touches are read
+PANDAS_AGENT_BACKEND = os.getenv("PANDAS_AGENT_BACKEND", "pandas")
+DUCKDB_MEMORY_LIMIT = os.getenv("DUCKDB_MEMORY_LIMIT", "2GB")
+DUCKDB_MAX_RESULT_ROWS = int(os.getenv("DUCKDB_MAX_RESULT_ROWS", "50"))   # rows returned to the LLM
+
+# 3m) result cache for the read-only SQL tool, keyed on (connection, normalised SQL)
+SQL_RESULT_CACHE_MAX_ENTRIES = int(os.getenv("SQL_RESULT_CACHE_MAX_ENTRIES", "4096"))
+SQL_RESULT_CACHE_MAX_BYTES = int(os.getenv("SQL_RESULT_CACHE_MAX_BYTES", str(64 * 2**20)))
+SQL_RESULT_CACHE_TTL_SECONDS = float(os.getenv("SQL_RESULT_CACHE_TTL_SECONDS", "600"))   # bounds staleness
+
+# 3n) SQL connections: one pooled engine per connection string, schema snapshot on disk
+SQL_POOL_SIZE = int(os.getenv("SQL_POOL_SIZE", "5"))
+SQL_MAX_OVERFLOW = int(os.getenv("SQL_MAX_OVERFLOW", "10"))
+SQL_POOL_TIMEOUT_SECONDS = int(os.getenv("SQL_POOL_TIMEOUT_SECONDS", "30"))
+SQL_POOL_RECYCLE_SECONDS = int(os.getenv("SQL_POOL_RECYCLE_SECONDS", "1800"))   # below typical server idle timeouts
+SCHEMA_CACHE_DIRECTORY = PROJECT_ROOT / "data" / "schema_cache"
+SCHEMA_FINGERPRINT_TTL_SECONDS = float(os.getenv("SCHEMA_FINGERPRINT_TTL_SECONDS", "60"))  # per question; Connect always rechecks
+
+# 3o) SQL schema retrieval: only the tables relevant to a question go into the prompt
+SQL_SCHEMA_TOP_K = int(os.getenv("SQL_SCHEMA_TOP_K", "5"))
+SQL_SCHEMA_FULL_MAX_TABLES = int(os.getenv("SQL_SCHEMA_FULL_MAX_TABLES", "8"))   # smaller schemas are sent whole
+
+# 3p) compare_tables: one server-side statement, at most this many rows back
+COMPARE_TABLES_MAX_ROWS = int(os.getenv("COMPARE_TABLES_MAX_ROWS", "200"))
+
+# 3q) SQL result retrieval: caps injected into the SQL, fetchmany batches, pages
+SQL_MAX_ROWS = int(os.getenv("SQL_MAX_ROWS", "1000"))                    # per agent tool call
+SQL_MAX_RESULT_BYTES = int(os.getenv("SQL_MAX_RESULT_BYTES", str(2**20)))  # per tool call / page
+SQL_FETCH_ROWS = int(os.getenv("SQL_FETCH_ROWS", "500"))                 # rows per fetchmany()
+SQL_PAGE_ROWS = int(os.getenv("SQL_PAGE_ROWS", "500"))                   # default /sql/execute page
+SQL_STREAM_MAX_ROWS = int(os.getenv("SQL_STREAM_MAX_ROWS", "1000000"))   # /sql/stream hard cap
+
 # 4) your OpenAI key from environment
 OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
 if not OPENAI_API_KEY:
@@ -0,0 +1,101 @@
+# scripts/bench_ann.py
+"""
+Recall vs. latency vs. index size for HNSW parameter sets, on synthetic
+clustered embeddings (nothing is sent to OpenAI).
+
+    hnsw M/efc/efs   a Chroma collection built with those HNSW parameters
+
+Recall@k is measured against brute‑force float32 search.  "disk MB" is
+the on‑disk size of the HNSW segment (vectors plus graph).
+
+    python -m scripts.bench_ann --n 100000 --dim 1536 --queries 200
+"""
+import argparse, shutil, statistics, sys, tempfile, time
+from pathlib import Path
+
+import numpy as np
+
+# ensure repo root modules are on path
+sys.path.append(str(Path(__file__).parent.parent))
+
+import chromadb
+from chromadb.config import Settings
+
+from agents.unstructured_agent.vector_store import hnsw_metadata
+
+
+def make_data(n: int, dim: int, n_queries: int, seed: int = 0):
+    rng = np.random.default_rng(seed)
+    centers = rng.normal(size=(max(n // 500, 8), dim)).astype(np.float32)
+    data = centers[rng.integers(0, len(centers), n)] + \
+        0.35 * rng.normal(size=(n, dim)).astype(np.float32)
+    queries = centers[rng.integers(0, len(centers), n_queries)] + \
+        0.35 * rng.normal(size=(n_queries, dim)).astype(np.float32)
+    return data, queries
+
+
+def exact_sq_l2(query, vectors):
+    diff = vectors - query
+    return np.einsum("ij,ij->i", diff, diff)
+
+
+def ground_truth(data, queries, k):
+    return [set(np.argsort(exact_sq_l2(q, data))[:k]) for q in queries]
+
+
+def dir_mb(path: Path, pattern: str = "*") -> float:
+    return sum(f.stat().st_size for f in path.rglob(pattern) if f.is_file()) / 2**20
+
+
+def _report(name, latencies, recalls, mb, build_s):
+    p95 = sorted(latencies)[min(len(latencies) - 1, int(0.95 * len(latencies)))]
+    print(f"{name:<22} {statistics.mean(recalls):>9.3f} {statistics.median(latencies):>8.2f} "
+          f"{p95:>8.2f} {mb:>9.1f} {build_s:>8.1f}")
+
+
+def bench_hnsw(data, queries, truth, k, m, ef_c, ef_s, batch=5000):
+    tmp = Path(tempfile.mkdtemp())
+    try:
+        client = chromadb.PersistentClient(path=str(tmp), settings=Settings(anonymized_telemetry=False))
+        col = client.create_collection(
+            "bench", metadata=hnsw_metadata(m=m, ef_construction=ef_c, ef_search=ef_s))
+        t0 = time.perf_counter()
+        for start in range(0, len(data), batch):
+            part = data[start: start + batch]
+            col.add(ids=[str(i) for i in range(start, start + len(part))], embeddings=part)
+        build_s = time.perf_counter() - t0
+        latencies, recalls = [], []
+        for q, t in zip(queries, truth):
+            t0 = time.perf_counter()
+            res = col.query(query_embeddings=[q], n_results=k, include=[])
+            latencies.append((time.perf_counter() - t0) * 1000)
+            recalls.append(len(t & {int(i) for i in res["ids"][0]}) / k)
+        # HNSW segment files only (the sqlite db holds ids/metadata in every config)
+        mb = sum(dir_mb(p) for p in tmp.iterdir() if p.is_dir())
+        _report(f"hnsw {m}/{ef_c}/{ef_s}", latencies, recalls, mb, build_s)
+    finally:
+        shutil.rmtree(tmp, ignore_errors=True)
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--n", type=int, default=50_000)
+    ap.add_argument("--dim", type=int, default=384)
+    ap.add_argument("--queries", type=int, default=200)
+    ap.add_argument("--k", type=int, default=10)
+    ap.add_argument("--hnsw", nargs="+", default=["16/100/10", "16/100/100", "32/200/100", "32/200/200"],
+                    help="M/ef_construction/ef_search triples")
+    args = ap.parse_args()
+
+    data, queries = make_data(args.n, args.dim, args.queries)
+    truth = ground_truth(data, queries, args.k)
+    print(f"n={args.n} dim={args.dim} queries={args.queries} k={args.k} "
+          f"(float32 vectors: {data.nbytes / 2**20:.1f} MB)\n")
+    print(f"{'config':<22} {'recall@k':>9} {'p50 ms':>8} {'p95 ms':>8} {'disk MB':>9} {'build s':>8}")
+    for spec in args.hnsw:
+        m, ef_c, ef_s = (int(x) for x in spec.split("/"))
+        bench_hnsw(data, queries, truth, args.k, m, ef_c, ef_s)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,95 @@
+# scripts/bench_retrieval.py
+"""
+Retrieval benchmark over the gold questions in ``scripts/gold.jsonl``.
+
+For each configuration (the original 0.6/0.4 slicing, RRF and weighted
+fusion at several candidate pool sizes) it reports
+
+    recall@pool   share of gold‑answer parts found in the candidate pool
+    recall@k      the same after reranking down to --top-k
+    p50 / p95     retrieval latency (vector + keyword + fusion), ms
+
+A gold answer counts as found when its text (each comma‑separated part
+for list answers) appears in a retrieved chunk, case‑insensitively.
+Run against an already populated store:
+
+    python -m scripts.bench_retrieval --top-k 3 --rerank local
+"""
+import argparse, json, statistics, sys, time
+from pathlib import Path
+
+# ensure repo root modules are on path
+sys.path.append(str(Path(__file__).parent.parent))
+
+from agents.unstructured_agent.vector_store import (
+    vector_search_with_scores, keyword_search_with_scores,
+)
+from agents.unstructured_agent.fusion import fuse
+from agents.unstructured_agent.rerank import BM25Reranker, Reranker
+
+GOLD_PATH = Path(__file__).parent / "gold.jsonl"
+WEIGHTS = (0.6, 0.4)
+
+
+def load_gold(path: Path = GOLD_PATH) -> list[dict]:
+    with open(path) as fh:
+        return [json.loads(line) for line in fh if line.strip().startswith("{")]
+
+
+def answer_recall(answer: str, docs) -> float:
+    parts = [p.strip().lower() for p in str(answer).split(",") if p.strip()]
+    text = "\n".join(d.page_content for d in docs).lower()
+    return sum(p in text for p in parts) / len(parts) if parts else 0.0
+
+
+def retrieve(query: str, method: str, pool: int, top_k_vector: int, top_k: int):
+    vector_hits = vector_search_with_scores(query, top_k_vector, filters={"level": "row"})
+    keyword_hits = keyword_search_with_scores(query, top_k_vector)
+    if method == "legacy":
+        # what HybridQAChain._fetch used to do
+        return ([d for d, _ in vector_hits[: int(WEIGHTS[0] * top_k)]] +
+                [d for d, _ in keyword_hits[: int(WEIGHTS[1] * top_k)]])
+    return fuse([vector_hits, keyword_hits], WEIGHTS, limit=pool, method=method)
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--top-k", type=int, default=3, help="docs kept after rerank")
+    ap.add_argument("--top-k-vector", type=int, default=10)
+    ap.add_argument("--pools", type=int, nargs="+", default=[10, 20, 40])
+    ap.add_argument("--rerank", choices=["local", "cohere"], default="local",
+                    help="local BM25 scorer, or the app's Cohere reranker")
+    args = ap.parse_args()
+
+    if args.rerank == "cohere":
+        from agents.unstructured_agent.agent import reranker
+    else:
+        reranker = Reranker(local=BM25Reranker())   # no remote client: local only
+
+    gold = load_gold()
+    configs = [("legacy", args.top_k)] + [
+        (method, pool) for method in ("rrf", "weighted") for pool in args.pools
+    ]
+    print(f"{len(gold)} gold questions, top_k_vector={args.top_k_vector}, "
+          f"top_k={args.top_k}, rerank={args.rerank}\n")
+    print(f"{'config':<14} {'pool':>5} {'recall@pool':>12} {'recall@k':>9} "
+          f"{'p50 ms':>8} {'p95 ms':>8}")
+    for method, pool in configs:
+        pool_recall, k_recall, lat = [], [], []
+        for rec in gold:
+            t0 = time.perf_counter()
+            docs = retrieve(rec["question"], method, pool, args.top_k_vector, args.top_k)
+            lat.append((time.perf_counter() - t0) * 1000)
+            top = reranker.rerank(rec["question"], docs, top_k=args.top_k)
+            pool_recall.append(answer_recall(rec["answer"], docs))
+            k_recall.append(answer_recall(rec["answer"], top))
+        p95 = sorted(lat)[min(len(lat) - 1, int(0.95 * len(lat)))]
+        size = int(WEIGHTS[0] * args.top_k) + int(WEIGHTS[1] * args.top_k) \
+            if method == "legacy" else pool
+        print(f"{method:<14} {size:>5} "
+              f"{statistics.mean(pool_recall):>12.3f} {statistics.mean(k_recall):>9.3f} "
+              f"{statistics.median(lat):>8.1f} {p95:>8.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,165 @@
+# scripts/bench_schema_retrieval.py
+"""
+Prompt size and latency of the SQL agent's schema context on a generated
+SQLite database (500 tables by default, with foreign keys and sample rows).
+
+    full        every table's DDL + sample rows (what used to be dumped
+                into the conversation memory)
+    retrieved   the schema index's top‑k tables for the question
+
+For each mode it reports the schema tokens per prompt, the share of
+questions whose target table made it into the context, and the time to
+build that context (p50 / p95).  With ``--llm N`` the first N questions
+are also run through the agent in both modes (needs OPENAI_API_KEY) and
+the end‑to‑end latency is reported.
+
+    python -m scripts.bench_schema_retrieval --tables 500 --questions 200
+"""
+import argparse, random, sqlite3, statistics, sys, tempfile, time
+from pathlib import Path
+
+# ensure repo root modules are on path
+sys.path.append(str(Path(__file__).parent.parent))
+
+from agents.database_agent.engines import schema_snapshot, schema_text
+from agents.database_agent.schema_index import get_schema_index
+
+DOMAINS = ["customer", "order", "invoice", "product", "supplier", "employee", "payroll",
+           "shipment", "warehouse", "campaign", "ticket", "contract", "asset", "budget",
+           "course", "student", "patient", "claim", "vehicle", "store", "region", "account",
+           "lead", "refund", "inventory"]
+FACETS = ["history", "summary", "detail", "audit", "daily", "monthly", "archive", "stats",
+          "event", "line", "snapshot", "target", "forecast", "note", "rating", "log",
+          "status", "metric", "score", "balance"]
+MEASURES = ["amount", "quantity", "price", "cost", "revenue", "hours", "discount", "weight",
+            "duration", "score", "margin", "tax"]
+ATTRS = ["name", "category", "city", "channel", "segment", "priority", "currency", "grade"]
+
+
+def make_database(path: Path, n_tables: int, seed: int = 0) -> list[dict]:
+    """Create the tables and return one spec per table
+    (name, measure, attribute) for question generation."""
+    rng = random.Random(seed)
+    names = [f"{d}_{f}" for d in DOMAINS for f in FACETS]
+    rng.shuffle(names)
+    names = names[:n_tables] + [f"{n}_{i}" for i, n in enumerate(names[: max(0, n_tables - len(names))])]
+    specs, conn = [], sqlite3.connect(path)
+    for i, name in enumerate(names):
+        measures = rng.sample(MEASURES, 3)
+        attrs = rng.sample(ATTRS, 2)
+        cols = ["id INTEGER PRIMARY KEY", "created_at TEXT"]
+        cols += [f"{m} REAL" for m in measures] + [f"{a} TEXT" for a in attrs]
+        if i:
+            parent = rng.choice(names[:i])
+            cols.append(f"{parent}_id INTEGER REFERENCES {parent}(id)")
+        conn.execute(f"CREATE TABLE {name} ({', '.join(cols)})")
+        conn.executemany(
+            f"INSERT INTO {name} (created_at, {', '.join(measures + attrs)}) VALUES (?{', ?' * 5})",
+            [(f"2024-0{r + 1}-01", *(round(rng.random() * 100, 2) for _ in measures),
+              *(f"{a}_{rng.randint(1, 9)}" for a in attrs)) for r in range(3)],
+        )
+        specs.append({"table": name, "measure": measures[0], "attr": attrs[0]})
+    conn.commit()
+    conn.close()
+    return specs
+
+
+def make_questions(specs: list[dict], n: int, seed: int = 1) -> list[dict]:
+    rng = random.Random(seed)
+    templates = ["What is the total {measure} per {attr} in the {words} table?",
+                 "Average {measure} by {attr} for {words}",
+                 "Show the top 5 {attr} values of {words} by {measure}",
+                 "How many {words} rows have {measure} above 50?"]
+    out = []
+    for spec in rng.sample(specs, min(n, len(specs))):
+        domain, facet = spec["table"].split("_")[:2]
+        words = f"{facet} {domain}s"   # reordered and pluralised, as people write it
+        out.append({"question": rng.choice(templates).format(words=words, **spec),
+                    "table": spec["table"]})
+    return out
+
+
+def token_counter():
+    try:
+        import tiktoken
+        enc = tiktoken.get_encoding("cl100k_base")
+        return lambda text: len(enc.encode(text)), "cl100k_base"
+    except Exception:   # no tokenizer files offline
+        return lambda text: len(text) // 4, "chars/4 estimate"
+
+
+def _pct(values, q):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(q * len(values)))]
+
+
+def run_llm(conn_str: str, questions: list[dict], full: str):
+    from unittest import mock
+    import streamlit as st
+    from config.settings import OPENAI_API_KEY
+    from agents.database_agent.agent import build_sql_agent_with_memory
+
+    with mock.patch.object(st, "secrets", {"OPENAI_API_KEY": OPENAI_API_KEY}):
+        for mode in ("full", "retrieved"):
+            lat = []
+            for q in questions:
+                agent = build_sql_agent_with_memory(conn_str)   # fresh memory per question
+                agent.verbose = False
+                inputs = {"input": q["question"]}
+                if mode == "full":
+                    inputs["relevant_tables"] = full
+                t0 = time.perf_counter()
+                agent.invoke(inputs)
+                lat.append(time.perf_counter() - t0)
+            print(f"{mode:<10} end‑to‑end  p50 {statistics.median(lat):.2f}s  "
+                  f"p95 {_pct(lat, 0.95):.2f}s  ({len(lat)} questions)")
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--tables", type=int, default=500)
+    ap.add_argument("--questions", type=int, default=200)
+    ap.add_argument("--k", type=int, default=5, help="tables retrieved per question")
+    ap.add_argument("--llm", type=int, default=0, help="also run N questions through the agent")
+    args = ap.parse_args()
+
+    tmp = Path(tempfile.mkdtemp())
+    db_path = tmp / "bench.db"
+    specs = make_database(db_path, args.tables)
+    questions = make_questions(specs, args.questions)
+    conn_str = f"sqlite:///{db_path}"
+    count, tokenizer = token_counter()
+
+    t0 = time.perf_counter()
+    schema_snapshot(conn_str, directory=tmp)
+    snap_s = time.perf_counter() - t0
+    t0 = time.perf_counter()
+    index = get_schema_index(conn_str)
+    index_s = time.perf_counter() - t0
+    full = schema_text(conn_str)
+
+    print(f"{args.tables} tables, {len(questions)} questions, k={args.k}, tokens: {tokenizer}")
+    print(f"schema snapshot {snap_s:.2f}s, index build {index_s * 1000:.1f} ms\n")
+    print(f"{'mode':<10} {'tokens/prompt':>14} {'target hit':>11} {'p50 ms':>8} {'p95 ms':>8}")
+
+    full_tokens = count(full)
+    print(f"{'full':<10} {full_tokens:>14} {1.0:>11.3f} {'-':>8} {'-':>8}")
+
+    tokens, hits, lat = [], [], []
+    for q in questions:
+        t0 = time.perf_counter()
+        names = index.search(q["question"], args.k)
+        context = "\n\n".join(index.tables[n] for n in names)
+        lat.append((time.perf_counter() - t0) * 1000)
+        tokens.append(count(context))
+        hits.append(q["table"] in names)
+    print(f"{'retrieved':<10} {statistics.mean(tokens):>14.0f} {statistics.mean(hits):>11.3f} "
+          f"{statistics.median(lat):>8.2f} {_pct(lat, 0.95):>8.2f}")
+
+    if args.llm:
+        print()
+        run_llm(conn_str, questions[: args.llm], full)
+
+
+if __name__ == "__main__":
+    main()
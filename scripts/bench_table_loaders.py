@@ -0,0 +1,110 @@
+# scripts/bench_table_loaders.py
+"""
+Benchmark the column‑wise row serialisers against the original
+``df.iterrows()`` loops and check that both produce identical docs.
+
+    python -m scripts.bench_table_loaders --sizes 10000 100000 1000000
+"""
+import argparse, json, sys, time
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+# ensure repo root modules are on path
+sys.path.append(str(Path(__file__).parent.parent))
+
+from langchain.docstore.document import Document
+from agents.unstructured_agent.table_loaders import dataframe_to_docs
+from agents.unstructured_agent.document_loaders import df_to_row_docs
+
+
+# ------------------------------------------------------------------
+# Reference implementations (the loops this replaced)
+# ------------------------------------------------------------------
+def legacy_dataframe_to_docs(df, source, sheet_name=None, level="row", **base_meta):
+    df = df.copy()
+    df.columns = [c.strip() for c in df.columns]
+    dtypes_json = json.dumps({c: str(dt) for c, dt in df.dtypes.items()})
+    docs = []
+    for idx, row in df.iterrows():
+        docs.append(Document(
+            page_content=json.dumps(row.to_dict(), ensure_ascii=False),
+            metadata={**base_meta, "source": source, "sheet_name": sheet_name,
+                      "row_id": int(idx), "columns": ",".join(df.columns),
+                      "dtypes": dtypes_json, "level": level},
+        ))
+    summary = f"Sheet {sheet_name or 'data'} – {len(df)} rows. Columns: {', '.join(df.columns)}."
+    docs.append(Document(page_content=summary, metadata={
+        **base_meta, "source": source, "sheet_name": sheet_name, "level": "section"}))
+    return docs
+
+
+def legacy_df_to_row_docs(df, src, level, **base_meta):
+    df.columns = [c.strip().lower() for c in df.columns]
+    docs = []
+    for ridx, row in df.iterrows():
+        row_txt = "; ".join(f"{k}: {row[k]}" for k in df.columns)
+        meta = {"source": src, "row_id": ridx, "columns": ",".join(df.columns),
+                "level": level, **base_meta}
+        docs.append(Document(page_content=row_txt, metadata=meta))
+    return docs
+
+
+# ------------------------------------------------------------------
+def make_frame(n: int, seed: int = 0) -> pd.DataFrame:
+    rng = np.random.default_rng(seed)
+    gpa = rng.uniform(0, 4, n).round(2)
+    gpa[rng.random(n) < 0.05] = np.nan
+    return pd.DataFrame({
+        "Student ID": np.arange(n),
+        "Department": rng.choice(["Admissions", "Registrar", "Finance", "Café"], n),
+        "Year": rng.integers(2015, 2025, n),
+        "GPA": gpa,
+        "Full Time": rng.random(n) < 0.7,
+        "Note": rng.choice(['ok', 'says "hi"', "tab\there", None], n),
+    })
+
+
+def _same(a, b) -> bool:
+    return (len(a) == len(b) and all(
+        x.page_content == y.page_content and x.metadata == y.metadata
+        and list(x.metadata) == list(y.metadata)
+        for x, y in zip(a, b)))
+
+
+def _time(fn, *args, **kw):
+    t0 = time.perf_counter()
+    out = fn(*args, **kw)
+    return out, time.perf_counter() - t0
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--sizes", type=int, nargs="+", default=[10_000, 100_000, 1_000_000])
+    ap.add_argument("--skip-legacy-above", type=int, default=None,
+                    help="only time the new path for larger frames")
+    args = ap.parse_args()
+
+    meta = {"department": "Admissions", "year": "2024"}
+    print(f"{'rows':>10} {'function':<20} {'legacy s':>10} {'new s':>10} {'speedup':>8}  identical")
+    for n in args.sizes:
+        df = make_frame(n)
+        run_legacy = args.skip_legacy_above is None or n <= args.skip_legacy_above
+        for name, new_fn, old_fn, call in (
+            ("dataframe_to_docs", dataframe_to_docs, legacy_dataframe_to_docs,
+             lambda f, d: f(d, "report.csv", sheet_name="Sheet1", **meta)),
+            ("df_to_row_docs", df_to_row_docs, legacy_df_to_row_docs,
+             lambda f, d: f(d.copy(), "report.csv", "row", **meta)),
+        ):
+            new, t_new = _time(call, new_fn, df)
+            if run_legacy:
+                old, t_old = _time(call, old_fn, df)
+                print(f"{n:>10} {name:<20} {t_old:>10.2f} {t_new:>10.2f} "
+                      f"{t_old / t_new:>7.1f}x  {_same(old, new)}")
+            else:
+                print(f"{n:>10} {name:<20} {'-':>10} {t_new:>10.2f} {'-':>8}  -")
+
+
+if __name__ == "__main__":
+    main()
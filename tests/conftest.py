@@ -0,0 +1,4 @@
+import os
+
+# config.settings refuses to import without a key; nothing here calls OpenAI
+os.environ.setdefault("OPENAI_API_KEY", "test")
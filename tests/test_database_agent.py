@@ -0,0 +1,108 @@
+import sqlite3
+
+import pytest
+from sqlalchemy import create_engine
+from langchain_community.utilities.sql_database import SQLDatabase
+
+from agents.database_agent.compare_tables_tool import make_compare_tables_tool
+
+
+@pytest.fixture
+def sqlite_db(tmp_path):
+    path = tmp_path / "t.db"
+    conn = sqlite3.connect(path)
+    conn.executescript("""
+        CREATE TABLE a (dept TEXT, credits REAL);
+        CREATE TABLE b (dept TEXT, credits REAL);
+        INSERT INTO a VALUES ('x', 1), ('x', 2), ('y', 5);
+        INSERT INTO b VALUES ('x', 3), ('z', 4);
+    """)
+    conn.commit()
+    conn.close()
+    return SQLDatabase(create_engine(f"sqlite:///{path}"))
+
+
+def test_compare_tables_named_like_ctes(sqlite_db):
+    tool = make_compare_tables_tool(sqlite_db)
+    out = tool.invoke({"table1": "b", "table2": "a", "key": "dept",
+                       "metrics": ["SUM(credits)"]})
+    rows = {line.split("|")[1].strip(): [float(v) for v in line.split("|")[2:5]]
+            for line in out.splitlines()[2:]}
+    # A = table b, B = table a, diff = B - A
+    assert rows == {"x": [3.0, 3.0, 0.0], "y": [0.0, 5.0, 5.0], "z": [4.0, 0.0, -4.0]}
+
+
+def test_capped_query_with_trailing_comment(sqlite_db):
+    from agents.database_agent.streaming import fetch_page, run_capped
+
+    query = "SELECT dept FROM a ORDER BY dept -- all rows"
+    page = fetch_page(sqlite_db._engine, query, page_rows=2)
+    assert page["rows"] == [("x",), ("x",)] and page["next_page_token"]
+    assert fetch_page(sqlite_db._engine, query, page["next_page_token"])["rows"] == [("y",)]
+    assert run_capped(sqlite_db, "SELECT '--' AS c /* note */ -- tail") == "[('--',)]"
+
+
+def test_read_only_rejects_second_statement():
+    from agents.database_agent.read_only_sql_tool import _check_read_only
+
+    for query in ("SELECT 1) AS c; DELETE FROM a; --", "SELECT 1; DELETE FROM a"):
+        with pytest.raises(ValueError):
+            _check_read_only(query)
+    _check_read_only("SELECT ';' AS c, \"x;y\" FROM a; -- trailing semicolon is fine")
+
+
+def test_stream_rows_runs_read_only(sqlite_db):
+    from sqlalchemy import text
+    from sqlalchemy.exc import OperationalError
+    from agents.database_agent.streaming import _read_only, fetch_page
+
+    engine = sqlite_db._engine
+    with engine.connect() as conn, _read_only(conn):
+        with pytest.raises(OperationalError):
+            conn.execute(text("DELETE FROM a"))
+    # the pooled connection is writable again afterwards
+    assert fetch_page(engine, "SELECT COUNT(*) FROM a")["rows"] == [(3,)]
+    with engine.begin() as conn:
+        assert conn.execute(text("DELETE FROM b")).rowcount == 2
+
+
+def test_duplicate_column_names_are_not_wrapped(sqlite_db):
+    from agents.database_agent.streaming import cap_sql, fetch_page
+
+    query = "SELECT * FROM a JOIN b ON a.dept = b.dept ORDER BY a.credits"
+    assert cap_sql(query, "sqlite", 10) is None
+    assert cap_sql("SELECT COUNT(*), COUNT(*) FROM a", "mysql", 10) is None
+    assert cap_sql("SELECT * FROM a", "sqlite", 10) is not None
+    page = fetch_page(sqlite_db._engine, query, page_rows=1)
+    assert page["columns"] == ["dept", "credits", "dept", "credits"]
+    assert page["rows"] == [("x", 1.0, "x", 3.0)]
+    rest = fetch_page(sqlite_db._engine, query, page["next_page_token"])
+    assert rest["rows"] == [("x", 2.0, "x", 3.0)] and rest["next_page_token"] is None
+
+
+def test_compare_tables_metrics_are_single_aggregates(sqlite_db):
+    from agents.database_agent.compare_tables_tool import build_compare_sql
+
+    dialect = sqlite_db._engine.dialect
+    for metric in ("SUM(credits)", "count(*)", "AVG(DISTINCT a.credits)", 'MAX("credits")'):
+        build_compare_sql(dialect, "a", "b", "dept", [metric])
+    for metric in ("SUM(credits) + (SELECT 1)", "SUM(pg_terminate_backend(1))",
+                   "load_extension('x')", "credits", "SUM(credits) FROM a --"):
+        with pytest.raises(ValueError):
+            build_compare_sql(dialect, "a", "b", "dept", [metric])
+
+
+def test_schema_fingerprint_reused_within_ttl(sqlite_db, tmp_path, monkeypatch):
+    from agents.database_agent import engines
+
+    calls, real = [], engines.schema_fingerprint
+    monkeypatch.setattr(engines, "schema_fingerprint", lambda e: calls.append(e) or real(e))
+    conn_str = str(sqlite_db._engine.url)
+    try:
+        first = engines.schema_snapshot(conn_str, directory=tmp_path)
+        assert engines.schema_snapshot(conn_str, directory=tmp_path) is first
+        assert len(calls) == 1
+        engines.schema_snapshot(conn_str, directory=tmp_path, max_age=0)
+        assert len(calls) == 2
+    finally:
+        engines.dispose_engines()
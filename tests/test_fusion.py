@@ -0,0 +1,22 @@
+from langchain.schema import Document
+
+from agents.unstructured_agent.fusion import weighted_fuse
+
+
+def _hits(*pairs):
+    return [(Document(id=i, page_content=i), s) for i, s in pairs]
+
+
+def test_weighted_fuse_counts_a_lone_hit_fully():
+    vector = _hits(("a", -0.1), ("b", -0.5), ("c", -0.9))
+    keyword = _hits(("c", 12.0))
+    out = [d.id for d in weighted_fuse([vector, keyword], [0.5, 0.5], 3)]
+    # c is last among the vector hits but the only keyword hit
+    assert out.index("c") < out.index("b")
+
+
+def test_weighted_fuse_equal_scores_are_not_zeroed():
+    vector = _hits(("a", -0.2), ("b", -0.4), ("e", -0.6))
+    keyword = _hits(("b", 3.0), ("d", 3.0))
+    out = [d.id for d in weighted_fuse([vector, keyword], [0.5, 0.5], 4)]
+    assert out[0] == "b" and out[-1] == "e"
@@ -0,0 +1,66 @@
+import random
+
+from langchain.docstore.document import Document
+
+from agents.unstructured_agent import keyword_index as ki
+from agents.unstructured_agent.keyword_index import KeywordIndex
+
+WORDS = ["budget", "enrolment", "faculty", "tuition", "grant", "campus", "library",
+         "research", "student", "course", "fall", "spring", "credit", "audit"]
+
+
+def _docs(n, seed=0, prefix="d"):
+    rng = random.Random(seed)
+    return ([f"{prefix}{i}" for i in range(n)],
+            [Document(page_content=" ".join(rng.choices(WORDS, k=rng.randint(3, 30))),
+                      metadata={"source": f"f{i % 3}.pdf", "year": 2020 + i % 4})
+             for i in range(n)])
+
+
+def test_buffered_adds_merge_and_search_like_one_segment(tmp_path):
+    ids, docs = _docs(300)
+    one = KeywordIndex(tmp_path / "one", segment_docs=10_000)
+    one.add(ids, docs)
+    one.flush()
+    many = KeywordIndex(tmp_path / "many", segment_docs=7)
+    for start in range(0, len(ids), 5):
+        many.add(ids[start: start + 5], docs[start: start + 5])
+    many.flush()
+    many.delete_ids(["d3", "d4"])
+    one.delete_ids(["d3", "d4"])
+    assert len(many._load()["segments"]) <= ki.MAX_SEGMENTS
+    for query in ("budget grant", "fall tuition audit", "library"):
+        a = one.search(query, k=20, filters={"year": 2021})
+        b = many.search(query, k=20, filters={"year": 2021})
+        assert [i for i, _ in a] == [i for i, _ in b]
+        assert all(abs(x - y) < 1e-4 for (_, x), (_, y) in zip(a, b))
+    many.compact()
+    assert len(many._load()["segments"]) == 1
+    assert many.search("budget", k=1000) == one.search("budget", k=1000)
+
+
+def test_two_writers_share_a_directory(tmp_path):
+    ids, docs = _docs(40)
+    a, b = KeywordIndex(tmp_path, segment_docs=1), KeywordIndex(tmp_path, segment_docs=1)
+    a.add(ids[:20], docs[:20])
+    b.add(ids[10:], docs[10:])          # d10..d19 are already live via a
+    assert len(a) == len(b) == 40
+    b.delete_source("f0.pdf")
+    assert not {i for i, _ in a.search(" ".join(WORDS), k=100)} & {f"d{i}" for i in range(0, 40, 3)}
+    a.add(["d0"], docs[:1])             # deleted, so indexed again
+    assert "d0" in {i for i, _ in b.search(docs[0].page_content, k=100)}
+
+
+def test_retired_segments_outlive_searches(tmp_path, monkeypatch):
+    ids, docs = _docs(20)
+    index = KeywordIndex(tmp_path, segment_docs=5)
+    for start in range(0, 20, 5):
+        index.add(ids[start: start + 5], docs[start: start + 5])
+    old = list(index._load()["segments"])
+    index._pins.update(old[:1])
+    monkeypatch.setattr(ki, "RETIRE_GRACE_S", 0)
+    index.compact()
+    assert (tmp_path / old[0]).exists() and not (tmp_path / old[1]).exists()
+    index._pins.subtract(old[:1])
+    index.delete_ids(["d0"])            # any later write reaps it
+    assert not (tmp_path / old[0]).exists()
@@ -0,0 +1,46 @@
+import gc
+import subprocess
+import sys
+import textwrap
+from pathlib import Path
+
+import pandas as pd
+
+from utils.table_cache import TableCache
+
+
+def _frame(n):
+    return {None: pd.DataFrame({"x": range(n), "y": [f"r{i}" for i in range(n)]})}
+
+
+def test_eviction_skips_entries_in_use(tmp_path):
+    cache = TableCache(tmp_path)
+    cache.max_bytes = 0
+    view = cache.put("a", _frame(10))
+    cache.put("b", _frame(20))
+    assert (tmp_path / "a" / "meta.json").exists()     # leased by *view*
+    assert view.read(columns=["x"]).x.sum() == 45
+    del view
+    gc.collect()
+    cache.put("c", _frame(30))
+    assert cache.get("a") is None
+
+
+def test_eviction_respects_other_processes(tmp_path):
+    cache = TableCache(tmp_path)
+    cache.put("a", _frame(10))
+    holder = subprocess.Popen([sys.executable, "-c", textwrap.dedent(f"""
+        import sys, time
+        from utils.table_cache import TableFile
+        view = TableFile({str(tmp_path / "a")!r})
+        print("open", flush=True)
+        sys.stdin.readline()
+    """)], stdin=subprocess.PIPE, stdout=subprocess.PIPE, text=True,
+       cwd=Path(__file__).resolve().parent.parent)
+    try:
+        assert holder.stdout.readline().strip() == "open"
+        cache.max_bytes = 0
+        cache.put("b", _frame(20))
+        assert cache.get("a") is not None
+    finally:
+        holder.communicate("\n")
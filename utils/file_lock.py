@@ -0,0 +1,60 @@
+# utils/file_lock.py
+"""
+Advisory file locks shared between processes (the Streamlit UI and the
+FastAPI app write the same ``data/`` directories).
+
+``flock`` on POSIX; on Windows ``msvcrt.locking`` on the first byte,
+which has no shared mode, so there a shared lock is exclusive too.
+Locks belong to the open file, so two opens in one process exclude each
+other as well – callers that nest must reuse the handle.
+"""
+import os
+from contextlib import contextmanager
+from pathlib import Path
+
+try:
+    import fcntl
+except ImportError:   # Windows
+    fcntl = None
+    import msvcrt
+
+SHARED_LOCKS = fcntl is not None   # whether shared locks can coexist
+
+
+def lock_file(fh, shared: bool = False, blocking: bool = True) -> bool:
+    """Lock the open file *fh*; ``False`` if *blocking* is off and it's taken."""
+    if fcntl is not None:
+        flags = (fcntl.LOCK_SH if shared else fcntl.LOCK_EX) | (0 if blocking else fcntl.LOCK_NB)
+        try:
+            fcntl.flock(fh.fileno(), flags)
+        except BlockingIOError:
+            return False
+        return True
+    fh.seek(0)
+    try:
+        msvcrt.locking(fh.fileno(), msvcrt.LK_LOCK if blocking else msvcrt.LK_NBLCK, 1)
+    except OSError:
+        if blocking:
+            raise
+        return False
+    return True
+
+
+def unlock_file(fh):
+    if fcntl is not None:
+        fcntl.flock(fh.fileno(), fcntl.LOCK_UN)
+    else:
+        fh.seek(0)
+        msvcrt.locking(fh.fileno(), msvcrt.LK_UNLCK, 1)
+
+
+@contextmanager
+def file_lock(path: Path, shared: bool = False):
+    """Hold a lock on *path* (created if missing) for the ``with`` block."""
+    fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o644)
+    with os.fdopen(fd, "r+b") as fh:
+        lock_file(fh, shared=shared)
+        try:
+            yield
+        finally:
+            unlock_file(fh)
@@ -0,0 +1,290 @@
+# utils/table_cache.py
+"""
+On‑disk columnar cache of uploaded spreadsheets.
+
+Each upload is parsed once and written sheet by sheet under
+``TABLE_CACHE_DIRECTORY/<key>/``, where *key* is the sha256 of the
+upload's bytes (plus a digest of any non‑default parse options):
+
+    meta.json     sheets in workbook order: file, format, rows, columns
+    <n>.arrow     uncompressed Arrow IPC file, memory‑mapped on read
+    <n>.pkl       pickled frame, for sheets Arrow can't type (mixed objects)
+    <n>.profile.json   column profile (``table_profile``), computed on upload
+
+Opening a cached workbook maps its files without reading them; only the
+columns / row range a caller asks for are converted to pandas.  Entries
+are touched on use and the least recently used ones are removed once
+the cache grows past ``TABLE_CACHE_MAX_MB`` – except entries a live
+:class:`TableFile` in any process still points at, since those open
+their files lazily.  Each view holds a shared lock on the entry's
+``.lease`` file for its lifetime; eviction only deletes an entry whose
+lease it can lock exclusively.  CSV uploads are stored as a single sheet
+named ``Sheet1``.
+"""
+import hashlib, json, os, pickle, shutil, threading, uuid, weakref
+from collections.abc import Mapping
+from functools import lru_cache
+from pathlib import Path
+from typing import Iterable, Sequence
+
+import pandas as pd
+import pyarrow as pa
+
+from config.settings import TABLE_CACHE_DIRECTORY, TABLE_CACHE_MAX_MB
+from utils.table_profile import profile_table
+from utils.file_lock import SHARED_LOCKS, lock_file, unlock_file
+from agents.unstructured_agent.document_loaders import (
+    BufferReader, file_buffer, read_tables, table_key,
+)
+
+CSV_SHEET = "Sheet1"
+LEASE = ".lease"
+
+
+def _open_lease(directory: Path):
+    return os.fdopen(os.open(directory / LEASE, os.O_RDWR | os.O_CREAT, 0o644), "r+b")
+
+
+class TableFile(Mapping):
+    """``{sheet: DataFrame}`` view of one cached upload.
+
+    Indexing materialises (and memoises) a whole sheet; :meth:`read`
+    returns just the requested columns and rows without touching the
+    rest of the file.
+    """
+
+    def __init__(self, directory: Path):
+        self.directory = Path(directory)
+        # the lease keeps eviction (in any process) away while this view lives;
+        # without shared locks (Windows) it is best effort
+        lease = _open_lease(self.directory)
+        lock_file(lease, shared=True, blocking=SHARED_LOCKS)
+        weakref.finalize(self, lease.close)
+        # raises FileNotFoundError if the entry was evicted before the lease
+        with open(self.directory / "meta.json", encoding="utf-8") as fh:
+            self._sheets = {s["name"]: s for s in json.load(fh)["sheets"]}
+        self._frames: dict[str, pd.DataFrame] = {}
+        self._tables: dict[str, pa.Table] = {}
+        self._profiles: dict[str, dict] = {}
+
+    def __getitem__(self, sheet: str) -> pd.DataFrame:
+        if sheet not in self._frames:
+            self._frames[sheet] = self.read(sheet)
+        return self._frames[sheet]
+
+    def __iter__(self):
+        return iter(self._sheets)
+
+    def __len__(self) -> int:
+        return len(self._sheets)
+
+    def _info(self, sheet: str | None) -> dict:
+        if sheet is None:
+            sheet = next(iter(self._sheets))
+        if sheet not in self._sheets:
+            raise KeyError(f"no sheet {sheet!r}; have {list(self._sheets)}")
+        return self._sheets[sheet]
+
+    def num_rows(self, sheet: str | None = None) -> int:
+        return self._info(sheet)["rows"]
+
+    def columns(self, sheet: str | None = None) -> list:
+        return list(self._info(sheet)["columns"])
+
+    def _arrow(self, info: dict) -> pa.Table:
+        table = self._tables.get(info["name"])
+        if table is None:
+            source = pa.memory_map(str(self.directory / info["file"]))
+            table = self._tables[info["name"]] = pa.ipc.open_file(source).read_all()
+        return table
+
+    def profile(self, sheet: str | None = None) -> dict:
+        """Column profile of *sheet*, computed once and stored beside it."""
+        info = self._info(sheet)
+        if info["name"] in self._profiles:
+            return self._profiles[info["name"]]
+        path = self.directory / (info["file"].rsplit(".", 1)[0] + ".profile.json")
+        try:
+            with open(path, encoding="utf-8") as fh:
+                profile = json.load(fh)
+        except (FileNotFoundError, ValueError):
+            profile = profile_table(self._arrow(info) if info["format"] == "arrow"
+                                    else self[info["name"]])
+            tmp = path.with_suffix(f".{uuid.uuid4().hex}")
+            with open(tmp, "w", encoding="utf-8") as fh:
+                json.dump(profile, fh)
+            os.replace(tmp, path)
+        self._profiles[info["name"]] = profile
+        return profile
+
+    def dataset(self, sheet: str | None = None):
+        """The sheet as something an engine can scan lazily: a
+        ``pyarrow.dataset`` over its Arrow file (projection and filter
+        pushdown), or the frame itself for pickled sheets."""
+        info = self._info(sheet)
+        if info["format"] == "pickle":
+            return self[info["name"]]
+        import pyarrow.dataset as ds
+        return ds.dataset(str(self.directory / info["file"]), format="ipc")
+
+    def read(self, sheet: str | None = None,
+             columns: Sequence | None = None,
+             start: int = 0,
+             stop: int | None = None) -> pd.DataFrame:
+        """Rows ``[start, stop)`` of *columns* (default: all) of *sheet*
+        (default: the first), keeping the original row labels."""
+        info = self._info(sheet)
+        stop = info["rows"] if stop is None else min(stop, info["rows"])
+        start = min(max(start, 0), stop)
+        if columns is not None:
+            positions = {c: i for i, c in enumerate(info["columns"])}
+            columns = [positions[str(c)] for c in columns]
+        if info["format"] == "pickle":
+            df = self._frames.get(info["name"])
+            if df is None:
+                df = pd.read_pickle(self.directory / info["file"])
+            return df.iloc[start:stop] if columns is None else df.iloc[start:stop, columns]
+        table = self._arrow(info)
+        if columns is not None:
+            table = table.select(columns)
+        df = table.slice(start, stop - start).to_pandas()
+        df.index = pd.RangeIndex(start, stop)
+        return df
+
+
+def _options_digest(options: dict) -> str:
+    return hashlib.sha256(json.dumps(options, sort_keys=True).encode()).hexdigest()[:12]
+
+
+def _write_sheet(df: pd.DataFrame, path: Path) -> str:
+    """Arrow IPC when the frame converts cleanly, pickle otherwise
+    (including non‑string column labels, which Arrow would stringify)."""
+    try:
+        if not all(isinstance(c, str) for c in df.columns):
+            raise pa.ArrowInvalid("non-string column labels")
+        table = pa.Table.from_pandas(df, preserve_index=False)
+    except (pa.ArrowInvalid, pa.ArrowTypeError, pa.ArrowNotImplementedError):
+        df.to_pickle(path.with_suffix(".pkl"), protocol=pickle.HIGHEST_PROTOCOL)
+        return "pickle"
+    with pa.OSFile(str(path.with_suffix(".arrow")), "wb") as sink, \
+            pa.ipc.new_file(sink, table.schema) as writer:
+        writer.write_table(table)
+    return "arrow"
+
+
+class TableCache:
+    def __init__(self, directory: Path = TABLE_CACHE_DIRECTORY,
+                 max_mb: int = TABLE_CACHE_MAX_MB):
+        self.directory = Path(directory)
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self.max_bytes = max_mb * 2**20
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> TableFile | None:
+        path = self.directory / key
+        try:
+            os.utime(path / "meta.json")   # LRU touch
+            return TableFile(path)
+        except FileNotFoundError:          # never cached, or just evicted
+            return None
+
+    def put(self, key: str, tables: dict) -> TableFile:
+        """Write ``{sheet: DataFrame}`` under *key* (a CSV's ``None`` sheet
+        becomes ``Sheet1``) and return the cached view."""
+        tmp = self.directory / f".{key}.{uuid.uuid4().hex}"
+        tmp.mkdir()
+        try:
+            sheets = []
+            for n, (name, df) in enumerate(tables.items()):
+                fmt = _write_sheet(df, tmp / str(n))
+                sheets.append({
+                    "name": CSV_SHEET if name is None else str(name),
+                    "file": f"{n}.{'arrow' if fmt == 'arrow' else 'pkl'}",
+                    "format": fmt,
+                    "rows": len(df),
+                    "columns": [str(c) for c in df.columns],
+                })
+            with open(tmp / "meta.json", "w", encoding="utf-8") as fh:
+                json.dump({"sheets": sheets}, fh)
+            try:
+                os.replace(tmp, self.directory / key)
+            except OSError:
+                pass   # another writer got there first; theirs is identical
+        finally:
+            shutil.rmtree(tmp, ignore_errors=True)
+        cached = TableFile(self.directory / key)   # leased before anything is evicted
+        self._evict(keep=key)
+        for sheet in cached:
+            cached.profile(sheet)   # profile at upload time, not on first question
+        return cached
+
+    def open(self, file_obj, filename: str, **read_options) -> TableFile:
+        """Cached view of an upload, parsing it on first sight.
+
+        *read_options* (e.g. ``na_values``) go to ``pd.read_csv`` /
+        ``pd.read_excel`` and are part of the key.  Without options the
+        parse is shared with ingestion (``document_loaders.read_tables``).
+        """
+        buf = file_buffer(file_obj)
+        key = table_key(buf)
+        if read_options:
+            key += "-" + _options_digest(read_options)
+        cached = self.get(key)
+        if cached is not None:
+            return cached
+        if not read_options:
+            tables = read_tables(buf, filename)
+        elif filename.rsplit(".", 1)[-1].lower() == "xlsx":
+            tables = pd.read_excel(BufferReader(buf), sheet_name=None, **read_options)
+        else:
+            tables = {None: pd.read_csv(BufferReader(buf), **read_options)}
+        return self.put(key, tables)
+
+    def _entries(self) -> Iterable[tuple[float, int, Path]]:
+        for path in self.directory.iterdir():
+            meta = path / "meta.json"
+            try:
+                if path.name.startswith("."):
+                    continue
+                size = sum(f.stat().st_size for f in path.iterdir())
+                yield meta.stat().st_mtime, size, path
+            except (FileNotFoundError, NotADirectoryError):
+                continue   # half written, or evicted by another process
+
+    def _evict(self, keep: str):
+        with self._lock:
+            entries = sorted(self._entries())
+            total = sum(size for _, size, _ in entries)
+            for _, size, path in entries:
+                if total <= self.max_bytes:
+                    break
+                if path.name == keep:
+                    continue
+                try:
+                    lease = _open_lease(path)
+                except FileNotFoundError:
+                    continue
+                with lease:
+                    if not lock_file(lease, blocking=False):
+                        continue   # a TableFile somewhere still uses it
+                    try:
+                        (path / "meta.json").unlink(missing_ok=True)   # no new views from here on
+                        shutil.rmtree(path, ignore_errors=True)
+                    finally:
+                        unlock_file(lease)
+                total -= size
+
+    def clear(self):
+        with self._lock:
+            for path in self.directory.iterdir():
+                shutil.rmtree(path, ignore_errors=True)
+
+
+@lru_cache(maxsize=None)
+def get_table_cache(directory: Path = TABLE_CACHE_DIRECTORY) -> TableCache:
+    return TableCache(directory)
+
+
+def open_tables(file_obj, filename: str, **read_options) -> TableFile:
+    """``get_table_cache().open(...)``."""
+    return get_table_cache().open(file_obj, filename, **read_options)
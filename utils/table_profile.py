@@ -0,0 +1,131 @@
+# utils/table_profile.py
+"""
+Column profiles of a sheet, computed in one vectorised pass per column
+with ``pyarrow.compute``:
+
+    type, count, nulls              exact
+    min / max, mean / std           exact (numeric and temporal columns)
+    p25 / p50 / p75                 t‑digest quantile sketch
+    distinct, top values            exact, or on a row sample for sheets
+                                    above ``PROFILE_SAMPLE_ROWS``
+
+Profiles are plain JSON‑able dicts; ``TableFile.profile`` caches them
+next to the sheet in the table cache, so ``describe_df`` and
+``explain_dataframes`` never rescan the data.
+"""
+import datetime as dt, decimal
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+
+from config.settings import PROFILE_SAMPLE_ROWS, PROFILE_TOP_K
+
+
+def _py(value):
+    """JSON‑friendly form of an Arrow scalar's Python value."""
+    if isinstance(value, pa.Scalar):
+        value = value.as_py()
+    if isinstance(value, (dt.date, dt.datetime, dt.time, dt.timedelta)):
+        return str(value)
+    if isinstance(value, decimal.Decimal):
+        return float(value)
+    if isinstance(value, float) and not np.isfinite(value):
+        return None
+    if isinstance(value, bytes):
+        return value.hex()
+    return value
+
+
+def _as_arrow(table) -> pa.Table:
+    if isinstance(table, pa.Table):
+        return table
+    try:
+        return pa.Table.from_pandas(table, preserve_index=False)
+    except (pa.ArrowInvalid, pa.ArrowTypeError, pa.ArrowNotImplementedError):
+        # mixed‑type object columns: profile their string forms
+        df = table.copy()
+        df.columns = [str(c) for c in df.columns]
+        for c in df.columns[df.dtypes == object]:
+            df[c] = df[c].map(lambda v: None if pd.isna(v) else str(v))
+        return pa.Table.from_pandas(df, preserve_index=False)
+
+
+def _sample(table: pa.Table, n: int) -> pa.Table:
+    rng = np.random.default_rng(0)
+    return table.take(np.sort(rng.choice(table.num_rows, n, replace=False)))
+
+
+def _column(col: pa.ChunkedArray, sample: pa.ChunkedArray, top_k: int) -> dict:
+    t = col.type
+    out = {"type": str(t), "count": len(col) - col.null_count, "nulls": col.null_count}
+    if not out["count"]:
+        return out
+    numeric = (pa.types.is_integer(t) or pa.types.is_floating(t)
+               or pa.types.is_decimal(t))
+    if numeric or pa.types.is_temporal(t) or pa.types.is_string(t) \
+            or pa.types.is_large_string(t):
+        mm = pc.min_max(col)
+        out["min"], out["max"] = _py(mm["min"]), _py(mm["max"])
+    if numeric:
+        out["mean"] = _py(pc.mean(col))
+        out["std"] = _py(pc.stddev(col, ddof=1)) if out["count"] > 1 else None
+        p25, p50, p75 = (_py(q) for q in pc.tdigest(col, q=[0.25, 0.5, 0.75]))
+        out.update(p25=p25, p50=p50, p75=p75)
+    try:
+        out["distinct"] = _py(pc.count_distinct(sample))
+        if not pa.types.is_floating(t):
+            counts = pc.value_counts(sample.drop_null()) if sample.null_count else \
+                pc.value_counts(sample)
+            counts = counts.take(pc.array_sort_indices(counts.field("counts"),
+                                                       order="descending")[:top_k])
+            out["top"] = [[_py(v), _py(c)] for v, c in
+                          zip(counts.field("values"), counts.field("counts"))]
+    except pa.ArrowNotImplementedError:
+        pass   # nested / unhashable types
+    return out
+
+
+def profile_table(table, sample_rows: int = PROFILE_SAMPLE_ROWS,
+                  top_k: int = PROFILE_TOP_K) -> dict:
+    """Profile of a ``pa.Table`` or DataFrame: ``{"rows", "sampled",
+    "columns": {name: {...}}}``.  Counts, extremes and quantile sketches
+    always cover every row; distinct / top values use a fixed‑seed
+    sample of *sample_rows* rows when the sheet is larger."""
+    table = _as_arrow(table)
+    sampled = table.num_rows > sample_rows
+    sample = _sample(table, sample_rows) if sampled else table
+    return {
+        "rows": table.num_rows,
+        "sampled": sampled,
+        "columns": {
+            name: _column(table.column(i), sample.column(i), top_k)
+            for i, name in enumerate(table.column_names)
+        },
+    }
+
+
+def _fmt(value) -> str:
+    if value is None:
+        return ""
+    if isinstance(value, float):
+        return f"{value:.6g}"
+    return str(value)
+
+
+def profile_markdown(profile: dict) -> str:
+    """One row per column, for the LLM."""
+    header = ["column", "type", "non-null", "nulls", "distinct",
+              "min", "max", "mean", "std", "p25", "p50", "p75", "top values"]
+    lines = ["| " + " | ".join(header) + " |", "|" + "---|" * len(header)]
+    for name, c in profile["columns"].items():
+        top = ", ".join(f"{_fmt(v)} ({n})" for v, n in c.get("top", []))
+        cells = [name, c["type"], c["count"], c["nulls"], c.get("distinct"),
+                 c.get("min"), c.get("max"), c.get("mean"), c.get("std"),
+                 c.get("p25"), c.get("p50"), c.get("p75"), top]
+        lines.append("| " + " | ".join(_fmt(v).replace("|", "\\|") for v in cells) + " |")
+    note = f"{profile['rows']} rows"
+    if profile["sampled"]:
+        note += " (distinct / top values estimated from a sample)"
+    return note + "\n\n" + "\n".join(lines)